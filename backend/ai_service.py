@@ -1,33 +1,125 @@
 """
 AI服务 - 支持多种后端（DeepSeek API / Ollama）
 """
-from openai import OpenAI
-from config import AI_PROVIDER, AI_API_KEY, AI_BASE_URL, AI_MODEL
-import json
-from typing import Dict
+from config import (
+    AI_PROVIDERS, AI_ROUTING, AI_HEDGE_ENABLED, AI_HEDGE_DELAY, AI_HEDGE_MIN_DELAY,
+    AI_TIMEOUT, AI_MAX_RETRIES, AI_MAX_CONCURRENCY, AI_DEADLINE, AI_PROMPT_VERSION, AI_MAX_TOKENS,
+    AI_BATCH_SIZE, AI_BATCH_MAX_TOKENS,
+    AI_BREAKER_ENABLED, AI_BREAKER_WINDOW, AI_BREAKER_MIN_CALLS, AI_BREAKER_ERROR_RATE,
+    AI_BREAKER_SLOW_CALL, AI_BREAKER_SLOW_RATE, AI_BREAKER_OPEN_SECONDS, AI_BREAKER_HALF_OPEN_CALLS,
+    PREDICTION_CACHE_ENABLED, PREDICTION_CACHE_TTL, PREDICTION_CACHE_MAX_SIZE,
+    PREDICTION_CACHE_BACKEND, PREDICTION_CACHE_SQLITE_PATH,
+    LOCAL_MODEL_PATH, LOCAL_MODEL_MODE, LOCAL_MODEL_MIN_CONFIDENCE
+)
+from cache import CACHED_SUFFIX, PredictionCache
+from circuit_breaker import CircuitBreaker
+from llm_output import PARSE_REPAIRED, JsonScanner, parse_llm_batch, parse_llm_json, validate_prediction
+from llm_router import NoProviderAvailable, Provider, ProviderRouter
+from metrics import (
+    LLM_BATCHES, LLM_OUTPUT_FIXES, LLM_PARSE, LLM_PROMPT_TOKENS, PREDICTION_RESULTS, PREDICTION_STAGE_SECONDS
+)
+from local_model import LocalModel
+from prompts import get_template, output_budget, template_stats
+from rule_engine import (
+    MODE_FALLBACK, MODE_TEXT, VERSIONS as RULE_VERSIONS,
+    fallback_analysis, fallback_suggestions, text_analysis, text_suggestions
+)
+import asyncio
+import copy
+import re
+import time
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+# narrative 模式下由本地模型提供的字段
+LOCAL_NUMERIC_KEYS = (
+    "predicted_score_min", "predicted_score_max", "predicted_score_most_likely",
+    "predicted_improvement", "predicted_improvement_rate",
+    "current_progress", "risk_level", "confidence", "model_version"
+)
+
+
+class AIUnavailableError(RuntimeError):
+    """大模型调用失败（仅在 require_ai=True 时抛出），fallback 为降级结果"""
+    
+    def __init__(self, message: str, fallback: Dict):
+        super().__init__(message)
+        self.fallback = fallback
 
 
 class AIService:
     def __init__(self):
-        self.provider = AI_PROVIDER
-        self.model = AI_MODEL
-        
-        # 初始化客户端（支持DeepSeek/OpenAI/Ollama/SiliconFlow等）
-        if self.provider in ['deepseek', 'openai', 'ollama', 'siliconflow', 'qwen']:
-            self.client = OpenAI(
-                api_key=AI_API_KEY if self.provider != 'ollama' else 'ollama',
-                base_url=AI_BASE_URL
-            )
-        else:
-            # 默认使用OpenAI兼容格式
-            self.client = OpenAI(
-                api_key=AI_API_KEY,
-                base_url=AI_BASE_URL
+        self.timeout = AI_TIMEOUT
+        self.deadline = AI_DEADLINE
+        self.max_concurrency = AI_MAX_CONCURRENCY
+        
+        # 评估 prompt 模板及输出 token 预算
+        self.prompt = get_template(AI_PROMPT_VERSION)
+        self.max_tokens = output_budget(self.prompt, AI_MAX_TOKENS)
+        
+        # 批量评估每次请求合并的用户数，受合并请求的输出 token 上限约束
+        self.batch_size = 1
+        if AI_BATCH_SIZE > 1:
+            if self.prompt.item_tokens:
+                self.batch_size = max(1, min(AI_BATCH_SIZE, AI_BATCH_MAX_TOKENS // self.prompt.item_tokens))
+            else:
+                print(f"⚠ prompt {self.prompt.version} 不支持批量评估，AI_BATCH_SIZE 不生效")
+        
+        # 提供商路由（支持DeepSeek/OpenAI/Ollama/SiliconFlow等，均为OpenAI兼容格式）；
+        # 每个提供商有独立的熔断器，服务异常时跳过该提供商，全部不可用时直接降级
+        self.router = ProviderRouter(
+            [
+                Provider(
+                    cfg["name"], cfg["base_url"], cfg["model"], cfg["api_key"], cost=cfg["cost"],
+                    json_mode=cfg["json_mode"],
+                    timeout=AI_TIMEOUT, max_retries=AI_MAX_RETRIES,
+                    breaker=CircuitBreaker(
+                        window=AI_BREAKER_WINDOW,
+                        min_calls=AI_BREAKER_MIN_CALLS,
+                        error_rate=AI_BREAKER_ERROR_RATE,
+                        slow_call=AI_BREAKER_SLOW_CALL,
+                        slow_rate=AI_BREAKER_SLOW_RATE,
+                        open_seconds=AI_BREAKER_OPEN_SECONDS,
+                        half_open_calls=AI_BREAKER_HALF_OPEN_CALLS,
+                        enabled=AI_BREAKER_ENABLED
+                    )
+                )
+                for cfg in AI_PROVIDERS
+            ],
+            strategy=AI_ROUTING,
+            hedge=AI_HEDGE_ENABLED,
+            hedge_delay=AI_HEDGE_DELAY,
+            hedge_min_delay=AI_HEDGE_MIN_DELAY
+        )
+        
+        # 异步并发限制，首次使用时在当前事件循环中创建
+        self._semaphore = None
+        self._semaphore_loop = None
+        
+        # 本地回归模型（需先执行 python local_model.py train）
+        self.local_model_mode = LOCAL_MODEL_MODE
+        self.local_model = None
+        if LOCAL_MODEL_MODE != 'off' and Path(LOCAL_MODEL_PATH).exists():
+            try:
+                self.local_model = LocalModel.load(LOCAL_MODEL_PATH)
+                print(f"✓ 已加载本地模型: {self.local_model.version}（{LOCAL_MODEL_MODE}）")
+            except Exception as e:
+                print(f"⚠ 本地模型加载失败: {e}")
+        
+        # 预测结果缓存
+        self.cache = None
+        if PREDICTION_CACHE_ENABLED:
+            self.cache = PredictionCache(
+                max_size=PREDICTION_CACHE_MAX_SIZE,
+                ttl=PREDICTION_CACHE_TTL,
+                sqlite_path=PREDICTION_CACHE_SQLITE_PATH if PREDICTION_CACHE_BACKEND == 'sqlite' else None
             )
     
     def evaluate_intervention(self, user_data: Dict) -> Dict:
         """
-        AI评估干预效果
+        AI评估干预效果（同步版本，供脚本使用）
         
         Args:
             user_data: 用户数据字典
@@ -35,93 +127,488 @@ class AIService:
         Returns:
             评估结果字典
         """
-        prompt = self._build_evaluation_prompt(user_data)
+        local = self._local_prediction(user_data)
+        if local is not None and self.local_model_mode == 'numeric':
+            PREDICTION_RESULTS.inc(source="local_model")
+            return local
+        
+        return self._combine_results(self._evaluate_llm(user_data), local, user_data)
+    
+    async def evaluate_intervention_async(self, user_data: Dict, require_ai: bool = False,
+                                          deadline: Optional[float] = None) -> Dict:
+        """
+        AI评估干预效果（异步版本）
+        
+        同时在途的调用数受 AI_MAX_CONCURRENCY 限制，等待AI超过 deadline 秒（默认 AI_DEADLINE）即降级；
+        熔断期间不调用AI直接降级。
+        require_ai=True 时AI失败抛出 AIUnavailableError 而不降级（供调用方重试）。
+        """
+        local = self._local_prediction(user_data)
+        if local is not None and self.local_model_mode == 'numeric':
+            PREDICTION_RESULTS.inc(source="local_model")
+            return local
+        
+        llm_result = await self._evaluate_llm_async(user_data, deadline)
+        result = self._combine_results(llm_result, local, user_data)
+        if llm_result is None and require_ai:
+            raise AIUnavailableError("AI评估失败", result)
+        return result
+    
+    async def evaluate_batch_async(self, users: List[Dict], require_ai: bool = False,
+                                   deadline: Optional[float] = None) -> Dict[int, Dict]:
+        """
+        批量AI评估：每 batch_size 个用户合并为一次请求，返回 {user_id: 评估结果}
+        
+        返回缺失或无法解析的用户拆成两半重试，拆到单个用户时按单用户请求评估；
+        AI调用失败的用户降级到本地模型/规则引擎。
+        require_ai=True 时结果中不含AI失败的用户（由调用方重试或降级）。
+        """
+        results: Dict[int, Dict] = {}
+        local_results: Dict[int, Optional[Dict]] = {}
+        llm_results: Dict[int, Dict] = {}
+        candidates = []
+        for user_data in users:
+            user_id = user_data['user_id']
+            local = self._local_prediction(user_data)
+            if local is not None and self.local_model_mode == 'numeric':
+                PREDICTION_RESULTS.inc(source="local_model")
+                results[user_id] = local
+                continue
+            local_results[user_id] = local
+            candidates.append(user_data)
+        
+        pending = []
+        lookups = await self._cache_call(lambda: [self._cache_lookup(user_data)[1] for user_data in candidates])
+        for user_data, cached in zip(candidates, lookups):
+            if cached is not None:
+                llm_results[user_data['user_id']] = cached
+            else:
+                pending.append(user_data)
+        
+        groups = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        for group_results in await asyncio.gather(*(self._evaluate_group(group, deadline) for group in groups)):
+            llm_results.update(group_results)
+        
+        for user_data in users:
+            user_id = user_data['user_id']
+            if user_id in results or (require_ai and user_id not in llm_results):
+                continue
+            results[user_id] = self._combine_results(llm_results.get(user_id), local_results[user_id], user_data)
+        return results
+    
+    def _evaluate_llm(self, user_data: Dict) -> Optional[Dict]:
+        """调用大模型评估，失败返回 None"""
+        cache_key, cached = self._cache_lookup(user_data)
+        if cached is not None:
+            return cached
+        
+        with PREDICTION_STAGE_SECONDS.time(stage="prompt_build"):
+            messages = self._build_messages(user_data)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "你是一位资深的心理干预效果评估专家，拥有20年临床经验。"
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.3,
-                max_tokens=1500
-            )
+            with PREDICTION_STAGE_SECONDS.time(stage="llm_call"):
+                response, _ = self.router.complete(
+                    self.deadline,
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=self.max_tokens
+                )
+        except NoProviderAvailable:
+            self._count_short_circuit()
+            return None
+        except Exception:
+            # 各提供商的失败已在路由中记录
+            return None
+        
+        choice = response.choices[0]
+        result = self._parse_result(choice.message.content, user_data, truncated=choice.finish_reason == "length")
+        self._cache_store(cache_key, result)
+        return result
+    
+    async def _evaluate_llm_async(self, user_data: Dict, deadline: Optional[float] = None) -> Optional[Dict]:
+        """异步调用大模型评估，失败、超时或熔断时返回 None"""
+        cache_key, cached = await self._cache_call(self._cache_lookup, user_data)
+        if cached is not None:
+            return cached
+        
+        deadline = self.deadline if deadline is None else deadline
+        
+        with PREDICTION_STAGE_SECONDS.time(stage="prompt_build"):
+            messages = self._build_messages(user_data)
+        
+        try:
+            async with self._get_semaphore():
+                with PREDICTION_STAGE_SECONDS.time(stage="llm_call"):
+                    response, _ = await self.router.complete_async(
+                        deadline,
+                        messages=messages,
+                        temperature=0.3,
+                        max_tokens=self.max_tokens
+                    )
+        except NoProviderAvailable:
+            self._count_short_circuit()
+            return None
+        except asyncio.TimeoutError:
+            print(f"AI调用超时（{deadline}s）")
+            return None
+        except Exception:
+            # 各提供商的失败已在路由中记录
+            return None
+        
+        choice = response.choices[0]
+        result = self._parse_result(choice.message.content, user_data, truncated=choice.finish_reason == "length")
+        await self._cache_call(self._cache_store, cache_key, result)
+        return result
+    
+    async def _evaluate_group(self, group: List[Dict], deadline: Optional[float] = None) -> Dict[int, Dict]:
+        """一次请求评估一组用户，返回成功解析的 {user_id: AI结果}"""
+        if len(group) == 1:
+            result = await self._evaluate_llm_async(group[0], deadline)
+            return {} if result is None else {group[0]['user_id']: result}
+        
+        deadline = self.deadline if deadline is None else deadline
+        with PREDICTION_STAGE_SECONDS.time(stage="prompt_build"):
+            messages = self._build_batch_messages(group)
+        
+        try:
+            async with self._get_semaphore():
+                with PREDICTION_STAGE_SECONDS.time(stage="llm_call"):
+                    response, _ = await self.router.complete_async(
+                        deadline,
+                        messages=messages,
+                        temperature=0.3,
+                        max_tokens=min(AI_BATCH_MAX_TOKENS, self.prompt.item_tokens * len(group))
+                    )
+        except NoProviderAvailable:
+            self._count_short_circuit()
+            LLM_BATCHES.inc(outcome="error")
+            return {}
+        except asyncio.TimeoutError:
+            print(f"AI批量调用超时（{deadline}s，{len(group)} 个用户）")
+            LLM_BATCHES.inc(outcome="error")
+            return {}
+        except Exception:
+            # 各提供商的失败已在路由中记录；服务异常时拆分重试只会放大失败
+            LLM_BATCHES.inc(outcome="error")
+            return {}
+        
+        choice = response.choices[0]
+        results = self._parse_batch_result(
+            choice.message.content, group, truncated=choice.finish_reason == "length"
+        )
+        if self.cache is not None:
+            await self._cache_call(lambda: [
+                self._cache_store(self.fingerprint(user_data), results[user_data['user_id']])
+                for user_data in group if user_data['user_id'] in results
+            ])
+        missing = [user_data for user_data in group if user_data['user_id'] not in results]
+        if not missing:
+            LLM_BATCHES.inc(outcome="complete")
+            return results
+        
+        LLM_BATCHES.inc(outcome="partial" if results else "failed")
+        half = (len(missing) + 1) // 2
+        parts = [part for part in (missing[:half], missing[half:]) if part]
+        for part_results in await asyncio.gather(*(self._evaluate_group(part, deadline) for part in parts)):
+            results.update(part_results)
+        return results
+    
+    def preview_evaluation(self, user_data: Dict) -> Dict:
+        """不调用AI的即时预测：可信的本地模型结果，否则为规则引擎结果"""
+        local = self._local_prediction(user_data)
+        return local if local is not None else self._rules_result(user_data)
+    
+    async def stream_evaluation(self, user_data: Dict) -> AsyncIterator[Tuple[str, object]]:
+        """
+        流式AI评估
+        
+        依次产出事件：
+            ("delta", 原始文本片段)      AI返回的每个token片段
+            ("analysis", 分析文本片段)   从JSON中增量解出的 analysis 字段
+            ("result", 最终结果字典)     与 evaluate_intervention_async 相同
+        """
+        local = self._local_prediction(user_data)
+        if local is not None and self.local_model_mode == 'numeric':
+            PREDICTION_RESULTS.inc(source="local_model")
+            yield "result", local
+            return
+        
+        cache_key, cached = await self._cache_call(self._cache_lookup, user_data)
+        if cached is not None:
+            yield "result", self._combine_results(cached, local, user_data)
+            return
+        
+        # 流式结果已逐段返回给客户端，不做对冲；失败时直接降级
+        provider = self.router.acquire()
+        if provider is None:
+            self._count_short_circuit()
+            yield "result", self._combine_results(None, local, user_data)
+            return
+        
+        with PREDICTION_STAGE_SECONDS.time(stage="prompt_build"):
+            messages = self._build_messages(user_data)
+        chunks = []
+        analysis = _JsonStringFieldStreamer("analysis")
+        scanner = JsonScanner()
+        llm_result = None
+        finish_reason = None
+        started = None
+        success = None
+        
+        try:
+            async with self._get_semaphore():
+                started = time.perf_counter()
+                stream = await asyncio.wait_for(
+                    provider.async_client.chat.completions.create(
+                        model=provider.model,
+                        messages=messages,
+                        temperature=0.3,
+                        max_tokens=self.max_tokens,
+                        stream=True,
+                        **provider.json_kwargs()
+                    ),
+                    timeout=self.timeout
+                )
+                iterator = stream.__aiter__()
+                while True:
+                    # 每个片段的等待时间同样受 AI_TIMEOUT 限制
+                    try:
+                        chunk = await asyncio.wait_for(iterator.__anext__(), timeout=self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    provider.record_usage(chunk)
+                    if not chunk.choices:
+                        continue
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    chunks.append(delta)
+                    yield "delta", delta
+                    text = analysis.feed(delta)
+                    if text:
+                        yield "analysis", text
+                    if scanner.feed(delta):
+                        # JSON 已完整，不再等待其后的说明文字
+                        await stream.close()
+                        break
             
-            # 解析返回结果
-            result_text = response.choices[0].message.content
+            elapsed = time.perf_counter() - started
+            PREDICTION_STAGE_SECONDS.observe(elapsed, stage="llm_stream")
+            success = True
+            provider.observe(elapsed)
+            provider.count("success")
+            llm_result = self._parse_result("".join(chunks), user_data, truncated=finish_reason == "length")
+            await self._cache_call(self._cache_store, cache_key, llm_result)
+            
+        except asyncio.TimeoutError:
+            print(f"AI流式调用超时（{provider.name}，{self.timeout}s）")
+            provider.count("timeout")
+            success = False
+        except Exception as e:
+            print(f"AI流式调用失败（{provider.name}）: {e}")
+            if provider.json_mode_rejected(e):
+                success = None  # 不计入熔断，下次调用不再使用 JSON 模式
+            else:
+                provider.count("error")
+                success = False
+        finally:
+            # 客户端断开时生成器被关闭（success 为 None），只归还探测名额
+            provider.breaker.record(success, time.perf_counter() - started if started else 0.0)
+        
+        yield "result", self._combine_results(llm_result, local, user_data)
+    
+    def _local_prediction(self, user_data: Dict) -> Optional[Dict]:
+        """本地模型预测；未启用、出错或置信度不足时返回 None"""
+        if self.local_model is None:
+            return None
+        try:
+            with PREDICTION_STAGE_SECONDS.time(stage="local_model"):
+                result = self.local_model.predict(user_data)
+        except Exception as e:
+            print(f"本地模型预测失败: {e}")
+            return None
+        if result['confidence'] < LOCAL_MODEL_MIN_CONFIDENCE:
+            return None
+        return result
+    
+    def _combine_results(self, llm_result: Optional[Dict], local: Optional[Dict], user_data: Dict) -> Dict:
+        """
+        合并各层结果
+        
+        - AI失败：有可信的本地模型结果则用之，否则降级到规则引擎
+        - narrative 模式：数值取本地模型，分析和建议取AI
+        """
+        if llm_result is None:
+            if local is not None:
+                PREDICTION_RESULTS.inc(source="local_model")
+                return local
+            PREDICTION_RESULTS.inc(source="rules")
+            with PREDICTION_STAGE_SECONDS.time(stage="rules"):
+                return self._rules_result(user_data)
+        PREDICTION_RESULTS.inc(source="llm")
+        if local is not None:
+            return {**llm_result, **{key: local[key] for key in LOCAL_NUMERIC_KEYS}}
+        return llm_result
+    
+    @property
+    def provider(self) -> str:
+        """首选提供商名称"""
+        return self.router.primary.name
+    
+    @property
+    def model(self) -> str:
+        """首选提供商的模型"""
+        return self.router.primary.model
+    
+    def fingerprint(self, user_data: Dict) -> str:
+        """首选提供商/模型/prompt 版本下的用户特征指纹（切换首选提供商后重新调用AI）"""
+        return PredictionCache.fingerprint(user_data, self.provider, self.model, self.prompt.version,
+                                           keys=self.prompt.feature_keys)
+    
+    @property
+    def model_version(self) -> str:
+        """AI结果写入 predictions.model_version 的版本（区分 prompt 模板）"""
+        return f"llm-{self.prompt.version}"
+    
+    def prompt_stats(self) -> Dict:
+        """当前 prompt 模板、输出预算及各模板的 token 估算"""
+        return {
+            "active": self.prompt.version,
+            "max_tokens": self.max_tokens,
+            "templates": template_stats(self.prompt.version),
+        }
+    
+    def _cache_lookup(self, user_data: Dict):
+        """
+        查询预测缓存，返回 (缓存键, 结果副本或None)
+        
+        命中的结果标记 cached=True，model_version 加 CACHED_SUFFIX：缓存结果不是新的AI评估，
+        单独计入模型表现，不影响AI层级的耗时和准确率。
+        """
+        if self.cache is None:
+            return None, None
+        key = self.fingerprint(user_data)
+        cached = self.cache.get(key)
+        if cached is None:
+            return key, None
+        result = copy.deepcopy(cached)
+        result["cached"] = True
+        result["model_version"] = f"{result['model_version']}{CACHED_SUFFIX}"
+        return key, result
+    
+    async def _cache_call(self, func: Callable, *args):
+        """在事件循环上访问预测缓存：有 SQLite 二级缓存时交给线程池执行，只有进程内缓存时直接执行"""
+        if self.cache is not None and self.cache.store is not None:
+            return await run_in_threadpool(func, *args)
+        return func(*args)
+    
+    def _count_short_circuit(self):
+        """所有提供商均不可用、跳过AI（计在首选提供商名下）"""
+        self.router.primary.count("short_circuit")
+    
+    def _cache_store(self, key: Optional[str], result: Dict):
+        """缓存AI结果（降级结果不缓存，以便服务恢复后重新调用AI）"""
+        if self.cache is not None and key is not None:
+            self.cache.set(key, copy.deepcopy(result))
+    
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """获取绑定当前事件循环的并发信号量"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+    
+    def _build_messages(self, user_data: Dict) -> List[Dict]:
+        """按当前模板构建对话消息（system 为共享前缀，user 为用户数据）"""
+        messages = self.prompt.messages(user_data)
+        estimate = self.prompt.estimate(user_data)
+        LLM_PROMPT_TOKENS.inc(estimate["prefix_tokens"], version=self.prompt.version, part="prefix")
+        LLM_PROMPT_TOKENS.inc(estimate["user_tokens"], version=self.prompt.version, part="user")
+        return messages
+    
+    def _build_batch_messages(self, users: List[Dict]) -> List[Dict]:
+        """多个用户合并为一次请求的对话消息（共享前缀只发送一次）"""
+        messages = self.prompt.batch_messages(users)
+        LLM_PROMPT_TOKENS.inc(self.prompt.batch_prefix_tokens, version=self.prompt.version, part="prefix")
+        LLM_PROMPT_TOKENS.inc(
+            sum(self.prompt.estimate(user_data)["user_tokens"] for user_data in users),
+            version=self.prompt.version, part="user"
+        )
+        return messages
+    
+    def _parse_result(self, result_text: str, user_data: Dict, truncated: bool = False) -> Dict:
+        """
+        解析AI返回结果
+        
+        容忍 ```json 围栏、前后说明文字和常见格式错误，并校验字段和分数范围；
+        找不到JSON、校验失败或输出被截断（finish_reason=length）后才修复成JSON时用规则提取。
+        """
+        with PREDICTION_STAGE_SECONDS.time(stage="parse"):
+            try:
+                data, method = parse_llm_json(result_text or "")
+            except ValueError:
+                LLM_PARSE.inc(method="text")
+                return self._text_result(result_text, user_data)
+            if truncated and method == PARSE_REPAIRED:
+                print("AI输出被截断，结果不完整")
+                LLM_PARSE.inc(method="truncated")
+                return self._text_result(result_text, user_data)
             
-            # 尝试解析JSON
             try:
-                result = json.loads(result_text)
-            except:
-                # 如果不是JSON，用规则提取
-                result = self._parse_text_response(result_text, user_data)
+                result, fixed = validate_prediction(data, user_data)
+            except ValueError as e:
+                print(f"AI结果校验失败: {e}")
+                LLM_PARSE.inc(method="invalid")
+                return self._text_result(result_text, user_data)
             
+            LLM_PARSE.inc(method=method)
+            for field in fixed:
+                LLM_OUTPUT_FIXES.inc(field=field)
+            result["model_version"] = self.model_version
             return result
+    
+    def _parse_batch_result(self, result_text: str, group: List[Dict], truncated: bool = False) -> Dict[int, Dict]:
+        """
+        解析批量评估结果，返回通过校验的 {user_id: AI结果}
+        
+        输出被截断（finish_reason=length）时，修复后的最后一项可能不完整，丢弃后重新评估。
+        """
+        with PREDICTION_STAGE_SECONDS.time(stage="parse"):
+            try:
+                items, method = parse_llm_batch(result_text or "")
+            except ValueError as e:
+                print(f"AI批量结果解析失败: {e}")
+                return {}
+            if truncated and method == PARSE_REPAIRED and items:
+                items.popitem()
             
-        except Exception as e:
-            print(f"AI调用失败: {e}")
-            # 降级：使用规则引擎
-            return self._fallback_evaluation(user_data)
-    
-    def _build_evaluation_prompt(self, user_data: Dict) -> str:
-        """构建评估prompt"""
-        return f"""
-请作为心理干预效果评估专家，分析以下用户的干预情况：
-
-【用户信息】
-- 姓名：{user_data.get('name', '未知')}
-- 年龄：{user_data.get('age', '未知')}岁
-- 性别：{'男' if user_data.get('gender') == 1 else '女'}
-
-【测评数据】
-- 前测焦虑分数：{user_data.get('pre_score', 0)}分（GAD-7量表，满分21分）
-- 后测分数：{user_data.get('post_score', '未完成')}
-
-【学习数据】
-- 已完成周数：{user_data.get('weeks_completed', 0)}周（共8周）
-- 总打卡次数：{user_data.get('total_checkins', 0)}次
-- 打卡率：{user_data.get('checkin_rate', 0) * 100:.0f}%
-- 平均学习时长：{user_data.get('avg_study_duration', 0)}分钟/次
-- 周完成率：{user_data.get('completion_rate', 0) * 100:.0f}%
-
-【参考标准】
-- GAD-7评分：0-4分轻度，5-9分轻中度，10-14分中度，15-21分重度
-- 打卡率：>80%良好，60-80%一般，<60%较差
-- 临床显著改善：分数下降≥25%或下降≥5分
-
-请提供专业评估，以JSON格式返回：
-{{
-    "predicted_score_min": 预测后测最低分,
-    "predicted_score_max": 预测后测最高分,
-    "predicted_score_most_likely": 最可能的后测分数,
-    "predicted_improvement": 预测改善幅度,
-    "predicted_improvement_rate": 预测改善率（百分比）,
-    "current_progress": "当前进展评价（良好/一般/较差）",
-    "risk_level": "风险等级（low/medium/high）",
-    "confidence": 置信度（0-1之间的小数）,
-    "suggestions": [
-        "具体建议1",
-        "具体建议2",
-        "具体建议3"
-    ],
-    "analysis": "详细分析说明（100-200字）"
-}}
-
-注意：
-1. 如果已有后测数据，就评估实际效果
-2. 如果没有后测数据，根据前3周数据预测
-3. 打卡率越高，预测改善效果越好
-4. 前测分数越高，改善空间越大
-5. 给出的建议要具体可操作
-"""
+            results = {}
+            for user_data in group:
+                item = items.get(user_data['user_id'])
+                if item is None:
+                    continue
+                try:
+                    result, fixed = validate_prediction(item, user_data)
+                except ValueError as e:
+                    print(f"AI结果校验失败（用户 {user_data['user_id']}）: {e}")
+                    LLM_PARSE.inc(method="invalid")
+                    continue
+                LLM_PARSE.inc(method=method)
+                for field in fixed:
+                    LLM_OUTPUT_FIXES.inc(field=field)
+                result["model_version"] = self.model_version
+                results[user_data['user_id']] = result
+            return results
+    
+    def _text_result(self, text: str, user_data: Dict) -> Dict:
+        """AI未返回可用JSON时的规则结果（单独的 model_version，不计入AI的表现）"""
+        return {**self._parse_text_response(text, user_data), "model_version": RULE_VERSIONS[MODE_TEXT]}
+    
+    def _rules_result(self, user_data: Dict) -> Dict:
+        """规则引擎降级结果"""
+        return {**self._fallback_evaluation(user_data), "model_version": RULE_VERSIONS[MODE_FALLBACK]}
     
     def _parse_text_response(self, text: str, user_data: Dict) -> Dict:
         """解析文本响应（如果AI没返回JSON）"""
@@ -147,26 +634,6 @@ class AIService:
         improvement = pre_score * improvement_rate
         predicted_score = max(3, pre_score - improvement)
         
-        # 生成人类可读的分析文本
-        analysis_parts = []
-        analysis_parts.append(f"该用户前测GAD-7分数为{pre_score:.1f}分，")
-        
-        if checkin_rate >= 0.8:
-            analysis_parts.append(f"打卡率达到{checkin_rate*100:.0f}%，学习表现优秀。")
-        elif checkin_rate >= 0.6:
-            analysis_parts.append(f"打卡率为{checkin_rate*100:.0f}%，学习参与度一般。")
-        else:
-            analysis_parts.append(f"打卡率仅{checkin_rate*100:.0f}%，需要加强督促。")
-        
-        analysis_parts.append(f"基于当前数据，预测8周后分数约为{predicted_score:.1f}分，改善率约{improvement_rate*100:.0f}%。")
-        
-        if risk == "low":
-            analysis_parts.append("干预进展顺利，建议保持当前方案。")
-        elif risk == "medium":
-            analysis_parts.append("存在一定风险，建议关注用户状态。")
-        else:
-            analysis_parts.append("风险较高，建议及时调整干预强度。")
-        
         return {
             "predicted_score_min": round(predicted_score - 1, 1),
             "predicted_score_max": round(predicted_score + 1, 1),
@@ -176,12 +643,8 @@ class AIService:
             "current_progress": progress,
             "risk_level": risk,
             "confidence": 0.75,
-            "suggestions": [
-                "保持当前学习频率" if checkin_rate >= 0.7 else "建议提高打卡率",
-                "建议第6周进行中期评估",
-                "可以增加放松训练"
-            ],
-            "analysis": "".join(analysis_parts)
+            "suggestions": text_suggestions(checkin_rate),
+            "analysis": text_analysis(pre_score, checkin_rate, predicted_score, improvement_rate, risk)
         }
     
     def _fallback_evaluation(self, user_data: Dict) -> Dict:
@@ -214,48 +677,6 @@ class AIService:
         improvement = pre_score * improvement_rate
         predicted_score = max(3, pre_score - improvement)
         
-        # 生成建议
-        suggestions = []
-        if checkin_rate < 0.7:
-            suggestions.append("建议提高打卡率，增加学习频率")
-        else:
-            suggestions.append("保持当前良好的学习习惯")
-        
-        if weeks >= 3:
-            suggestions.append("建议第6周进行中期测评")
-        
-        suggestions.append("可以尝试增加正念呼吸练习")
-        
-        # 生成详细分析
-        analysis_parts = []
-        
-        # 基线评估
-        if pre_score >= 15:
-            analysis_parts.append(f"该用户前测GAD-7分数为{pre_score:.1f}分，属于重度焦虑水平，具有较大的改善空间。")
-        elif pre_score >= 10:
-            analysis_parts.append(f"该用户前测GAD-7分数为{pre_score:.1f}分，属于中度焦虑水平。")
-        else:
-            analysis_parts.append(f"该用户前测GAD-7分数为{pre_score:.1f}分，属于轻度焦虑水平。")
-        
-        # 学习表现评估
-        if checkin_rate >= 0.8:
-            analysis_parts.append(f"用户打卡率达到{checkin_rate*100:.0f}%，学习积极性非常高，这对干预效果有显著的正向影响。")
-        elif checkin_rate >= 0.6:
-            analysis_parts.append(f"用户打卡率为{checkin_rate*100:.0f}%，学习参与度一般，建议加强督促和激励。")
-        else:
-            analysis_parts.append(f"用户打卡率仅为{checkin_rate*100:.0f}%，学习参与度较低，这可能影响最终效果，建议及时干预。")
-        
-        # 预测结果
-        analysis_parts.append(f"基于当前数据，预测8周后GAD-7分数约为{predicted_score:.1f}分，预期改善幅度约{improvement:.1f}分（改善率{improvement_rate*100:.0f}%）。")
-        
-        # 风险评估
-        if risk == "low":
-            analysis_parts.append("目前干预进展顺利，风险等级较低，建议继续保持。")
-        elif risk == "medium":
-            analysis_parts.append("目前存在一定风险，建议关注用户状态，适时调整干预方案。")
-        else:
-            analysis_parts.append("目前风险等级较高，建议立即加强干预力度或考虑其他辅助措施。")
-        
         return {
             "predicted_score_min": round(predicted_score - 1, 1),
             "predicted_score_max": round(predicted_score + 1, 1),
@@ -265,11 +686,65 @@ class AIService:
             "current_progress": progress,
             "risk_level": risk,
             "confidence": 0.70,
-            "suggestions": suggestions,
-            "analysis": " ".join(analysis_parts)
+            "suggestions": fallback_suggestions(checkin_rate, weeks),
+            "analysis": fallback_analysis(pre_score, checkin_rate, predicted_score, improvement, improvement_rate, risk)
         }
 
 
+class _JsonStringFieldStreamer:
+    """从逐段到达的JSON文本中增量解出某个字符串字段的内容"""
+    
+    _ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+    
+    def __init__(self, field: str):
+        self.pattern = re.compile(r'"' + re.escape(field) + r'"\s*:\s*"')
+        self.buffer = ""
+        self.start = None   # 字段值在 buffer 中的起始位置
+        self.pos = None     # 已解码到的位置
+        self.done = False
+    
+    def feed(self, delta: str) -> str:
+        """追加文本片段，返回新解出的字段内容"""
+        if self.done:
+            return ""
+        self.buffer += delta
+        if self.start is None:
+            match = self.pattern.search(self.buffer)
+            if not match:
+                return ""
+            self.start = self.pos = match.end()
+        
+        out = []
+        buffer, pos = self.buffer, self.pos
+        while pos < len(buffer):
+            ch = buffer[pos]
+            if ch == '"':
+                self.done = True
+                pos += 1
+                break
+            if ch != '\\':
+                out.append(ch)
+                pos += 1
+                continue
+            # 转义序列不完整时等待后续片段
+            if pos + 1 >= len(buffer):
+                break
+            code = buffer[pos + 1]
+            if code == 'u':
+                if pos + 6 > len(buffer):
+                    break
+                try:
+                    out.append(chr(int(buffer[pos + 2:pos + 6], 16)))
+                except ValueError:
+                    pass
+                pos += 6
+            else:
+                out.append(self._ESCAPES.get(code, code))
+                pos += 2
+        self.pos = pos
+        return "".join(out)
+
+
 # 全局AI服务实例
 ai_service = AIService()
 
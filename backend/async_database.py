@@ -0,0 +1,299 @@
+"""
+异步数据库访问 - 与 Database 相同的查询接口（协程版本），API 路由在事件循环上直接 await
+
+- AsyncDatabase：基于 aiomysql 的原生异步实现（自带连接池，不占用线程池；实验性）
+- ThreadedDatabase：包装同步的 Database，每次调用交给线程池执行
+由 DB_DRIVER 选择（aiomysql / pymysql），两者的方法、参数和返回值一致，见 tests/test_db_contract.py。
+导入、重建统计和后台任务仍使用同步的 Database。
+"""
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from config import (
+    DB_CONFIG, DB_DRIVER, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_IDLE_TIMEOUT, DB_POOL_WAIT_TIMEOUT
+)
+from database import (
+    FEATURE_CHUNK_SIZE, FEATURE_SQL, PREDICTION_INSERT_SQL, USER_INSERT_SQL, ASSESSMENT_INSERT_SQL,
+    LEARNING_LOG_INSERT_SQL, LEARNING_STATS_DELTA_SQL, PERFORMANCE_PREDICTIONS_SQL,
+    build_summary_query, build_user_ids_query, db,
+    _learning_stats_deltas, _performance_prediction_deltas, _prediction_params, _summary_rows,
+    _user_children_params, _user_data_from_row, _user_row_params
+)
+from db_pool import PoolExhaustedError
+from metrics import DB_QUERY_SECONDS
+
+DRIVERS = ("pymysql", "aiomysql")
+
+
+class AsyncDatabase:
+    """
+    aiomysql 实现
+
+    连接池在 start() 中创建（须在事件循环内，由 FastAPI lifespan 调用），close() 关闭。
+    连接耗尽时最多等待 wait_timeout 秒，超时抛 PoolExhaustedError（与同步连接池的 block 策略一致）。
+    """
+
+    driver = "aiomysql"
+
+    def __init__(self, config: Optional[Dict] = None, min_size: int = DB_POOL_MIN_SIZE,
+                 max_size: int = DB_POOL_MAX_SIZE, recycle: float = DB_POOL_IDLE_TIMEOUT,
+                 wait_timeout: float = DB_POOL_WAIT_TIMEOUT):
+        self.config = config or DB_CONFIG
+        self.min_size = min_size
+        self.max_size = max_size
+        self.recycle = recycle
+        self.wait_timeout = wait_timeout
+        self._aiomysql = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+        # 指标
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+
+    async def start(self):
+        try:
+            import aiomysql
+        except ImportError:
+            raise RuntimeError("DB_DRIVER=aiomysql 需要安装 aiomysql（pip install aiomysql）")
+        self._aiomysql = aiomysql
+        config = dict(self.config)
+        self._pool = await aiomysql.create_pool(
+            minsize=self.min_size,
+            maxsize=self.max_size,
+            pool_recycle=int(self.recycle),
+            host=config.pop("host"),
+            port=config.pop("port"),
+            user=config.pop("user"),
+            password=config.pop("password"),
+            db=config.pop("database"),
+            autocommit=False,
+            **config
+        )
+
+    async def close(self):
+        if self._pool is None:
+            return
+        self._pool.close()
+        await self._pool.wait_closed()
+        self._pool = None
+
+    @asynccontextmanager
+    async def connection(self):
+        """借出连接（结束时回滚未提交的事务后归还，已提交的写入不受影响）"""
+        if self._pool is None:
+            raise RuntimeError("异步数据库未启动")
+        started = time.perf_counter()
+        waited = self._pool.freesize == 0 and self._pool.size >= self.max_size
+        try:
+            conn = await asyncio.wait_for(self._pool.acquire(), timeout=self.wait_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timeouts += 1
+            raise PoolExhaustedError(f"等待数据库连接超时（{self.wait_timeout}s）")
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+                self._wait_time_total += elapsed
+                self._wait_time_max = max(self._wait_time_max, elapsed)
+        try:
+            yield conn
+        finally:
+            # 与同步连接池一样，正常结束也回滚：只读查询留下的事务会让 aiomysql 在归还时关闭连接
+            await self._safe_rollback(conn)
+            self._pool.release(conn)
+
+    @staticmethod
+    async def _safe_rollback(conn):
+        """结束连接上未提交的事务；失败说明连接已不可用，关闭后归还时由连接池丢弃"""
+        try:
+            await conn.rollback()
+        except Exception:
+            conn.close()
+
+    async def get_complete_user_data(self, user_id: int) -> Optional[Dict]:
+        """获取用户完整数据（用于AI分析），单条SQL一次往返"""
+        return (await self.get_complete_user_data_many([user_id])).get(user_id)
+
+    async def get_complete_user_data_many(self, user_ids: List[int]) -> Dict[int, Dict]:
+        """批量获取用户完整数据（每 FEATURE_CHUNK_SIZE 个用户一条SQL，共用一个连接）"""
+        ids = list(dict.fromkeys(int(uid) for uid in user_ids))
+        if not ids:
+            return {}
+
+        rows = {}
+        async with self.connection() as conn:
+            async with conn.cursor(self._aiomysql.DictCursor) as cursor:
+                for start in range(0, len(ids), FEATURE_CHUNK_SIZE):
+                    chunk = ids[start:start + FEATURE_CHUNK_SIZE]
+                    placeholders = ", ".join(["%s"] * len(chunk))
+                    with DB_QUERY_SECONDS.time(query="feature_fetch"):
+                        await cursor.execute(FEATURE_SQL.format(ids=placeholders), (*chunk, *chunk))
+                        fetched = await cursor.fetchall()
+                    for row in fetched:
+                        rows[row['user_id']] = _user_data_from_row(row)
+
+        return {uid: rows[uid] for uid in ids if uid in rows}
+
+    async def save_prediction(self, user_id: int, prediction_data: Dict) -> int:
+        """保存预测结果（同一事务内累加模型表现）"""
+        params = _prediction_params(user_id, prediction_data)
+        with DB_QUERY_SECONDS.time(query="prediction_insert"):
+            async with self.connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(PREDICTION_INSERT_SQL, params)
+                    prediction_id = cursor.lastrowid
+                    await cursor.executemany(PERFORMANCE_PREDICTIONS_SQL, _performance_prediction_deltas([params]))
+                    await conn.commit()
+                    return prediction_id
+
+    async def save_predictions_many(self, records: List[Dict]) -> int:
+        """批量保存预测结果（一条多行 INSERT，同一事务内累加模型表现），返回写入行数"""
+        if not records:
+            return 0
+        params = [_prediction_params(r['user_id'], r) for r in records]
+        with DB_QUERY_SECONDS.time(query="prediction_insert_many"):
+            async with self.connection() as conn:
+                async with conn.cursor() as cursor:
+                    count = await cursor.executemany(PREDICTION_INSERT_SQL, params)
+                    await cursor.executemany(PERFORMANCE_PREDICTIONS_SQL, _performance_prediction_deltas(params))
+                    await conn.commit()
+                    return count
+
+    async def get_user_ids(self, status: Optional[int] = None, project_id: Optional[int] = None,
+                           limit: Optional[int] = None) -> List[int]:
+        """按状态/项目筛选用户ID"""
+        with DB_QUERY_SECONDS.time(query="user_ids"):
+            async with self.connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(*build_user_ids_query(status, project_id, limit))
+                    return [row[0] for row in await cursor.fetchall()]
+
+    async def get_all_users_summary(self, status: Optional[int] = None, project_id: Optional[int] = None,
+                                    risk_level: Optional[str] = None,
+                                    min_improvement: Optional[float] = None, max_improvement: Optional[float] = None,
+                                    sort: str = 'user_id', order: str = 'asc',
+                                    after_user_id: Optional[int] = None, after_value: Optional[float] = None,
+                                    limit: Optional[int] = None) -> List[Dict]:
+        """获取用户概况（参数同 Database.get_all_users_summary）"""
+        sql, params = build_summary_query(
+            status=status, project_id=project_id, risk_level=risk_level,
+            min_improvement=min_improvement, max_improvement=max_improvement,
+            sort=sort, order=order, after_user_id=after_user_id, after_value=after_value,
+            limit=limit
+        )
+        with DB_QUERY_SECONDS.time(query="user_summary"):
+            async with self.connection() as conn:
+                async with conn.cursor(self._aiomysql.DictCursor) as cursor:
+                    await cursor.execute(sql, params)
+                    return _summary_rows(await cursor.fetchall())
+
+    async def create_user(self, user_data: Dict) -> int:
+        """创建新用户并返回用户ID（一个事务，出错时回滚）"""
+        with DB_QUERY_SECONDS.time(query="user_insert"):
+            async with self.connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(USER_INSERT_SQL, _user_row_params(user_data))
+                    user_id = cursor.lastrowid
+                    assessments, logs = _user_children_params([(user_id, user_data)])
+                    if assessments:
+                        await cursor.executemany(ASSESSMENT_INSERT_SQL, assessments)
+                    if logs:
+                        await cursor.executemany(LEARNING_LOG_INSERT_SQL, logs)
+                        await cursor.executemany(LEARNING_STATS_DELTA_SQL, _learning_stats_deltas(logs))
+                    await conn.commit()
+                    return user_id
+
+    def stats(self) -> Dict:
+        """连接池指标（字段与同步连接池一致）"""
+        size = self._pool.size if self._pool is not None else 0
+        idle = self._pool.freesize if self._pool is not None else 0
+        with self._lock:
+            return {
+                "driver": self.driver,
+                "size": size,
+                "idle": idle,
+                "in_use": size - idle,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_total_ms": round(self._wait_time_total * 1000, 2),
+                "wait_time_avg_ms": round(self._wait_time_total * 1000 / self._waits, 2) if self._waits else 0,
+                "wait_time_max_ms": round(self._wait_time_max * 1000, 2),
+                "timeouts": self._timeouts,
+            }
+
+
+class ThreadedDatabase:
+    """同步 Database 的异步包装：每次调用在线程池中执行（DB_DRIVER=pymysql）"""
+
+    driver = "pymysql"
+
+    def __init__(self, database):
+        self.database = database
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def get_complete_user_data(self, user_id: int) -> Optional[Dict]:
+        return await run_in_threadpool(self.database.get_complete_user_data, user_id)
+
+    async def get_complete_user_data_many(self, user_ids: List[int]) -> Dict[int, Dict]:
+        return await run_in_threadpool(self.database.get_complete_user_data_many, user_ids)
+
+    async def save_prediction(self, user_id: int, prediction_data: Dict) -> int:
+        return await run_in_threadpool(self.database.save_prediction, user_id, prediction_data)
+
+    async def save_predictions_many(self, records: List[Dict]) -> int:
+        return await run_in_threadpool(self.database.save_predictions_many, records)
+
+    async def get_user_ids(self, status: Optional[int] = None, project_id: Optional[int] = None,
+                           limit: Optional[int] = None) -> List[int]:
+        return await run_in_threadpool(self.database.get_user_ids, status, project_id, limit)
+
+    async def get_all_users_summary(self, status: Optional[int] = None, project_id: Optional[int] = None,
+                                    risk_level: Optional[str] = None,
+                                    min_improvement: Optional[float] = None, max_improvement: Optional[float] = None,
+                                    sort: str = 'user_id', order: str = 'asc',
+                                    after_user_id: Optional[int] = None, after_value: Optional[float] = None,
+                                    limit: Optional[int] = None) -> List[Dict]:
+        return await run_in_threadpool(lambda: self.database.get_all_users_summary(
+            status=status, project_id=project_id, risk_level=risk_level,
+            min_improvement=min_improvement, max_improvement=max_improvement,
+            sort=sort, order=order, after_user_id=after_user_id, after_value=after_value,
+            limit=limit
+        ))
+
+    async def create_user(self, user_data: Dict) -> int:
+        return await run_in_threadpool(self.database.create_user, user_data)
+
+    def stats(self) -> Dict:
+        # 连接池即同步 Database 的连接池（见 db_pool）
+        return {"driver": self.driver, "pool": "db_pool"}
+
+
+def create_async_database(driver: str = DB_DRIVER, database=None):
+    """按驱动创建异步数据库访问对象（未知驱动抛出 ValueError）"""
+    if driver == "aiomysql":
+        return AsyncDatabase()
+    if driver == "pymysql":
+        return ThreadedDatabase(database or db)
+    raise ValueError(f"未知的数据库驱动: {driver}（可选 {', '.join(DRIVERS)}）")
+
+
+# 全局异步数据库实例（API 路由使用）
+adb = create_async_database()
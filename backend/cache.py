@@ -0,0 +1,382 @@
+"""
+缓存组件：进程内 TTL/LRU 缓存 + 可选 SQLite 持久化（预测结果缓存、用户详情/列表读缓存）
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+
+class TTLCache:
+    """线程安全的 LRU 缓存，条目超过 ttl 秒过期"""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, expires_at: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (value, expires_at if expires_at is not None else time.time() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0,
+                "evictions": self.evictions,
+            }
+
+
+class SQLiteStore:
+    """基于本地 SQLite 文件的键值存储（JSON 序列化，带过期时间）"""
+
+    def __init__(self, path: str, table: str = "cache"):
+        self.path = path
+        self.table = table
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute(f"DELETE FROM {table} WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[tuple]:
+        """返回 (value, expires_at)，不存在或已过期返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any, expires_at: float):
+        data = json.dumps(value, ensure_ascii=False, default=_json_default)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, data, expires_at)
+            )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+
+# 缓存命中的AI结果写入 predictions 时 model_version 的后缀（与新的AI评估分开统计模型表现）
+CACHED_SUFFIX = "+cached"
+
+
+class PredictionCache:
+    """
+    预测结果缓存
+
+    键为用户特征 + 提供商/模型/prompt版本的哈希；进程内 LRU 为一级，
+    可选 SQLite 文件为二级，服务重启后仍可命中。
+    """
+
+    # 默认参与指纹计算的特征（prompt 模板可用到的全部字段；调用方可只传模板实际用到的字段）
+    FEATURE_KEYS = (
+        'name', 'age', 'gender', 'pre_score', 'post_score',
+        'weeks_completed', 'total_checkins', 'checkin_rate',
+        'avg_study_duration', 'completion_rate'
+    )
+
+    def __init__(self, max_size: int = 10000, ttl: float = 3600, sqlite_path: Optional[str] = None):
+        self.memory = TTLCache(max_size=max_size, ttl=ttl)
+        self.store = SQLiteStore(sqlite_path, table="prediction_cache") if sqlite_path else None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.persistent_hits = 0
+
+    @classmethod
+    def fingerprint(cls, user_data: Dict, provider: str, model: str, prompt_version: str,
+                    keys: Optional[Iterable[str]] = None) -> str:
+        """特征指纹：数值统一为4位小数，避免 Decimal/float 表示差异；keys 为参与计算的特征，默认 FEATURE_KEYS"""
+        features = {key: _normalize(user_data.get(key)) for key in (keys or cls.FEATURE_KEYS)}
+        payload = json.dumps(
+            {"f": features, "p": provider, "m": model, "v": prompt_version},
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        value = self.memory.get(key)
+        if value is None and self.store is not None:
+            try:
+                entry = self.store.get(key)
+            except Exception as e:
+                print(f"读取预测缓存失败: {e}")
+                entry = None
+            if entry is not None:
+                value, expires_at = entry
+                self.memory.set(key, value, expires_at=expires_at)
+                with self._lock:
+                    self.persistent_hits += 1
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: Dict):
+        expires_at = time.time() + self.memory.ttl
+        self.memory.set(key, value, expires_at=expires_at)
+        if self.store is not None:
+            try:
+                self.store.set(key, value, expires_at)
+            except Exception as e:
+                print(f"写入预测缓存失败: {e}")
+
+    def clear(self):
+        self.memory.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0,
+                "persistent_hits": self.persistent_hits,
+                "backend": "sqlite" if self.store is not None else "memory",
+            }
+        memory = self.memory.stats()
+        stats.update(size=memory["size"], max_size=memory["max_size"],
+                     ttl=memory["ttl"], evictions=memory["evictions"])
+        return stats
+
+
+class UserDataCache:
+    """
+    用户详情/列表读缓存（read-through）
+
+    详情按 user_id、列表按查询参数缓存，值和 ETag 一起保存。进程内 LRU 为一级；
+    store_factory(表名) 可提供多个 worker 共用的二级存储（SQLiteStore，或实现 get/set/delete/clear 的其它存储），
+    此时进程内条目最多保留 local_ttl 秒，其它 worker 的失效在这段时间后可见。
+    共享存储的读写在线程池中执行，不阻塞事件循环。
+
+    创建/导入用户、导入学习记录、写入预测记录后显式失效：事件循环上 await invalidate_*_async，
+    线程池中（如导入的写入回调）调用 invalidate_*。失效期间正在加载的结果不写入缓存，避免旧数据覆盖失效；
+    共享存储的删除完成前不读共享存储。
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 30, local_ttl: float = 2,
+                 store_factory: Optional[Callable[[str], Any]] = None):
+        self.ttl = ttl
+        self.store = store_factory("user_detail_cache") if store_factory else None
+        self.list_store = store_factory("user_list_cache") if store_factory else None
+        memory_ttl = min(ttl, local_ttl) if store_factory else ttl
+        self.users = TTLCache(max_size=max_size, ttl=memory_ttl)
+        self.lists = TTLCache(max_size=max_size, ttl=memory_ttl)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._store_pending = 0  # 进行中的共享存储失效
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def etag(value: Any) -> str:
+        payload = json.dumps(value, sort_keys=True, ensure_ascii=False, default=_json_default)
+        return '"' + hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32] + '"'
+
+    @staticmethod
+    def list_key(params: Dict) -> str:
+        return json.dumps(params, sort_keys=True, default=_json_default)
+
+    async def get_user(self, user_id: int, load: Callable[[], Awaitable[Optional[Dict]]]
+                       ) -> Optional[Tuple[Dict, str]]:
+        """返回 (用户详情, ETag)，未命中时 await load() 加载；用户不存在返回 None（不缓存）"""
+        return await self._read(self.users, self.store, str(user_id), load)
+
+    async def get_list(self, params: Dict, load: Callable[[], Awaitable[Dict]]) -> Tuple[Dict, str]:
+        """返回 (列表响应, ETag)，params 为完整的查询参数"""
+        return await self._read(self.lists, self.list_store, self.list_key(params), load)
+
+    def invalidate_users(self, user_ids: Iterable[int]):
+        """用户数据变化（如导入学习记录）：删除这些用户的详情，并清空列表"""
+        self._run_store_ops(self._drop_users(user_ids))
+
+    async def invalidate_users_async(self, user_ids: Iterable[int]):
+        await self._run_store_ops_async(self._drop_users(user_ids))
+
+    def invalidate_lists(self):
+        """新增用户或预测记录：只清空列表"""
+        self._run_store_ops(self._drop_lists())
+
+    async def invalidate_lists_async(self):
+        await self._run_store_ops_async(self._drop_lists())
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+        self.users.clear()
+        self._store_call(self.store, "clear")
+        self.lists.clear()
+        self._store_call(self.list_store, "clear")
+
+    async def _read(self, memory: TTLCache, store, key: str, load):
+        entry = memory.get(key)
+        if entry is None and store is not None:
+            with self._lock:
+                generation, pending = self._generation, self._store_pending
+            stored = None if pending else await run_in_threadpool(self._store_call, store, "get", key)
+            with self._lock:
+                fresh = generation == self._generation
+            if stored is not None and fresh:
+                entry = stored[0]
+                memory.set(key, entry)
+                with self._lock:
+                    self.shared_hits += 1
+        if entry is not None:
+            with self._lock:
+                self.hits += 1
+            return entry["value"], entry["etag"]
+
+        with self._lock:
+            self.misses += 1
+            generation = self._generation
+        value = await load()
+        if value is None:
+            return None
+        entry = {"value": value, "etag": self.etag(value)}
+        with self._lock:
+            fresh = generation == self._generation and not self._store_pending
+        if fresh:
+            memory.set(key, entry)
+            if store is not None:
+                await run_in_threadpool(self._store_call, store, "set", key, entry, time.time() + self.ttl)
+        return entry["value"], entry["etag"]
+
+    def _drop_users(self, user_ids: Iterable[int]) -> List[tuple]:
+        """失效进程内的用户详情和列表，返回待执行的共享存储操作"""
+        keys = {str(int(uid)) for uid in user_ids}
+        ops = [(self.store, "delete", key) for key in keys]
+        for key in keys:
+            self.users.delete(key)
+        return ops + self._drop_lists()
+
+    def _drop_lists(self) -> List[tuple]:
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            if self.store is not None:
+                self._store_pending += 1
+        self.lists.clear()
+        return [(self.list_store, "clear")] if self.store is not None else []
+
+    def _run_store_ops(self, ops: List[tuple]):
+        if self.store is None:
+            return
+        try:
+            for store, method, *args in ops:
+                self._store_call(store, method, *args)
+        finally:
+            with self._lock:
+                self._store_pending -= 1
+
+    async def _run_store_ops_async(self, ops: List[tuple]):
+        if self.store is not None:
+            await run_in_threadpool(self._run_store_ops, ops)
+
+    @staticmethod
+    def _store_call(store, method: str, *args):
+        """共享存储出错时只记录日志，按未命中处理"""
+        if store is None:
+            return None
+        try:
+            return getattr(store, method)(*args)
+        except Exception as e:
+            print(f"用户数据缓存存储操作失败（{method}）: {e}")
+            return None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0,
+                "shared_hits": self.shared_hits,
+                "invalidations": self.invalidations,
+                "backend": "memory" if self.store is None else type(self.store).__name__,
+            }
+        users, lists = self.users.stats(), self.lists.stats()
+        stats.update(user_entries=users["size"], list_entries=lists["size"], max_size=users["max_size"],
+                     ttl=self.ttl, evictions=users["evictions"] + lists["evictions"])
+        return stats
+
+
+def _normalize(value):
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return round(float(value), 4)
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"无法序列化类型: {type(value).__name__}")
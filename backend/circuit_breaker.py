@@ -0,0 +1,152 @@
+"""
+熔断器 - 大模型服务异常（错误率或慢调用比例过高）时直接降级，不再等待超时
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+STATE_CLOSED = "closed"        # 正常调用
+STATE_OPEN = "open"            # 熔断：直接降级
+STATE_HALF_OPEN = "half_open"  # 探测：放行少量调用，全部成功则恢复
+
+STATE_CODES = {STATE_CLOSED: 0, STATE_OPEN: 1, STATE_HALF_OPEN: 2}
+
+
+class CircuitBreaker:
+    """
+    基于最近 N 次调用的熔断器（线程安全，同步/异步路径共用）
+
+    - closed：最近 window 次调用中（至少 min_calls 次）失败比例 ≥ error_rate，
+      或耗时超过 slow_call 秒的比例 ≥ slow_rate 时熔断
+    - open：open_seconds 秒内 allow() 返回 False，之后进入 half_open
+    - half_open：最多放行 half_open_calls 个探测调用，全部成功则恢复，任一失败或过慢则重新熔断
+
+    用法：allow() 为 True 时发起调用，结束后必须调用 record()。
+    """
+
+    def __init__(self, window: int = 20, min_calls: int = 10, error_rate: float = 0.5,
+                 slow_call: float = 10.0, slow_rate: float = 0.5,
+                 open_seconds: float = 30.0, half_open_calls: int = 2, enabled: bool = True):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._calls = deque(maxlen=window)  # 最近调用：(失败, 过慢)
+        self._opened_at = 0.0
+        self._probes = 0          # half_open 下已放行的探测数
+        self._probe_successes = 0
+
+        self.rejected = 0
+        self.opened = 0
+        self.last_reason: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def allow(self) -> bool:
+        """是否允许发起调用（False 表示应直接降级）"""
+        if not self.enabled:
+            return True
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == STATE_CLOSED:
+                return True
+            if self._state == STATE_HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success: Optional[bool], duration: float):
+        """
+        记录调用结果
+
+        Args:
+            success: True 成功 / False 失败或超时 / None 未完成（如被取消），只归还探测名额
+            duration: 调用耗时（秒）
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if success is None:
+                if self._state == STATE_HALF_OPEN and self._probes > 0:
+                    self._probes -= 1
+                return
+
+            slow = duration >= self.slow_call
+            if self._state == STATE_HALF_OPEN:
+                if not success or slow:
+                    self._open("half_open 探测" + ("失败" if not success else f"过慢（{duration:.1f}s）"))
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_calls:
+                    self._state = STATE_CLOSED
+                    self._calls.clear()
+                return
+
+            if self._state == STATE_OPEN:
+                # 熔断前已发出的调用，结果不再计入
+                return
+
+            self._calls.append((not success, slow))
+            if len(self._calls) < self.min_calls:
+                return
+            failures = sum(1 for failed, _ in self._calls if failed)
+            slow_calls = sum(1 for _, is_slow in self._calls if is_slow)
+            if failures / len(self._calls) >= self.error_rate:
+                self._open(f"错误率 {failures}/{len(self._calls)}")
+            elif slow_calls / len(self._calls) >= self.slow_rate:
+                self._open(f"慢调用（≥{self.slow_call}s）{slow_calls}/{len(self._calls)}")
+
+    def reset(self):
+        """手动恢复为 closed"""
+        with self._lock:
+            self._state = STATE_CLOSED
+            self._calls.clear()
+
+    def _open(self, reason: str):
+        self._state = STATE_OPEN
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+        self.opened += 1
+        self.last_reason = reason
+        print(f"⚠ 大模型熔断：{reason}，{self.open_seconds}s 后探测恢复")
+
+    def _maybe_half_open(self):
+        if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = STATE_HALF_OPEN
+            self._probes = 0
+            self._probe_successes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._maybe_half_open()
+            calls = len(self._calls)
+            failures = sum(1 for failed, _ in self._calls if failed)
+            slow_calls = sum(1 for _, is_slow in self._calls if is_slow)
+            retry_in = None
+            if self._state == STATE_OPEN:
+                retry_in = round(max(0.0, self.open_seconds - (time.monotonic() - self._opened_at)), 1)
+            return {
+                "enabled": self.enabled,
+                "state": self._state,
+                "state_code": STATE_CODES[self._state],
+                "window_calls": calls,
+                "error_rate": round(failures / calls, 4) if calls else 0,
+                "slow_rate": round(slow_calls / calls, 4) if calls else 0,
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "retry_in": retry_in,
+                "last_reason": self.last_reason,
+            }
@@ -26,6 +26,19 @@ DB_CONFIG = {
     "charset": "utf8mb4"
 }
 
+# 数据库连接池配置
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 2))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+DB_POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", 300))    # 空闲连接回收（秒）
+DB_POOL_PING_INTERVAL = float(os.getenv("DB_POOL_PING_INTERVAL", 30))   # 借出前 ping 的空闲阈值（秒），0=每次 ping
+DB_POOL_OVERFLOW = os.getenv("DB_POOL_OVERFLOW", "block")               # block / overflow / raise
+DB_POOL_WAIT_TIMEOUT = float(os.getenv("DB_POOL_WAIT_TIMEOUT", 10))     # block 策略下的最长等待（秒）
+
+# API 路由的数据库驱动：pymysql=同步连接池经线程池调用；aiomysql=异步连接池，在事件循环上直接执行
+# （aiomysql 为实验性选项，尚未在 MySQL 上通过 tests/test_db_contract.py，生产环境请使用 pymysql；
+#  其连接池沿用上面的 MIN/MAX_SIZE、IDLE_TIMEOUT（连接回收）和 WAIT_TIMEOUT）
+DB_DRIVER = os.getenv("DB_DRIVER", "pymysql")
+
 # 打印配置（调试用）
 print(f"📊 数据库配置: host={DB_CONFIG['host']}, user={DB_CONFIG['user']}, database={DB_CONFIG['database']}")
 
@@ -34,6 +47,116 @@ AI_PROVIDER = os.getenv("AI_PROVIDER", "siliconflow")
 AI_API_KEY = os.getenv("AI_API_KEY", "")
 AI_BASE_URL = os.getenv("AI_BASE_URL", "https://api.siliconflow.cn/v1")
 AI_MODEL = os.getenv("AI_MODEL", "Qwen/Qwen2.5-7B-Instruct")
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", 30))                   # 单次AI调用超时（秒）
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", 2))              # 每个提供商的重试次数（均在 AI_DEADLINE 内完成）
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", 200))    # 异步路径同时在途的AI调用上限
+AI_DEADLINE = float(os.getenv("AI_DEADLINE", AI_TIMEOUT))         # 单次评估等待AI的总时长（含重试和切换提供商，秒）
+AI_COST = float(os.getenv("AI_COST", 1))                          # 相对成本（cost 路由策略使用）
+AI_JSON_MODE = os.getenv("AI_JSON_MODE", "1") == "1"               # 请求 response_format=json_object（不支持时自动关闭）
+AI_PROMPT_VERSION = os.getenv("AI_PROMPT_VERSION", "v1")           # 评估 prompt 模板：v1（默认）/ v2 / v2-compact（见 prompts.py）
+AI_MAX_TOKENS = int(os.getenv("AI_MAX_TOKENS", 0))                 # 输出 token 预算，0=使用模板默认值
+AI_BATCH_SIZE = int(os.getenv("AI_BATCH_SIZE", 1))                 # 批量预测时每次AI请求合并的用户数，1=逐个请求
+AI_BATCH_MAX_TOKENS = int(os.getenv("AI_BATCH_MAX_TOKENS", 4000))   # 合并请求的输出 token 上限（限制每次合并的用户数）
+
+# 多提供商路由：AI_PROVIDER 为首选，AI_EXTRA_PROVIDERS 为备用提供商名称（逗号分隔），
+# 每个备用提供商通过 AI_<名称>_BASE_URL / AI_<名称>_MODEL / AI_<名称>_API_KEY / AI_<名称>_COST / AI_<名称>_JSON_MODE 配置
+AI_EXTRA_PROVIDERS = [name.strip() for name in os.getenv("AI_EXTRA_PROVIDERS", "").split(",") if name.strip()]
+AI_PROVIDERS = [{
+    "name": AI_PROVIDER, "base_url": AI_BASE_URL, "model": AI_MODEL, "api_key": AI_API_KEY,
+    "cost": AI_COST, "json_mode": AI_JSON_MODE,
+}]
+for _name in AI_EXTRA_PROVIDERS:
+    if _name == AI_PROVIDER:
+        continue
+    _prefix = f"AI_{_name.upper().replace('-', '_')}_"
+    AI_PROVIDERS.append({
+        "name": _name,
+        "base_url": os.getenv(_prefix + "BASE_URL", ""),
+        "model": os.getenv(_prefix + "MODEL", AI_MODEL),
+        "api_key": os.getenv(_prefix + "API_KEY", ""),
+        "cost": float(os.getenv(_prefix + "COST", 1)),
+        "json_mode": os.getenv(_prefix + "JSON_MODE", "1" if AI_JSON_MODE else "0") == "1",
+    })
+AI_ROUTING = os.getenv("AI_ROUTING", "priority")                   # priority / latency / cost
+AI_HEDGE_ENABLED = os.getenv("AI_HEDGE_ENABLED", "0") == "1"       # 首个请求超过其 p95 耗时未返回时向下一个提供商再发一个
+AI_HEDGE_DELAY = float(os.getenv("AI_HEDGE_DELAY", 5))             # 延迟样本不足时的对冲等待（秒）
+AI_HEDGE_MIN_DELAY = float(os.getenv("AI_HEDGE_MIN_DELAY", 0.5))   # 对冲等待下限（秒）
+
+# 大模型熔断（最近 AI_BREAKER_WINDOW 次调用中错误或慢调用比例过高时，直接降级到本地模型/规则引擎）
+AI_BREAKER_ENABLED = os.getenv("AI_BREAKER_ENABLED", "1") == "1"
+AI_BREAKER_WINDOW = int(os.getenv("AI_BREAKER_WINDOW", 20))              # 统计的最近调用数
+AI_BREAKER_MIN_CALLS = int(os.getenv("AI_BREAKER_MIN_CALLS", 10))        # 至少多少次调用才判断
+AI_BREAKER_ERROR_RATE = float(os.getenv("AI_BREAKER_ERROR_RATE", 0.5))   # 失败/超时比例阈值
+AI_BREAKER_SLOW_CALL = float(os.getenv("AI_BREAKER_SLOW_CALL", 15))      # 慢调用阈值（秒）
+AI_BREAKER_SLOW_RATE = float(os.getenv("AI_BREAKER_SLOW_RATE", 0.8))     # 慢调用比例阈值
+AI_BREAKER_OPEN_SECONDS = float(os.getenv("AI_BREAKER_OPEN_SECONDS", 30))  # 熔断持续时间，之后放行探测调用
+AI_BREAKER_HALF_OPEN_CALLS = int(os.getenv("AI_BREAKER_HALF_OPEN_CALLS", 2))  # 探测调用数，全部成功则恢复
+
+# 预测结果缓存（特征未变化时直接复用上次AI结果）
+PREDICTION_CACHE_ENABLED = os.getenv("PREDICTION_CACHE_ENABLED", "1") == "1"
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", 3600))             # 秒
+PREDICTION_CACHE_MAX_SIZE = int(os.getenv("PREDICTION_CACHE_MAX_SIZE", 10000))
+PREDICTION_CACHE_BACKEND = os.getenv("PREDICTION_CACHE_BACKEND", "memory")        # memory / sqlite
+PREDICTION_CACHE_SQLITE_PATH = os.getenv(
+    "PREDICTION_CACHE_SQLITE_PATH",
+    str(Path(__file__).parent.parent / 'logs' / 'prediction_cache.db')
+)
+
+# 用户详情/列表读缓存（创建/导入用户和写入预测记录时显式失效，直接改库的写入在 TTL 内可见）
+USER_CACHE_ENABLED = os.getenv("USER_CACHE_ENABLED", "1") == "1"
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 30))                 # 秒
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", 10000))
+USER_CACHE_BACKEND = os.getenv("USER_CACHE_BACKEND", "memory")          # memory / sqlite（多个 worker 共用）
+USER_CACHE_LOCAL_TTL = float(os.getenv("USER_CACHE_LOCAL_TTL", 2))      # 共用存储时进程内条目的保留秒数
+USER_CACHE_SQLITE_PATH = os.getenv(
+    "USER_CACHE_SQLITE_PATH",
+    str(Path(__file__).parent.parent / 'logs' / 'user_cache.db')
+)
+
+# 本地回归模型（python backend/local_model.py train 训练生成）
+LOCAL_MODEL_PATH = os.getenv(
+    "LOCAL_MODEL_PATH",
+    str(Path(__file__).parent.parent / 'models' / 'local_model.json')
+)
+# off=不使用；numeric=置信度足够时直接返回本地结果（不调用AI）；narrative=数值用本地模型，AI只生成分析文本
+LOCAL_MODEL_MODE = os.getenv("LOCAL_MODEL_MODE", "numeric")
+LOCAL_MODEL_MIN_CONFIDENCE = float(os.getenv("LOCAL_MODEL_MIN_CONFIDENCE", 0.7))  # 低于该置信度仍走AI
+
+# 批量预测配置
+PREDICT_BATCH_CONCURRENCY = int(os.getenv("PREDICT_BATCH_CONCURRENCY", 8))   # 同时进行的AI评估数
+PREDICT_BATCH_MAX_USERS = int(os.getenv("PREDICT_BATCH_MAX_USERS", 2000))    # 单次批量预测的用户上限
+
+# 批量导入配置
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 500))     # 每个事务写入的行数
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", 1000))    # 响应中最多返回的错误行数
+
+# 后台任务配置（批量预测任务队列）
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", str(Path(__file__).parent.parent / 'logs' / 'jobs.db'))
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", 4))           # 单个任务同时评估的用户数
+JOB_RATE_LIMIT = float(os.getenv("JOB_RATE_LIMIT", 5))           # 每秒最多发起的评估数（0=不限）
+JOB_MAX_RETRIES = int(os.getenv("JOB_MAX_RETRIES", 3))           # AI失败重试次数，用尽后降级为本地/规则结果
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", 2))     # 重试等待基数（秒，指数退避）
+JOB_CHECKPOINT_SIZE = int(os.getenv("JOB_CHECKPOINT_SIZE", 20))  # 每评估多少个用户保存一次进度
+JOB_LEASE_TIMEOUT = float(os.getenv("JOB_LEASE_TIMEOUT", 60))    # 运行中任务的心跳超时（秒），超时后由任一 worker 重新排队
+JOB_MAX_USERS = int(os.getenv("JOB_MAX_USERS", 100000))          # 单个任务的用户上限
+
+# 预测记录异步写入（单用户预测/流式预测的记录先入队，后台合并为多行INSERT）
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "1") == "1"
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 200))            # 每批最多写入的记录数
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", 0.5))  # 未攒满时最长等待（秒）
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", 10000))            # 队列上限，满时请求内直接写入
+WRITE_BEHIND_MAX_RETRIES = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", 3))            # 写入失败重试次数，用尽后丢弃该批
+
+# 预测准确度回填与模型表现统计（model_performance）
+PERFORMANCE_ACCURATE_ERROR = float(os.getenv("PERFORMANCE_ACCURATE_ERROR", 3))          # 绝对误差不超过该分数计为准确
+PERFORMANCE_BACKFILL_INTERVAL = float(os.getenv("PERFORMANCE_BACKFILL_INTERVAL", 300))  # 服务内回填间隔（秒），0=不运行
+PERFORMANCE_BACKFILL_BATCH = int(os.getenv("PERFORMANCE_BACKFILL_BATCH", 500))          # 每个事务处理的后测数
+
+# 响应压缩（一次性返回且不小于 MIN_SIZE 字节的响应；客户端接受 br 且安装了 brotli 时优先 br）
+RESPONSE_COMPRESSION_ENABLED = os.getenv("RESPONSE_COMPRESSION_ENABLED", "1") == "1"
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", 1000))   # 字节
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", 6))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", 4))
 
 # 服务配置
 HOST = "0.0.0.0"
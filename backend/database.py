@@ -1,23 +1,658 @@
 """
 数据库操作
 """
+import json
 import pymysql
-from config import DB_CONFIG
-from typing import Dict, List, Optional
+from datetime import datetime
+from config import (
+    DB_CONFIG, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_IDLE_TIMEOUT,
+    DB_POOL_PING_INTERVAL, DB_POOL_OVERFLOW, DB_POOL_WAIT_TIMEOUT, PERFORMANCE_ACCURATE_ERROR
+)
+from db_pool import ConnectionPool
+from metrics import DB_QUERY_SECONDS
+from typing import Dict, List, Optional, Tuple
+
+
+# 批量特征查询每条SQL包含的用户数
+FEATURE_CHUNK_SIZE = 500
+
+# 用户特征：基本信息 + 前后测（同阶段多条取最新一条）+ 学习统计
+FEATURE_SQL = """
+SELECT
+    u.user_id,
+    u.name,
+    u.age,
+    u.gender,
+    u.status,
+    a.pre_score,
+    a.post_score,
+    s.weeks_completed,
+    s.total_checkins,
+    s.total_study_duration / NULLIF(s.weeks_completed, 0) AS avg_study_duration,
+    s.completed_weeks
+FROM users u
+LEFT JOIN (
+    SELECT
+        user_id,
+        SUBSTRING_INDEX(GROUP_CONCAT(CASE WHEN stage_type = 1 THEN score END ORDER BY id DESC), ',', 1) AS pre_score,
+        SUBSTRING_INDEX(GROUP_CONCAT(CASE WHEN stage_type = 4 THEN score END ORDER BY id DESC), ',', 1) AS post_score
+    FROM assessments
+    WHERE user_id IN ({ids})
+    GROUP BY user_id
+) a ON a.user_id = u.user_id
+LEFT JOIN user_learning_stats s ON s.user_id = u.user_id
+WHERE u.user_id IN ({ids})
+"""
+
+
+PREDICTION_INSERT_SQL = """
+INSERT INTO predictions (
+    user_id,
+    pre_score,
+    predicted_score,
+    predicted_improvement,
+    confidence,
+    risk_level,
+    suggestions,
+    actual_score,
+    prediction_accuracy,
+    latency_ms,
+    model_version
+) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+# 后测分数范围（GAD-7 满分21分），绝对误差按此换算为准确度
+SCORE_RANGE = 21.0
+
+
+def _suggestions_json(suggestions) -> str:
+    """建议列表存为 JSON 数组（已是字符串时原样保存）"""
+    if isinstance(suggestions, str):
+        return suggestions
+    return json.dumps(list(suggestions or []), ensure_ascii=False)
+
+
+def prediction_accuracy(predicted_score: float, actual_score: float) -> Tuple[float, float]:
+    """返回 (绝对误差, 准确度)，准确度 = (1 - 绝对误差 / SCORE_RANGE) × 100，不低于 0"""
+    error = abs(float(predicted_score) - float(actual_score))
+    return error, round(max(0.0, 1 - error / SCORE_RANGE) * 100, 2)
+
+
+def _prediction_params(user_id: int, prediction_data: Dict) -> tuple:
+    """
+    预测记录的 INSERT 参数
+    
+    预测时已有后测（actual_score）则直接填入实际分数和准确度；这类预测不是事前预测，不计入模型准确率。
+    """
+    actual_score = prediction_data.get('actual_score')
+    accuracy = None
+    if actual_score is not None:
+        _, accuracy = prediction_accuracy(prediction_data['predicted_score'], actual_score)
+    latency_ms = prediction_data.get('latency_ms')
+    return (
+        user_id,
+        prediction_data['pre_score'],
+        prediction_data['predicted_score'],
+        prediction_data['predicted_improvement'],
+        prediction_data['confidence'],
+        prediction_data['risk_level'],
+        _suggestions_json(prediction_data['suggestions']),
+        actual_score,
+        accuracy,
+        round(latency_ms) if latency_ms is not None else None,
+        prediction_data.get('model_version', 'v1.0')
+    )
+
+
+# 模型表现（model_performance）按 model_version 累加的运行汇总：
+# 写入预测时累加预测数和耗时，回填实际后测时累加误差和准确数，均为增量更新，不扫描 predictions
+PERFORMANCE_PREDICTIONS_SQL = """
+INSERT INTO model_performance (model_version, total_predictions, latency_samples, total_latency_ms, avg_latency_ms)
+VALUES (%s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE
+    total_predictions = total_predictions + VALUES(total_predictions),
+    latency_samples = latency_samples + VALUES(latency_samples),
+    total_latency_ms = total_latency_ms + VALUES(total_latency_ms),
+    avg_latency_ms = COALESCE(ROUND(total_latency_ms / NULLIF(latency_samples, 0), 1), 0)
+"""
+
+PERFORMANCE_OUTCOMES_SQL = """
+INSERT INTO model_performance (model_version, evaluated_predictions, accurate_predictions, total_error,
+                               accuracy_rate, avg_error)
+VALUES (%s, %s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE
+    evaluated_predictions = evaluated_predictions + VALUES(evaluated_predictions),
+    accurate_predictions = accurate_predictions + VALUES(accurate_predictions),
+    total_error = total_error + VALUES(total_error),
+    accuracy_rate = ROUND(accurate_predictions * 100 / evaluated_predictions, 2),
+    avg_error = ROUND(total_error / evaluated_predictions, 2)
+"""
+
+# 准确度回填由新录入的后测驱动：backfill_progress 记录已处理到的后测 assessments.id（高水位），
+# 每次只读取其后的后测，再回填这些用户 actual_score 为空的预测
+BACKFILL_NAME = "accuracy"
+
+# 录入不足该秒数的后测暂不处理：导入事务可能晚于 id 更大的后测提交，高水位越过后不会再读到
+BACKFILL_SETTLE_SECONDS = 60
+
+BACKFILL_MARK_SQL = "SELECT last_id FROM backfill_progress WHERE name = %s"
+
+BACKFILL_MARK_UPDATE_SQL = """
+INSERT INTO backfill_progress (name, last_id) VALUES (%s, %s)
+ON DUPLICATE KEY UPDATE last_id = GREATEST(last_id, VALUES(last_id))
+"""
+
+BACKFILL_POST_TESTS_SQL = """
+SELECT id, user_id, score, created_at, created_at <= NOW() - INTERVAL %s SECOND AS settled
+FROM assessments
+WHERE stage_type = 4 AND id > %s
+ORDER BY id
+LIMIT %s
+"""
+
+BACKFILL_PREDICTIONS_SQL = """
+SELECT id, user_id, model_version, predicted_score, created_at
+FROM predictions
+WHERE user_id IN ({ids}) AND actual_score IS NULL
+"""
+
+# 按主键逐条条件更新（不加 FOR UPDATE 范围锁）；影响行数为 0 说明已被并发的回填处理，不再计入模型表现
+BACKFILL_UPDATE_SQL = """
+UPDATE predictions SET actual_score = %s, prediction_accuracy = %s WHERE id = %s AND actual_score IS NULL
+"""
+
+# 由 predictions 全量重算模型表现（修复用）
+PERFORMANCE_REBUILD_SQL = """
+INSERT INTO model_performance (
+    model_version, total_predictions, evaluated_predictions, accurate_predictions, total_error,
+    accuracy_rate, avg_error, latency_samples, total_latency_ms, avg_latency_ms
+)
+SELECT
+    model_version,
+    COUNT(*),
+    SUM(is_forecast),
+    SUM(is_forecast AND error <= %s),
+    COALESCE(SUM(CASE WHEN is_forecast THEN error END), 0),
+    COALESCE(ROUND(SUM(is_forecast AND error <= %s) * 100 / NULLIF(SUM(is_forecast), 0), 2), 0),
+    COALESCE(ROUND(SUM(CASE WHEN is_forecast THEN error END) / NULLIF(SUM(is_forecast), 0), 2), 0),
+    COUNT(latency_ms),
+    COALESCE(SUM(latency_ms), 0),
+    COALESCE(ROUND(SUM(latency_ms) / NULLIF(COUNT(latency_ms), 0), 1), 0)
+FROM (
+    SELECT
+        p.model_version,
+        p.latency_ms,
+        ABS(p.predicted_score - p.actual_score) AS error,
+        COALESCE(p.actual_score IS NOT NULL AND p.created_at <= (
+            SELECT a.created_at FROM assessments a
+            WHERE a.user_id = p.user_id AND a.stage_type = 4
+            ORDER BY a.id DESC LIMIT 1
+        ), 0) AS is_forecast
+    FROM predictions p
+) t
+GROUP BY model_version
+"""
+
+PERFORMANCE_SELECT_SQL = """
+SELECT
+    model_version,
+    total_predictions,
+    evaluated_predictions,
+    accurate_predictions,
+    accuracy_rate,
+    avg_error,
+    total_error,
+    latency_samples,
+    total_latency_ms,
+    avg_latency_ms,
+    last_updated
+FROM model_performance
+ORDER BY model_version
+"""
+
+
+def _performance_prediction_deltas(params: List[tuple]) -> List[tuple]:
+    """由预测记录的 INSERT 参数按 model_version 汇总预测数和耗时"""
+    deltas: Dict[str, List[int]] = {}
+    for *_, latency_ms, model_version in params:
+        delta = deltas.setdefault(model_version, [0, 0, 0])
+        delta[0] += 1
+        if latency_ms is not None:
+            delta[1] += 1
+            delta[2] += latency_ms
+    return [
+        (version, count, samples, total, round(total / samples, 1) if samples else 0)
+        for version, (count, samples, total) in deltas.items()
+    ]
+
+
+def _backfill_params(rows: List[Dict]) -> Tuple[List[tuple], List[tuple]]:
+    """由待回填的预测行得到 (预测 UPDATE 参数, 模型表现增量参数)"""
+    updates = []
+    deltas: Dict[str, List[float]] = {}
+    for row in rows:
+        actual_score = float(row['actual_score'])
+        error, accuracy = prediction_accuracy(row['predicted_score'], actual_score)
+        updates.append((actual_score, accuracy, row['id']))
+        if row['is_forecast']:
+            delta = deltas.setdefault(row['model_version'], [0, 0, 0.0])
+            delta[0] += 1
+            delta[1] += 1 if error <= PERFORMANCE_ACCURATE_ERROR else 0
+            delta[2] += error
+    outcomes = [
+        (version, evaluated, accurate, round(total_error, 2),
+         round(accurate * 100 / evaluated, 2), round(total_error / evaluated, 2))
+        for version, (evaluated, accurate, total_error) in deltas.items()
+    ]
+    return updates, outcomes
+
+
+def _performance_row(row: Dict) -> Dict:
+    """model_performance 行（DECIMAL 转为浮点数）"""
+    return {
+        key: float(value) if key in ('accuracy_rate', 'avg_error', 'total_error', 'avg_latency_ms')
+        and value is not None else value
+        for key, value in row.items()
+    }
+
+
+# 用户概况：前后测按用户条件聚合（同阶段取最新一条），改善值在SQL中计算，
+# 风险等级取最近一次预测
+SUMMARY_SQL = """
+SELECT
+    u.user_id,
+    u.name,
+    u.age,
+    u.gender,
+    u.status,
+    u.project_id,
+    CASE u.gender WHEN 1 THEN '男' ELSE '女' END AS gender_text,
+    CASE u.status WHEN 1 THEN '已完成' ELSE '进行中' END AS status_text,
+    CAST(SUBSTRING_INDEX(GROUP_CONCAT(CASE WHEN a.stage_type = 1 THEN a.score END ORDER BY a.id DESC), ',', 1)
+         AS DECIMAL(5,2)) AS pre_score,
+    CAST(SUBSTRING_INDEX(GROUP_CONCAT(CASE WHEN a.stage_type = 4 THEN a.score END ORDER BY a.id DESC), ',', 1)
+         AS DECIMAL(5,2)) AS post_score,
+    MAX(p.risk_level) AS risk_level
+FROM users u
+LEFT JOIN assessments a ON a.user_id = u.user_id AND a.stage_type IN (1, 4)
+LEFT JOIN (
+    SELECT user_id, MAX(id) AS prediction_id
+    FROM predictions
+    GROUP BY user_id
+) lp ON lp.user_id = u.user_id
+LEFT JOIN predictions p ON p.id = lp.prediction_id
+{where}
+GROUP BY u.user_id
+{tail}
+"""
+
+# 改善值（前测、后测均非空且非0时计算，与前端口径一致）
+SUMMARY_OUTER_SQL = """
+SELECT
+    s.*,
+    CASE WHEN s.pre_score <> 0 AND s.post_score <> 0
+         THEN ROUND(s.pre_score - s.post_score, 1) END AS improvement,
+    CASE WHEN s.pre_score <> 0 AND s.post_score <> 0
+         THEN ROUND((s.pre_score - s.post_score) / s.pre_score * 100, 1) END AS improvement_rate
+FROM ({inner}) s
+"""
+
+# 可排序字段 → 外层查询中的列
+SUMMARY_SORT_FIELDS = {
+    'user_id': 's.user_id',
+    'pre_score': 's.pre_score',
+    'post_score': 's.post_score',
+    'improvement': 'improvement',
+    'improvement_rate': 'improvement_rate',
+}
+
+# 排序字段为 NULL 时的替代值（升序排在最前，降序排在最后）
+SUMMARY_NULL_SORT_VALUE = -1000000
+
+
+def build_summary_query(status: Optional[int] = None, project_id: Optional[int] = None,
+                        risk_level: Optional[str] = None,
+                        min_improvement: Optional[float] = None, max_improvement: Optional[float] = None,
+                        sort: str = 'user_id', order: str = 'asc',
+                        after_user_id: Optional[int] = None, after_value: Optional[float] = None,
+                        limit: Optional[int] = None):
+    """构建用户概况查询，返回 (sql, params)"""
+    if sort not in SUMMARY_SORT_FIELDS:
+        raise ValueError(f"不支持的排序字段: {sort}")
+    if order not in ('asc', 'desc'):
+        raise ValueError(f"不支持的排序方向: {order}")
+    
+    descending = order == 'desc'
+    cmp = '<' if descending else '>'
+    
+    # 内层：可走索引的用户级条件
+    inner_conditions, inner_params = [], []
+    if status is not None:
+        inner_conditions.append("u.status = %s")
+        inner_params.append(status)
+    if project_id is not None:
+        inner_conditions.append("u.project_id = %s")
+        inner_params.append(project_id)
+    if sort == 'user_id' and after_user_id is not None:
+        inner_conditions.append(f"u.user_id {cmp} %s")
+        inner_params.append(after_user_id)
+    where = "WHERE " + " AND ".join(inner_conditions) if inner_conditions else ""
+    
+    # 外层：依赖聚合结果的条件
+    outer_conditions, outer_params = [], []
+    if risk_level is not None:
+        outer_conditions.append("s.risk_level = %s")
+        outer_params.append(risk_level)
+    if min_improvement is not None:
+        outer_conditions.append("s.pre_score <> 0 AND s.post_score <> 0 AND s.pre_score - s.post_score >= %s")
+        outer_params.append(min_improvement)
+    if max_improvement is not None:
+        outer_conditions.append("s.pre_score <> 0 AND s.post_score <> 0 AND s.pre_score - s.post_score <= %s")
+        outer_params.append(max_improvement)
+    
+    direction = 'DESC' if descending else 'ASC'
+    if sort == 'user_id':
+        order_by = f"s.user_id {direction}"
+    else:
+        sort_key = f"COALESCE({SUMMARY_SORT_FIELDS[sort]}, {SUMMARY_NULL_SORT_VALUE})"
+        if after_user_id is not None:
+            value = SUMMARY_NULL_SORT_VALUE if after_value is None else after_value
+            outer_conditions.append(
+                f"({sort_key} {cmp} %s OR ({sort_key} = %s AND s.user_id {cmp} %s))"
+            )
+            outer_params.extend([value, value, after_user_id])
+        order_by = f"{sort_key} {direction}, s.user_id {direction}"
+    
+    # 按 user_id 分页且无聚合后条件时，在内层直接 ORDER BY + LIMIT，
+    # 沿主键顺序聚合到够一页即停止，不必聚合全部用户
+    tail = ""
+    if sort == 'user_id' and not outer_conditions and limit is not None:
+        tail = f"ORDER BY u.user_id {direction} LIMIT %s"
+        inner_params.append(limit)
+    
+    sql = SUMMARY_OUTER_SQL.format(inner=SUMMARY_SQL.format(where=where, tail=tail))
+    if outer_conditions:
+        sql += "HAVING " + " AND ".join(outer_conditions) + "\n"
+    sql += f"ORDER BY {order_by}"
+    params = inner_params + outer_params
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, params
+
+
+def _summary_rows(rows) -> List[Dict]:
+    """分数和改善值转为浮点数（SQL CAST/ROUND 返回 DECIMAL，接口中本就按浮点数输出）"""
+    rows = list(rows)
+    for row in rows:
+        for key in ('pre_score', 'post_score', 'improvement', 'improvement_rate'):
+            if row[key] is not None:
+                row[key] = float(row[key])
+    return rows
+
+
+def build_user_ids_query(status: Optional[int] = None, project_id: Optional[int] = None,
+                         limit: Optional[int] = None):
+    """按状态/项目筛选用户ID的查询，返回 (sql, params)"""
+    sql = "SELECT user_id FROM users"
+    conditions = []
+    params = []
+    if status is not None:
+        conditions.append("status = %s")
+        params.append(status)
+    if project_id is not None:
+        conditions.append("project_id = %s")
+        params.append(project_id)
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY user_id"
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, params
+
+
+def summary_cursor(row: Dict, sort: str = 'user_id') -> Dict:
+    """由一页最后一行生成下一页游标"""
+    cursor = {"after_user_id": row['user_id']}
+    if sort != 'user_id':
+        value = row.get(sort)
+        cursor["after_value"] = float(value) if value is not None else None
+    return cursor
+
+
+def _learning_stats_from_row(result: Optional[Dict]) -> Dict:
+    """由学习记录聚合行计算学习统计"""
+    if result and result['weeks_completed']:
+        # 计算打卡率（假设每周目标3次）
+        expected_checkins = result['weeks_completed'] * 3
+        checkin_rate = result['total_checkins'] / expected_checkins if expected_checkins > 0 else 0
+        
+        return {
+            'weeks_completed': result['weeks_completed'],
+            'total_checkins': result['total_checkins'],
+            'checkin_rate': round(checkin_rate, 2),
+            'avg_study_duration': round(float(result['avg_study_duration'] or 0), 1),
+            'completion_rate': round(result['completed_weeks'] / result['weeks_completed'], 2)
+        }
+    else:
+        return {
+            'weeks_completed': 0,
+            'total_checkins': 0,
+            'checkin_rate': 0,
+            'avg_study_duration': 0,
+            'completion_rate': 0
+        }
+
+
+def _user_data_from_row(row: Dict) -> Dict:
+    """由 FEATURE_SQL 的结果行组装用户完整数据（与逐表查询的结构一致）"""
+    return {
+        'user_id': row['user_id'],
+        'name': row['name'],
+        'age': row['age'],
+        'gender': row['gender'],
+        'status': row['status'],
+        'pre_score': float(row['pre_score']) if row['pre_score'] is not None else None,
+        'post_score': float(row['post_score']) if row['post_score'] is not None else None,
+        **_learning_stats_from_row(row)
+    }
+
+
+USER_INSERT_SQL = """
+INSERT INTO users (name, age, gender, status, project_id)
+VALUES (%s, %s, %s, %s, %s)
+"""
+
+ASSESSMENT_INSERT_SQL = """
+INSERT INTO assessments (user_id, scale_name, stage_type, score, test_date)
+VALUES (%s, %s, %s, %s, %s)
+"""
+
+LEARNING_LOG_INSERT_SQL = """
+INSERT INTO learning_logs
+(user_id, week_number, checkin_count, study_duration, completed, log_date)
+VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+
+# 学习统计增量更新：同一事务内随学习记录一起写入（按用户汇总后的增量）
+LEARNING_STATS_DELTA_SQL = """
+INSERT INTO user_learning_stats (user_id, weeks_completed, total_checkins, total_study_duration, completed_weeks)
+VALUES (%s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE
+    weeks_completed = weeks_completed + VALUES(weeks_completed),
+    total_checkins = total_checkins + VALUES(total_checkins),
+    total_study_duration = total_study_duration + VALUES(total_study_duration),
+    completed_weeks = completed_weeks + VALUES(completed_weeks)
+"""
+
+# 学习记录实时聚合（重建和一致性检查的基准）
+LEARNING_STATS_LIVE_SQL = """
+SELECT
+    user_id,
+    COUNT(DISTINCT week_number) AS weeks_completed,
+    COALESCE(SUM(checkin_count), 0) AS total_checkins,
+    COALESCE(SUM(study_duration), 0) AS total_study_duration,
+    SUM(CASE WHEN completed = 1 THEN 1 ELSE 0 END) AS completed_weeks
+FROM learning_logs
+{where}
+GROUP BY user_id
+"""
+
+LEARNING_STATS_REBUILD_SQL = """
+INSERT INTO user_learning_stats (user_id, weeks_completed, total_checkins, total_study_duration, completed_weeks)
+{live}
+ON DUPLICATE KEY UPDATE
+    weeks_completed = VALUES(weeks_completed),
+    total_checkins = VALUES(total_checkins),
+    total_study_duration = VALUES(total_study_duration),
+    completed_weeks = VALUES(completed_weeks)
+"""
+
+# 统计与实时聚合不一致的用户（含有记录无统计、有统计无记录两种情况）
+LEARNING_STATS_CHECK_SQL = """
+SELECT
+    l.user_id,
+    l.weeks_completed, l.total_checkins, l.total_study_duration, l.completed_weeks,
+    s.weeks_completed AS stored_weeks_completed,
+    s.total_checkins AS stored_total_checkins,
+    s.total_study_duration AS stored_total_study_duration,
+    s.completed_weeks AS stored_completed_weeks
+FROM ({live}) l
+LEFT JOIN user_learning_stats s ON s.user_id = l.user_id
+WHERE s.user_id IS NULL
+   OR s.weeks_completed <> l.weeks_completed
+   OR s.total_checkins <> l.total_checkins
+   OR s.total_study_duration <> l.total_study_duration
+   OR s.completed_weeks <> l.completed_weeks
+UNION ALL
+SELECT
+    s.user_id,
+    0, 0, 0, 0,
+    s.weeks_completed, s.total_checkins, s.total_study_duration, s.completed_weeks
+FROM user_learning_stats s
+WHERE NOT EXISTS (SELECT 1 FROM learning_logs l WHERE l.user_id = s.user_id)
+  {stats_where}
+ORDER BY user_id
+"""
+
+LEARNING_STATS_FIELDS = ('weeks_completed', 'total_checkins', 'total_study_duration', 'completed_weeks')
+
+
+def _learning_log_params(user_id: int, log: Dict) -> tuple:
+    return (
+        user_id,
+        log['week_number'],
+        log['checkin_count'],
+        log['study_duration'],
+        log['completed'],
+        log['log_date']
+    )
+
+
+def _user_row_params(user_data: Dict) -> tuple:
+    """用户基本信息的 INSERT 参数（有后测即为已完成）"""
+    status = 1 if user_data.get('post_score') is not None else user_data.get('status', 0)
+    return (
+        user_data['name'],
+        user_data['age'],
+        user_data['gender'],
+        status,
+        user_data.get('project_id', 1)
+    )
+
+
+def _user_children_params(users: List[Tuple[int, Dict]]) -> Tuple[List[tuple], List[tuple]]:
+    """一组用户的前后测和学习记录 INSERT 参数，返回 (测评, 学习记录)"""
+    # 测评日期作为参数传入（VALUES 中含 NOW() 时 executemany 无法改写为多行插入）
+    now = datetime.now()
+    assessments = []
+    logs = []
+    for user_id, user_data in users:
+        scale_name = user_data.get('scale_name') or 'GAD-7'
+        if user_data.get('pre_score') is not None:
+            assessments.append((user_id, scale_name, 1, user_data['pre_score'], now))   # 前测
+        if user_data.get('post_score') is not None:
+            assessments.append((user_id, scale_name, 4, user_data['post_score'], now))  # 后测
+        logs.extend(_learning_log_params(user_id, log) for log in user_data.get('learning_logs') or [])
+    return assessments, logs
+
+
+def _learning_stats_deltas(logs: List[tuple]) -> List[tuple]:
+    """按用户汇总新写入的学习记录，得到 user_learning_stats 的增量参数"""
+    deltas: Dict[int, List[int]] = {}
+    for user_id, _, checkin_count, study_duration, completed, _ in logs:
+        delta = deltas.setdefault(user_id, [0, 0, 0, 0])
+        delta[0] += 1  # (user_id, week_number) 唯一，每条记录即一周
+        delta[1] += checkin_count or 0
+        delta[2] += study_duration or 0
+        delta[3] += 1 if completed else 0
+    return [(uid, *delta) for uid, delta in deltas.items()]
+
+
+def _insert_user_row(cursor, user_data: Dict) -> int:
+    """插入用户基本信息"""
+    cursor.execute(USER_INSERT_SQL, _user_row_params(user_data))
+    return cursor.lastrowid
+
+
+def _insert_user_children(cursor, users: List[Tuple[int, Dict]]):
+    """批量插入一组用户的前后测和学习记录"""
+    assessments, logs = _user_children_params(users)
+    # executemany 会把 INSERT ... VALUES 改写为多行插入
+    if assessments:
+        cursor.executemany(ASSESSMENT_INSERT_SQL, assessments)
+    if logs:
+        cursor.executemany(LEARNING_LOG_INSERT_SQL, logs)
+        _update_learning_stats(cursor, logs)
+
+
+def _update_learning_stats(cursor, logs: List[tuple]):
+    """增量更新 user_learning_stats"""
+    deltas = _learning_stats_deltas(logs)
+    if deltas:
+        cursor.executemany(LEARNING_STATS_DELTA_SQL, deltas)
+
+
+def _insert_user(cursor, user_data: Dict) -> int:
+    user_id = _insert_user_row(cursor, user_data)
+    _insert_user_children(cursor, [(user_id, user_data)])
+    return user_id
+
+
+def _mysql_error(error: pymysql.MySQLError) -> str:
+    """pymysql 异常 → 简短错误信息"""
+    if len(error.args) >= 2:
+        return f"{error.args[0]}: {error.args[1]}"
+    return str(error)
 
 
 class Database:
     def __init__(self):
         self.config = DB_CONFIG
+        self.pool = ConnectionPool(
+            self.get_connection,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            idle_timeout=DB_POOL_IDLE_TIMEOUT,
+            ping_interval=DB_POOL_PING_INTERVAL,
+            overflow=DB_POOL_OVERFLOW,
+            wait_timeout=DB_POOL_WAIT_TIMEOUT
+        )
     
     def get_connection(self):
-        """获取数据库连接"""
+        """新建数据库连接（连接池内部使用）"""
         return pymysql.connect(**self.config)
     
+    def connection(self):
+        """从连接池借出连接（with 语句结束时归还）"""
+        return self.pool.connection()
+    
+    @DB_QUERY_SECONDS.time(query="user_info")
     def get_user_info(self, user_id: int) -> Optional[Dict]:
         """获取用户基本信息"""
-        conn = self.get_connection()
-        try:
+        with self.connection() as conn:
             with conn.cursor(pymysql.cursors.DictCursor) as cursor:
                 sql = """
                 SELECT 
@@ -31,13 +666,11 @@ class Database:
                 """
                 cursor.execute(sql, (user_id,))
                 return cursor.fetchone()
-        finally:
-            conn.close()
     
+    @DB_QUERY_SECONDS.time(query="assessment_scores")
     def get_assessment_scores(self, user_id: int) -> Dict:
         """获取用户测评分数"""
-        conn = self.get_connection()
-        try:
+        with self.connection() as conn:
             with conn.cursor(pymysql.cursors.DictCursor) as cursor:
                 sql = """
                 SELECT 
@@ -46,7 +679,7 @@ class Database:
                     test_date
                 FROM assessments
                 WHERE user_id = %s
-                ORDER BY stage_type
+                ORDER BY stage_type, id
                 """
                 cursor.execute(sql, (user_id,))
                 results = cursor.fetchall()
@@ -63,194 +696,372 @@ class Database:
                         scores['post_score'] = float(row['score'])
                 
                 return scores
-        finally:
-            conn.close()
     
+    @DB_QUERY_SECONDS.time(query="learning_stats")
     def get_learning_stats(self, user_id: int) -> Dict:
-        """获取学习统计数据"""
-        conn = self.get_connection()
-        try:
+        """获取学习统计数据（读取 user_learning_stats 物化表）"""
+        with self.connection() as conn:
             with conn.cursor(pymysql.cursors.DictCursor) as cursor:
                 sql = """
                 SELECT 
-                    COUNT(DISTINCT week_number) as weeks_completed,
-                    SUM(checkin_count) as total_checkins,
-                    AVG(study_duration) as avg_study_duration,
-                    SUM(CASE WHEN completed = 1 THEN 1 ELSE 0 END) as completed_weeks
-                FROM learning_logs
+                    weeks_completed,
+                    total_checkins,
+                    total_study_duration / NULLIF(weeks_completed, 0) as avg_study_duration,
+                    completed_weeks
+                FROM user_learning_stats
                 WHERE user_id = %s
                 """
                 cursor.execute(sql, (user_id,))
                 result = cursor.fetchone()
                 
-                if result and result['weeks_completed']:
-                    # 计算打卡率（假设每周目标3次）
-                    expected_checkins = result['weeks_completed'] * 3
-                    checkin_rate = result['total_checkins'] / expected_checkins if expected_checkins > 0 else 0
-                    
-                    return {
-                        'weeks_completed': result['weeks_completed'],
-                        'total_checkins': result['total_checkins'],
-                        'checkin_rate': round(checkin_rate, 2),
-                        'avg_study_duration': round(float(result['avg_study_duration'] or 0), 1),
-                        'completion_rate': round(result['completed_weeks'] / result['weeks_completed'], 2)
-                    }
-                else:
-                    return {
-                        'weeks_completed': 0,
-                        'total_checkins': 0,
-                        'checkin_rate': 0,
-                        'avg_study_duration': 0,
-                        'completion_rate': 0
-                    }
-        finally:
-            conn.close()
+                return _learning_stats_from_row(result)
     
     def get_complete_user_data(self, user_id: int) -> Optional[Dict]:
-        """获取用户完整数据（用于AI分析）"""
-        user_info = self.get_user_info(user_id)
-        if not user_info:
-            return None
+        """获取用户完整数据（用于AI分析），单条SQL一次往返"""
+        return self.get_complete_user_data_many([user_id]).get(user_id)
+    
+    def get_complete_user_data_many(self, user_ids: List[int]) -> Dict[int, Dict]:
+        """
+        批量获取用户完整数据
         
-        scores = self.get_assessment_scores(user_id)
-        learning_stats = self.get_learning_stats(user_id)
+        每 FEATURE_CHUNK_SIZE 个用户一条SQL，全部分块共用一个连接。
         
-        return {
-            **user_info,
-            **scores,
-            **learning_stats
-        }
+        Returns:
+            {user_id: 用户数据}，按传入顺序排列，不存在的用户不出现在结果中
+        """
+        ids = list(dict.fromkeys(int(uid) for uid in user_ids))
+        if not ids:
+            return {}
+        
+        rows = {}
+        with self.connection() as conn:
+            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+                for start in range(0, len(ids), FEATURE_CHUNK_SIZE):
+                    chunk = ids[start:start + FEATURE_CHUNK_SIZE]
+                    placeholders = ", ".join(["%s"] * len(chunk))
+                    with DB_QUERY_SECONDS.time(query="feature_fetch"):
+                        cursor.execute(
+                            FEATURE_SQL.format(ids=placeholders),
+                            (*chunk, *chunk)
+                        )
+                    for row in cursor.fetchall():
+                        rows[row['user_id']] = _user_data_from_row(row)
+        
+        return {uid: rows[uid] for uid in ids if uid in rows}
     
+    @DB_QUERY_SECONDS.time(query="prediction_insert")
     def save_prediction(self, user_id: int, prediction_data: Dict) -> int:
-        """保存预测结果"""
-        conn = self.get_connection()
-        try:
+        """保存预测结果（同一事务内累加模型表现）"""
+        params = _prediction_params(user_id, prediction_data)
+        with self.connection() as conn:
             with conn.cursor() as cursor:
-                sql = """
-                INSERT INTO predictions (
-                    user_id,
-                    pre_score,
-                    predicted_score,
-                    predicted_improvement,
-                    confidence,
-                    risk_level,
-                    suggestions,
-                    model_version
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                """
-                cursor.execute(sql, (
-                    user_id,
-                    prediction_data['pre_score'],
-                    prediction_data['predicted_score'],
-                    prediction_data['predicted_improvement'],
-                    prediction_data['confidence'],
-                    prediction_data['risk_level'],
-                    str(prediction_data['suggestions']),
-                    prediction_data.get('model_version', 'v1.0')
-                ))
+                cursor.execute(PREDICTION_INSERT_SQL, params)
+                prediction_id = cursor.lastrowid
+                cursor.executemany(PERFORMANCE_PREDICTIONS_SQL, _performance_prediction_deltas([params]))
                 conn.commit()
-                return cursor.lastrowid
-        finally:
-            conn.close()
+                return prediction_id
     
-    def get_all_users_summary(self, status: Optional[int] = None) -> List[Dict]:
-        """获取所有用户概况"""
-        conn = self.get_connection()
-        try:
+    @DB_QUERY_SECONDS.time(query="prediction_insert_many")
+    def save_predictions_many(self, records: List[Dict]) -> int:
+        """
+        批量保存预测结果（一条多行 INSERT，同一事务内累加模型表现）
+        
+        Args:
+            records: 预测数据字典列表，每项需包含 user_id
+        
+        Returns:
+            写入行数
+        """
+        if not records:
+            return 0
+        
+        params = [_prediction_params(r['user_id'], r) for r in records]
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                # executemany 会把 INSERT ... VALUES 改写为多行插入
+                count = cursor.executemany(PREDICTION_INSERT_SQL, params)
+                cursor.executemany(PERFORMANCE_PREDICTIONS_SQL, _performance_prediction_deltas(params))
+                conn.commit()
+                return count
+    
+    @DB_QUERY_SECONDS.time(query="user_ids")
+    def get_user_ids(self, status: Optional[int] = None, project_id: Optional[int] = None,
+                     limit: Optional[int] = None) -> List[int]:
+        """按状态/项目筛选用户ID"""
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(*build_user_ids_query(status, project_id, limit))
+                return [row[0] for row in cursor.fetchall()]
+    
+    @DB_QUERY_SECONDS.time(query="user_summary")
+    def get_all_users_summary(self, status: Optional[int] = None, project_id: Optional[int] = None,
+                              risk_level: Optional[str] = None,
+                              min_improvement: Optional[float] = None, max_improvement: Optional[float] = None,
+                              sort: str = 'user_id', order: str = 'asc',
+                              after_user_id: Optional[int] = None, after_value: Optional[float] = None,
+                              limit: Optional[int] = None) -> List[Dict]:
+        """
+        获取用户概况（单条SQL，支持筛选、排序和键集分页）
+        
+        Args:
+            status / project_id: 用户筛选条件
+            risk_level: 最近一次预测的风险等级
+            min_improvement / max_improvement: 实际改善分数（前测-后测）范围
+            sort: 排序字段，见 SUMMARY_SORT_FIELDS
+            order: asc / desc
+            after_user_id / after_value: 上一页最后一行的 user_id 和排序字段值（键集分页游标）
+            limit: 每页条数，None 表示不分页
+        """
+        sql, params = build_summary_query(
+            status=status, project_id=project_id, risk_level=risk_level,
+            min_improvement=min_improvement, max_improvement=max_improvement,
+            sort=sort, order=order, after_user_id=after_user_id, after_value=after_value,
+            limit=limit
+        )
+        with self.connection() as conn:
             with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                sql = """
-                SELECT 
-                    u.user_id,
-                    u.name,
-                    u.age,
-                    u.gender,
-                    u.status,
-                    (SELECT score FROM assessments WHERE user_id = u.user_id AND stage_type = 1 LIMIT 1) as pre_score,
-                    (SELECT score FROM assessments WHERE user_id = u.user_id AND stage_type = 4 LIMIT 1) as post_score
-                FROM users u
-                """
-                
-                if status is not None:
-                    sql += " WHERE u.status = %s"
-                    cursor.execute(sql, (status,))
-                else:
-                    cursor.execute(sql)
-                
-                return cursor.fetchall()
-        finally:
-            conn.close()
+                cursor.execute(sql, params)
+                return _summary_rows(cursor.fetchall())
     
+    @DB_QUERY_SECONDS.time(query="user_insert")
     def create_user(self, user_data: Dict) -> int:
-        """创建新用户并返回用户ID"""
-        conn = self.get_connection()
-        try:
+        """创建新用户并返回用户ID（出错时由连接池回滚）"""
+        with self.connection() as conn:
             with conn.cursor() as cursor:
-                # 1. 插入用户基本信息
-                sql = """
-                INSERT INTO users (name, age, gender, status, project_id)
-                VALUES (%s, %s, %s, %s, %s)
-                """
-                cursor.execute(sql, (
-                    user_data['name'],
-                    user_data['age'],
-                    user_data['gender'],
-                    user_data.get('status', 0),  # 默认进行中
-                    user_data.get('project_id', 1)
-                ))
-                user_id = cursor.lastrowid
-                
-                # 2. 插入前测数据（如果有）
-                if user_data.get('pre_score'):
-                    sql = """
-                    INSERT INTO assessments (user_id, scale_name, stage_type, score, test_date)
-                    VALUES (%s, %s, %s, %s, NOW())
-                    """
-                    cursor.execute(sql, (
-                        user_id,
-                        user_data.get('scale_name', 'GAD-7'),
-                        1,  # 前测
-                        user_data['pre_score']
-                    ))
-                
-                # 3. 插入后测数据（如果有）
-                if user_data.get('post_score'):
-                    sql = """
-                    INSERT INTO assessments (user_id, scale_name, stage_type, score, test_date)
-                    VALUES (%s, %s, %s, %s, NOW())
-                    """
-                    cursor.execute(sql, (
-                        user_id,
-                        user_data.get('scale_name', 'GAD-7'),
-                        4,  # 后测
-                        user_data['post_score']
-                    ))
-                    # 如果有后测，设置状态为已完成
-                    cursor.execute("UPDATE users SET status = 1 WHERE user_id = %s", (user_id,))
+                user_id = _insert_user(cursor, user_data)
+                conn.commit()
+                return user_id
+    
+    @DB_QUERY_SECONDS.time(query="user_import")
+    def import_users(self, rows: List[Tuple[int, Dict]]) -> Tuple[List[int], List[Dict]]:
+        """
+        批量导入一批用户（一个事务；前后测和学习记录用多行 INSERT）
+        
+        整批写入失败时回滚，改为逐行写入（每行一个 SAVEPOINT），
+        只跳过出错的行。
+        
+        Args:
+            rows: (行号, 已校验的用户数据) 列表，字段同 create_user
+        
+        Returns:
+            (新用户ID列表, 错误列表[{row, error}])
+        """
+        if not rows:
+            return [], []
+        
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                try:
+                    user_ids = [_insert_user_row(cursor, user) for _, user in rows]
+                    _insert_user_children(cursor, [(uid, user) for uid, (_, user) in zip(user_ids, rows)])
+                    conn.commit()
+                    return user_ids, []
+                except pymysql.MySQLError:
+                    conn.rollback()
                 
-                # 4. 插入学习记录（如果有）
-                if user_data.get('learning_logs'):
-                    for log in user_data['learning_logs']:
-                        sql = """
-                        INSERT INTO learning_logs 
-                        (user_id, week_number, checkin_count, study_duration, completed, log_date)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                        """
-                        cursor.execute(sql, (
-                            user_id,
-                            log['week_number'],
-                            log['checkin_count'],
-                            log['study_duration'],
-                            log['completed'],
-                            log['log_date']
-                        ))
+                user_ids, errors = [], []
+                for index, user in rows:
+                    cursor.execute("SAVEPOINT import_row")
+                    try:
+                        user_id = _insert_user_row(cursor, user)
+                        _insert_user_children(cursor, [(user_id, user)])
+                    except pymysql.MySQLError as e:
+                        cursor.execute("ROLLBACK TO SAVEPOINT import_row")
+                        errors.append({"row": index, "error": _mysql_error(e)})
+                    else:
+                        cursor.execute("RELEASE SAVEPOINT import_row")
+                        user_ids.append(user_id)
+                conn.commit()
+                return user_ids, errors
+    
+    @DB_QUERY_SECONDS.time(query="learning_log_import")
+    def import_learning_logs(self, rows: List[Tuple[int, Dict]]) -> Tuple[int, List[Dict]]:
+        """
+        批量导入一批学习记录（一个事务，一条多行 INSERT）
+        
+        整批失败时（如用户不存在、同一周重复）回滚并逐行重试，只跳过出错的行。
+        
+        Args:
+            rows: (行号, 已校验的学习记录) 列表，每项需包含 user_id
+        
+        Returns:
+            (写入行数, 错误列表[{row, error}])
+        """
+        if not rows:
+            return 0, []
+        
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                params = [_learning_log_params(log['user_id'], log) for _, log in rows]
+                try:
+                    cursor.executemany(LEARNING_LOG_INSERT_SQL, params)
+                    _update_learning_stats(cursor, params)
+                    conn.commit()
+                    return len(rows), []
+                except pymysql.MySQLError:
+                    conn.rollback()
                 
+                inserted, errors = [], []
+                for (index, _), row_params in zip(rows, params):
+                    cursor.execute("SAVEPOINT import_row")
+                    try:
+                        cursor.execute(LEARNING_LOG_INSERT_SQL, row_params)
+                    except pymysql.MySQLError as e:
+                        cursor.execute("ROLLBACK TO SAVEPOINT import_row")
+                        errors.append({"row": index, "error": _mysql_error(e)})
+                    else:
+                        cursor.execute("RELEASE SAVEPOINT import_row")
+                        inserted.append(row_params)
+                _update_learning_stats(cursor, inserted)
                 conn.commit()
-                return user_id
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            conn.close()
+                return len(inserted), errors
+    
+    @DB_QUERY_SECONDS.time(query="learning_stats_rebuild")
+    def rebuild_learning_stats(self, user_ids: Optional[List[int]] = None) -> int:
+        """
+        由 learning_logs 重建学习统计（首次上线回填，或手工修改学习记录后修复）
+        
+        Args:
+            user_ids: 只重建这些用户，None 表示全部
+        
+        Returns:
+            重建的用户数
+        """
+        where, params = "", []
+        if user_ids is not None:
+            if not user_ids:
+                return 0
+            where = f"WHERE user_id IN ({', '.join(['%s'] * len(user_ids))})"
+            params = list(user_ids)
+        
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                # 没有学习记录的用户删除统计行（读取时按 0 处理）
+                cursor.execute(
+                    "DELETE s FROM user_learning_stats s "
+                    "WHERE NOT EXISTS (SELECT 1 FROM learning_logs l WHERE l.user_id = s.user_id)"
+                    + (f" AND s.user_id IN ({', '.join(['%s'] * len(params))})" if params else ""),
+                    params
+                )
+                cursor.execute(
+                    LEARNING_STATS_REBUILD_SQL.format(live=LEARNING_STATS_LIVE_SQL.format(where=where)),
+                    params
+                )
+                cursor.execute(f"SELECT COUNT(DISTINCT user_id) FROM learning_logs {where}", params)
+                count = cursor.fetchone()[0]
+                conn.commit()
+                return count
+    
+    @DB_QUERY_SECONDS.time(query="accuracy_backfill")
+    def backfill_accuracy(self, batch_size: int = 500, from_start: bool = False) -> Dict:
+        """
+        回填预测的实际后测分数和准确度，并累加到 model_performance
+        
+        从高水位之后新录入的后测开始（from_start=True 时从头重新检查所有后测），每 batch_size 条后测一个事务：
+        回填这些用户 actual_score 为空的预测（同一用户取本批最新一次后测），再推进高水位。
+        预测按主键条件更新，并发执行时同一条预测只计入一次。
+        
+        Returns:
+            {"post_tests": 处理的后测数, "filled": 回填的预测数, "counted": 计入模型表现的事前预测数, "batches": 事务数}
+        """
+        summary = {"post_tests": 0, "filled": 0, "counted": 0, "batches": 0}
+        after_id = 0 if from_start else None
+        while True:
+            with self.connection() as conn:
+                with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+                    if after_id is None:
+                        cursor.execute(BACKFILL_MARK_SQL, (BACKFILL_NAME,))
+                        mark = cursor.fetchone()
+                        after_id = mark['last_id'] if mark else 0
+                    cursor.execute(BACKFILL_POST_TESTS_SQL, (BACKFILL_SETTLE_SECONDS, after_id, batch_size))
+                    fetched = cursor.fetchall()
+                    post_tests = []
+                    for row in fetched:
+                        if not row['settled']:
+                            break
+                        post_tests.append(row)
+                    if not post_tests:
+                        break
+                    
+                    latest = {row['user_id']: row for row in post_tests}
+                    placeholders = ", ".join(["%s"] * len(latest))
+                    cursor.execute(BACKFILL_PREDICTIONS_SQL.format(ids=placeholders), list(latest))
+                    rows = [{
+                        'id': p['id'],
+                        'model_version': p['model_version'],
+                        'predicted_score': p['predicted_score'],
+                        'actual_score': latest[p['user_id']]['score'],
+                        'is_forecast': p['created_at'] <= latest[p['user_id']]['created_at'],
+                    } for p in cursor.fetchall()]
+                    updates, _ = _backfill_params(rows)
+                    applied = [row for row, params in zip(rows, updates)
+                               if cursor.execute(BACKFILL_UPDATE_SQL, params) == 1]
+                    _, outcomes = _backfill_params(applied)
+                    if outcomes:
+                        cursor.executemany(PERFORMANCE_OUTCOMES_SQL, outcomes)
+                    cursor.execute(BACKFILL_MARK_UPDATE_SQL, (BACKFILL_NAME, post_tests[-1]['id']))
+                    conn.commit()
+            summary["post_tests"] += len(post_tests)
+            summary["filled"] += len(applied)
+            summary["counted"] += sum(outcome[1] for outcome in outcomes)
+            summary["batches"] += 1
+            after_id = post_tests[-1]['id']
+            if len(post_tests) < batch_size:
+                break
+        return summary
+    
+    @DB_QUERY_SECONDS.time(query="performance_rebuild")
+    def rebuild_model_performance(self) -> int:
+        """由 predictions 全量重算 model_performance（首次上线或修改准确标准后使用），返回模型版本数"""
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM model_performance")
+                count = cursor.execute(
+                    PERFORMANCE_REBUILD_SQL, (PERFORMANCE_ACCURATE_ERROR, PERFORMANCE_ACCURATE_ERROR)
+                )
+                conn.commit()
+                return count
+    
+    @DB_QUERY_SECONDS.time(query="performance_select")
+    def get_model_performance(self) -> List[Dict]:
+        """各模型版本的表现汇总（预先累加的结果，不扫描 predictions）"""
+        with self.connection() as conn:
+            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+                cursor.execute(PERFORMANCE_SELECT_SQL)
+                return [_performance_row(row) for row in cursor.fetchall()]
+    
+    @DB_QUERY_SECONDS.time(query="learning_stats_check")
+    def check_learning_stats(self, user_ids: Optional[List[int]] = None) -> List[Dict]:
+        """
+        对比学习统计与 learning_logs 实时聚合
+        
+        Returns:
+            不一致的用户列表（含实时值和 stored_ 开头的统计表值）
+        """
+        where = stats_where = ""
+        live_params: List[int] = []
+        stats_params: List[int] = []
+        if user_ids is not None:
+            if not user_ids:
+                return []
+            placeholders = ', '.join(['%s'] * len(user_ids))
+            where = f"WHERE user_id IN ({placeholders})"
+            stats_where = f"AND s.user_id IN ({placeholders})"
+            live_params = stats_params = list(user_ids)
+        
+        sql = LEARNING_STATS_CHECK_SQL.format(
+            live=LEARNING_STATS_LIVE_SQL.format(where=where), stats_where=stats_where
+        )
+        with self.connection() as conn:
+            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+                cursor.execute(sql, live_params + stats_params)
+                rows = cursor.fetchall()
+        for row in rows:
+            for key in LEARNING_STATS_FIELDS:
+                for column in (key, f'stored_{key}'):
+                    if row[column] is not None:
+                        row[column] = int(row[column])
+        return rows
 
 
 # 全局数据库实例
@@ -0,0 +1,298 @@
+"""
+数据库连接池
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+
+class PoolExhaustedError(Exception):
+    """连接池已满且等待超时"""
+
+
+class _PooledConnection:
+    """池内连接及其元数据"""
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """
+    有界、线程安全的连接池
+
+    - min_size: 启动时预建并长期保留的连接数
+    - max_size: 池内连接上限
+    - idle_timeout: 空闲超过该秒数的连接（超出 min_size 部分）会被关闭
+    - ping_interval: 借出时若连接空闲超过该秒数则先 ping 检查，0 表示每次都 ping
+    - overflow: 连接耗尽时的策略
+        block    等待归还，最多 wait_timeout 秒，超时抛 PoolExhaustedError
+        overflow 临时新建连接，归还时直接关闭（不计入池）
+        raise    立即抛 PoolExhaustedError
+    """
+
+    OVERFLOW_POLICIES = ("block", "overflow", "raise")
+
+    def __init__(
+        self,
+        creator: Callable,
+        min_size: int = 1,
+        max_size: int = 10,
+        idle_timeout: float = 300,
+        ping_interval: float = 30,
+        overflow: str = "block",
+        wait_timeout: float = 10,
+    ):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"未知的连接池溢出策略: {overflow}")
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"连接池大小配置无效: min={min_size}, max={max_size}")
+
+        self._creator = creator
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self.overflow = overflow
+        self.wait_timeout = wait_timeout
+
+        self._idle: List[_PooledConnection] = []
+        self._size = 0  # 池内连接总数（空闲 + 借出）
+        self._overflow_in_use = 0
+        self._cond = threading.Condition(threading.Lock())
+
+        # 指标
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._overflow_created = 0
+
+        self._prefilled = False
+
+    # ---------- 借出 / 归还 ----------
+
+    @contextmanager
+    def connection(self):
+        """借出一个连接，with 块结束后自动归还；块内抛异常时回滚"""
+        item, pooled = self._acquire()
+        try:
+            yield item.conn
+        except BaseException:
+            self._release(item, pooled, broken=not self._safe_rollback(item.conn))
+            raise
+        else:
+            self._release(item, pooled, broken=not self._safe_rollback(item.conn))
+
+    def _acquire(self):
+        self._ensure_prefilled()
+        started = time.monotonic()
+        waited = False
+
+        with self._cond:
+            while True:
+                self._evict_idle_locked()
+
+                if self._idle:
+                    item = self._idle.pop()
+                    self._record_checkout_locked(started, waited)
+                    break
+
+                if self._size < self.max_size:
+                    # 先占位再在锁外建连，避免超出上限
+                    self._size += 1
+                    item = None
+                    self._record_checkout_locked(started, waited)
+                    break
+
+                if self.overflow == "overflow":
+                    self._overflow_in_use += 1
+                    self._overflow_created += 1
+                    self._record_checkout_locked(started, waited)
+                    return self._new_overflow(), False
+
+                if self.overflow == "raise":
+                    self._timeouts += 1
+                    raise PoolExhaustedError(f"数据库连接池已满（max_size={self.max_size}）")
+
+                remaining = self.wait_timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolExhaustedError(
+                        f"等待数据库连接超时（{self.wait_timeout}s，max_size={self.max_size}）"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+        if item is None:
+            try:
+                return self._new_pooled(), True
+            except BaseException:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+
+        return self._checkout_health(item), True
+
+    def _checkout_health(self, item: _PooledConnection) -> _PooledConnection:
+        """借出前的健康检查：空闲较久的连接先 ping，失效则重建"""
+        if time.monotonic() - item.last_used < self.ping_interval:
+            return item
+        try:
+            item.conn.ping(reconnect=False)
+            return item
+        except Exception:
+            self._close_quietly(item.conn)
+            with self._cond:
+                self._discarded += 1
+            try:
+                conn = self._creator()
+            except BaseException:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._created += 1
+            return _PooledConnection(conn)
+
+    def _release(self, item: _PooledConnection, pooled: bool, broken: bool = False):
+        if not pooled:
+            self._close_quietly(item.conn)
+            with self._cond:
+                self._overflow_in_use -= 1
+            return
+
+        if broken:
+            self._close_quietly(item.conn)
+            with self._cond:
+                self._size -= 1
+                self._discarded += 1
+                self._cond.notify()
+            return
+
+        item.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(item)
+            self._cond.notify()
+
+    # ---------- 内部工具 ----------
+
+    def _ensure_prefilled(self):
+        if self._prefilled:
+            return
+        with self._cond:
+            if self._prefilled:
+                return
+            self._prefilled = True
+            missing = self.min_size - self._size
+            self._size += max(missing, 0)
+
+        created = []
+        try:
+            for _ in range(max(missing, 0)):
+                created.append(self._new_connection())
+        except Exception as e:
+            print(f"连接池预建连接失败: {e}")
+        finally:
+            with self._cond:
+                self._size -= max(missing, 0) - len(created)
+                self._idle.extend(_PooledConnection(c) for c in created)
+                self._cond.notify_all()
+
+    def _new_connection(self):
+        conn = self._creator()
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _new_pooled(self) -> _PooledConnection:
+        return _PooledConnection(self._new_connection())
+
+    def _new_overflow(self) -> _PooledConnection:
+        try:
+            return _PooledConnection(self._creator())
+        except BaseException:
+            with self._cond:
+                self._overflow_in_use -= 1
+            raise
+
+    def _evict_idle_locked(self):
+        """关闭空闲超时的连接（保留 min_size 个）"""
+        if not self.idle_timeout or not self._idle:
+            return
+        now = time.monotonic()
+        keep = []
+        for item in self._idle:
+            if self._size > self.min_size and now - item.last_used > self.idle_timeout:
+                self._close_quietly(item.conn)
+                self._size -= 1
+                self._discarded += 1
+            else:
+                keep.append(item)
+        self._idle = keep
+
+    def _record_checkout_locked(self, started: float, waited: bool):
+        self._checkouts += 1
+        if waited:
+            elapsed = time.monotonic() - started
+            self._waits += 1
+            self._wait_time_total += elapsed
+            self._wait_time_max = max(self._wait_time_max, elapsed)
+
+    @staticmethod
+    def _safe_rollback(conn) -> bool:
+        """结束连接上未提交的事务，避免复用时读到旧快照；失败说明连接已不可用"""
+        try:
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    # ---------- 管理 ----------
+
+    def close(self):
+        """关闭所有空闲连接（借出中的连接归还后正常回收）"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._prefilled = False
+        for item in idle:
+            self._close_quietly(item.conn)
+
+    def stats(self) -> Dict:
+        """连接池指标"""
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "overflow_in_use": self._overflow_in_use,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_total_ms": round(self._wait_time_total * 1000, 2),
+                "wait_time_avg_ms": round(self._wait_time_total * 1000 / self._waits, 2) if self._waits else 0,
+                "wait_time_max_ms": round(self._wait_time_max * 1000, 2),
+                "timeouts": self._timeouts,
+                "connections_created": self._created,
+                "connections_discarded": self._discarded,
+                "overflow_created": self._overflow_created,
+            }
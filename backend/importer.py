@@ -0,0 +1,254 @@
+"""
+批量导入 - 流式解析 JSON 数组 / NDJSON / CSV 请求体并校验每一行
+"""
+import codecs
+import csv
+import json
+from datetime import date, datetime
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+FORMAT_JSON = "json"
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+
+# 各量表分数上限
+SCALE_MAX_SCORE = {"GAD-7": 21, "PHQ-9": 27}
+DEFAULT_MAX_SCORE = 999.99  # DECIMAL(5,2)
+
+
+class RowError(ValueError):
+    """单行数据无效"""
+
+
+def detect_format(content_type: Optional[str], explicit: Optional[str] = None) -> str:
+    """根据 format 参数或 Content-Type 判断请求体格式"""
+    if explicit:
+        if explicit not in (FORMAT_JSON, FORMAT_NDJSON, FORMAT_CSV):
+            raise ValueError(f"不支持的导入格式: {explicit}")
+        return explicit
+    content_type = (content_type or "").lower()
+    if "csv" in content_type:
+        return FORMAT_CSV
+    if "ndjson" in content_type or "jsonl" in content_type or "json-seq" in content_type:
+        return FORMAT_NDJSON
+    return FORMAT_JSON
+
+
+async def iter_rows(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Tuple[int, object]]:
+    """
+    逐行产出 (行号, 原始记录)，请求体边到达边解析
+
+    解析失败的行产出 RowError 实例而不是记录，以便调用方记录错误后继续。
+    """
+    parser = {FORMAT_JSON: _iter_json_array, FORMAT_NDJSON: _iter_ndjson, FORMAT_CSV: _iter_csv}[fmt]
+    index = 0
+    async for item in parser(_decode(chunks)):
+        index += 1
+        yield index, item
+
+
+async def _decode(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def _iter_lines(texts: AsyncIterator[str]) -> AsyncIterator[str]:
+    pending = ""
+    async for text in texts:
+        pending += text
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def _iter_ndjson(texts: AsyncIterator[str]):
+    async for line in _iter_lines(texts):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield RowError(f"JSON格式错误: {e.msg}")
+
+
+async def _iter_csv(texts: AsyncIterator[str]):
+    header = None
+    record = ""
+    async for line in _iter_lines(texts):
+        # 引号内的换行：引号数为奇数说明记录未结束
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [h.strip() for h in values]
+            continue
+        if len(values) != len(header):
+            yield RowError(f"列数不符：期望 {len(header)} 列，实际 {len(values)} 列")
+            continue
+        yield dict(zip(header, values))
+    if record:
+        yield RowError("CSV引号未闭合")
+
+
+async def _iter_json_array(texts: AsyncIterator[str]):
+    """增量解析顶层 JSON 数组，每解出一个元素立即产出"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    started = False
+    finished = False
+    async for text in texts:
+        if finished:
+            continue
+        buffer = buffer[pos:] + text
+        pos = 0
+        while True:
+            pos = _skip(buffer, pos, " \t\r\n," if started else " \t\r\n")
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("JSON请求体必须是数组")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                finished = True
+                break
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # 元素尚未完整到达，等待后续数据
+                break
+            pos = end
+            yield item
+    if not finished:
+        if buffer[pos:].strip():
+            raise ValueError("JSON数组格式错误或不完整")
+        if not started:
+            raise ValueError("JSON请求体为空")
+        raise ValueError("JSON数组不完整")
+
+
+def _skip(buffer: str, pos: int, chars: str) -> int:
+    while pos < len(buffer) and buffer[pos] in chars:
+        pos += 1
+    return pos
+
+
+# ========== 行校验 ==========
+
+def validate_user_row(raw) -> Dict:
+    """校验并规范化一行用户数据（字段同 create_user）"""
+    if not isinstance(raw, dict):
+        raise RowError("每行必须是对象")
+
+    name = str(raw.get("name") or "").strip()
+    if not name:
+        raise RowError("name 不能为空")
+    if len(name) > 50:
+        raise RowError("name 超过50个字符")
+
+    scale_name = str(raw.get("scale_name") or "GAD-7").strip()
+    pre_score = _score(raw.get("pre_score"), "pre_score", scale_name)
+    post_score = _score(raw.get("post_score"), "post_score", scale_name)
+
+    user = {
+        "name": name,
+        "age": _int(raw.get("age"), "age", 1, 120),
+        "gender": _int(raw.get("gender"), "gender", 1, 2),
+        "project_id": _int(raw.get("project_id"), "project_id", 1, None, default=1),
+        "status": 1 if post_score else _int(raw.get("status"), "status", 0, 1, default=0),
+        "scale_name": scale_name,
+        "pre_score": pre_score,
+        "post_score": post_score,
+    }
+
+    logs = raw.get("learning_logs")
+    if logs:
+        if not isinstance(logs, list):
+            raise RowError("learning_logs 必须是数组")
+        user["learning_logs"] = [validate_log_row(log, require_user=False) for log in logs]
+        weeks = [log["week_number"] for log in user["learning_logs"]]
+        if len(weeks) != len(set(weeks)):
+            raise RowError("learning_logs 中存在重复的 week_number")
+    return user
+
+
+def validate_log_row(raw, require_user: bool = True) -> Dict:
+    """校验并规范化一行学习记录"""
+    if not isinstance(raw, dict):
+        raise RowError("每行必须是对象")
+    log = {
+        "week_number": _int(raw.get("week_number"), "week_number", 1, 52),
+        "checkin_count": _int(raw.get("checkin_count"), "checkin_count", 0, None, default=0),
+        "study_duration": _int(raw.get("study_duration"), "study_duration", 0, None, default=0),
+        "completed": _bool(raw.get("completed")),
+        "log_date": _date(raw.get("log_date")),
+    }
+    if require_user:
+        log["user_id"] = _int(raw.get("user_id"), "user_id", 1, None)
+    return log
+
+
+def _blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _int(value, field: str, minimum: Optional[int], maximum: Optional[int], default=None) -> int:
+    if _blank(value):
+        if default is None:
+            raise RowError(f"{field} 不能为空")
+        return default
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise RowError(f"{field} 必须是整数: {value!r}")
+    if not number.is_integer():
+        raise RowError(f"{field} 必须是整数: {value!r}")
+    number = int(number)
+    if (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+        raise RowError(f"{field} 超出范围: {number}")
+    return number
+
+
+def _score(value, field: str, scale_name: str) -> Optional[float]:
+    if _blank(value):
+        return None
+    try:
+        score = float(value)
+    except (TypeError, ValueError):
+        raise RowError(f"{field} 必须是数字: {value!r}")
+    maximum = SCALE_MAX_SCORE.get(scale_name, DEFAULT_MAX_SCORE)
+    if not 0 <= score <= maximum:
+        raise RowError(f"{field} 超出 {scale_name} 量表范围 0-{maximum}: {score}")
+    return round(score, 2)
+
+
+def _bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y", "是")
+    return bool(value)
+
+
+def _date(value) -> str:
+    if _blank(value):
+        raise RowError("log_date 不能为空")
+    if isinstance(value, (date, datetime)):
+        return value.strftime("%Y-%m-%d")
+    try:
+        return datetime.strptime(str(value).strip()[:10], "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise RowError(f"log_date 格式应为 YYYY-MM-DD: {value!r}")
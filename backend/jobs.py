@@ -0,0 +1,475 @@
+"""
+后台任务队列 - 批量预测任务（SQLite 持久化，逐批保存进度，重启后从断点继续）
+"""
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from ai_service import AIUnavailableError
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_FINISHED = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+# 用户条目状态
+ITEM_PENDING = "pending"
+ITEM_DONE = "done"          # AI评估成功
+ITEM_DEGRADED = "degraded"  # 重试用尽，保存了本地模型/规则引擎结果
+ITEM_FAILED = "failed"      # 无法预测（用户不存在、没有前测等）
+
+_JOB_COLUMNS = (
+    "id", "status", "params", "total", "processed", "succeeded", "degraded", "failed",
+    "cancel_requested", "error", "created_at", "started_at", "finished_at", "owner"
+)
+
+# 旧版任务库缺少的列（启动时补齐）
+_JOB_MIGRATIONS = (("owner", "TEXT"), ("heartbeat_at", "REAL"))
+
+
+def _now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class JobStore:
+    """
+    任务及每个用户的处理状态（进度检查点）
+
+    多个 worker 可共用一个任务库：执行前用条件 UPDATE 认领任务（owner=认领者），
+    运行期间定期更新 heartbeat_at；心跳超时的任务才会被重新排队。
+    进度和结束状态只有 owner 仍是自己时才写入。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, params TEXT NOT NULL, "
+                "total INTEGER NOT NULL, processed INTEGER NOT NULL DEFAULT 0, "
+                "succeeded INTEGER NOT NULL DEFAULT 0, degraded INTEGER NOT NULL DEFAULT 0, "
+                "failed INTEGER NOT NULL DEFAULT 0, cancel_requested INTEGER NOT NULL DEFAULT 0, "
+                "error TEXT, created_at TEXT NOT NULL, started_at TEXT, finished_at TEXT, "
+                "owner TEXT, heartbeat_at REAL)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in _JOB_MIGRATIONS:
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_items ("
+                "job_id TEXT NOT NULL, seq INTEGER NOT NULL, user_id INTEGER NOT NULL, "
+                "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, error TEXT, "
+                "PRIMARY KEY (job_id, seq))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+            self._conn.commit()
+
+    def create_job(self, user_ids: List[int], params: Dict) -> Dict:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, params, total, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, json.dumps(params, ensure_ascii=False), len(user_ids), _now())
+            )
+            self._conn.executemany(
+                "INSERT INTO job_items (job_id, seq, user_id, status) VALUES (?, ?, ?, ?)",
+                [(job_id, seq, user_id, ITEM_PENDING) for seq, user_id in enumerate(user_ids)]
+            )
+            self._conn.commit()
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._job_from_row(row) if row else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        sql = f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs"
+        params: list = []
+        if status:
+            sql += " WHERE status = ?"
+            params.append(status)
+        sql += " ORDER BY created_at DESC, rowid DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._job_from_row(row) for row in rows]
+
+    def job_errors(self, job_id: str, limit: int = 100) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id, status, attempts, error FROM job_items "
+                "WHERE job_id = ? AND status IN (?, ?) ORDER BY seq LIMIT ?",
+                (job_id, ITEM_FAILED, ITEM_DEGRADED, limit)
+            ).fetchall()
+        return [{"user_id": r[0], "status": r[1], "attempts": r[2], "error": r[3]} for r in rows]
+
+    def request_cancel(self, job_id: str) -> Optional[Dict]:
+        """排队中的任务直接取消；运行中的任务由执行器在下一批开始前停止"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, cancel_requested = 1, finished_at = ? WHERE id = ? AND status = ?",
+                (JOB_CANCELLED, _now(), job_id, JOB_QUEUED)
+            )
+            self._conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?",
+                (job_id, JOB_RUNNING)
+            )
+            self._conn.commit()
+        return self.get_job(job_id)
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def claim_next(self, owner: str) -> Optional[Dict]:
+        """
+        认领最早排队的任务：UPDATE ... WHERE status='queued' 只有一个 worker 能成功，
+        被其它 worker 抢先时尝试下一个
+        """
+        with self._lock:
+            while True:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? ORDER BY created_at, rowid LIMIT 1",
+                    (JOB_QUEUED,)
+                ).fetchone()
+                if row is None:
+                    return None
+                claimed = self._conn.execute(
+                    "UPDATE jobs SET status = ?, owner = ?, heartbeat_at = ?, "
+                    "started_at = COALESCE(started_at, ?) WHERE id = ? AND status = ?",
+                    (JOB_RUNNING, owner, time.time(), _now(), row[0], JOB_QUEUED)
+                ).rowcount
+                self._conn.commit()
+                if claimed == 1:
+                    break
+            job = self._conn.execute(
+                f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE id = ?", (row[0],)
+            ).fetchone()
+        return self._job_from_row(job)
+
+    def heartbeat(self, job_id: str, owner: str) -> bool:
+        """续期；返回 False 表示任务已不属于 owner（心跳超时被重新排队、或已结束）"""
+        with self._lock:
+            count = self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND owner = ? AND status = ?",
+                (time.time(), job_id, owner, JOB_RUNNING)
+            ).rowcount
+            self._conn.commit()
+        return count == 1
+
+    def requeue_expired(self, lease_timeout: float) -> int:
+        """心跳超过 lease_timeout 秒的运行中任务（其 worker 已退出）重新排队，已保存的进度保留"""
+        with self._lock:
+            count = self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, heartbeat_at = NULL "
+                "WHERE status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (JOB_QUEUED, JOB_RUNNING, time.time() - lease_timeout)
+            ).rowcount
+            self._conn.commit()
+        return count
+
+    def release(self, job_id: str, owner: str) -> bool:
+        """正常停止：自己运行中的任务立即重新排队，不必等心跳超时"""
+        with self._lock:
+            count = self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, heartbeat_at = NULL "
+                "WHERE id = ? AND owner = ? AND status = ?",
+                (JOB_QUEUED, job_id, owner, JOB_RUNNING)
+            ).rowcount
+            self._conn.commit()
+        return count == 1
+
+    def finish(self, job_id: str, owner: str, status: str, error: Optional[str] = None) -> bool:
+        with self._lock:
+            count = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND owner = ? AND status = ?",
+                (status, error, _now(), job_id, owner, JOB_RUNNING)
+            ).rowcount
+            self._conn.commit()
+        return count == 1
+
+    def pending_items(self, job_id: str) -> List[Tuple[int, int]]:
+        """未处理的 (seq, user_id)"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT seq, user_id FROM job_items WHERE job_id = ? AND status = ? ORDER BY seq",
+                (job_id, ITEM_PENDING)
+            ).fetchall()
+
+    def checkpoint(self, job_id: str, owner: str, outcomes: List[Dict]) -> bool:
+        """一个事务内记录一批用户的结果并累加任务计数（同时续期）；任务已不属于 owner 时不写入，返回 False"""
+        counts = {ITEM_DONE: 0, ITEM_DEGRADED: 0, ITEM_FAILED: 0}
+        for outcome in outcomes:
+            counts[outcome["status"]] += 1
+        with self._lock:
+            count = self._conn.execute(
+                "UPDATE jobs SET processed = processed + ?, succeeded = succeeded + ?, "
+                "degraded = degraded + ?, failed = failed + ?, heartbeat_at = ? "
+                "WHERE id = ? AND owner = ? AND status = ?",
+                (len(outcomes), counts[ITEM_DONE], counts[ITEM_DEGRADED], counts[ITEM_FAILED],
+                 time.time(), job_id, owner, JOB_RUNNING)
+            ).rowcount
+            if count != 1:
+                self._conn.rollback()
+                return False
+            self._conn.executemany(
+                "UPDATE job_items SET status = ?, attempts = ?, error = ? WHERE job_id = ? AND seq = ?",
+                [(o["status"], o["attempts"], o["error"], job_id, o["seq"]) for o in outcomes]
+            )
+            self._conn.commit()
+        return True
+
+    @staticmethod
+    def _job_from_row(row) -> Dict:
+        job = dict(zip(_JOB_COLUMNS, row))
+        job["params"] = json.loads(job["params"])
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        job["progress"] = round(job["processed"] / job["total"], 4) if job["total"] else 1.0
+        return job
+
+
+class RateLimiter:
+    """令牌桶：平均每秒 rate 次，允许 burst 次突发"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class JobRunner:
+    """
+    任务执行器：在 FastAPI 的事件循环中按创建顺序逐个执行任务
+
+    每个任务按 checkpoint_size 分批：批量读取特征 → 限速、有界并发评估
+    （AI失败按指数退避重试）→ 多行INSERT保存预测 → 记录进度。
+    评估服务的 batch_size > 1 时先按组合并请求评估，AI失败的用户再逐个重试。
+    取消在批与批之间生效；服务重启后未完成的任务从未处理的用户继续。
+    每批预测保存后 await on_saved(批记录)（如失效用户列表缓存）。
+    多个 worker 共用任务库时，每个任务只由认领它的 worker 执行；运行中每 lease_timeout/3 秒续期，
+    心跳超过 lease_timeout 秒的任务由任一 worker 重新排队。任务库读写都在线程池中执行。
+    """
+
+    def __init__(self, store: JobStore, database, service, build_record: Callable[..., Dict],
+                 concurrency: int = 4, rate_limit: float = 5, max_retries: int = 3,
+                 retry_backoff: float = 2, checkpoint_size: int = 20, lease_timeout: float = 60,
+                 on_saved: Optional[Callable[[List[Dict]], Awaitable[None]]] = None):
+        self.store = store
+        self.database = database
+        self.service = service
+        self.build_record = build_record
+        self.on_saved = on_saved
+        self.concurrency = concurrency
+        self.rate_limit = rate_limit
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.checkpoint_size = checkpoint_size
+        self.lease_timeout = lease_timeout
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.current_job_id: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    async def stop(self):
+        """停止执行器；进行中的任务重新排队（已保存的进度保留），下次启动或其它 worker 从断点继续"""
+        if self._task is not None:
+            job_id = self.current_job_id
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            if job_id is not None:
+                await run_in_threadpool(self.store.release, job_id, self.owner)
+
+    def notify(self):
+        """有新任务时唤醒执行器"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run_forever(self):
+        while True:
+            resumed = await run_in_threadpool(self.store.requeue_expired, self.lease_timeout)
+            if resumed:
+                print(f"✓ {resumed} 个心跳超时的预测任务重新排队，将从断点继续")
+            job = await run_in_threadpool(self.store.claim_next, self.owner)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=5)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.current_job_id = job["id"]
+            heartbeat = asyncio.get_running_loop().create_task(self._heartbeat(job["id"]))
+            try:
+                await self._run_job(job["id"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"预测任务 {job['id']} 失败: {e}")
+                await run_in_threadpool(self.store.finish, job["id"], self.owner, JOB_FAILED, str(e))
+            finally:
+                heartbeat.cancel()
+                self.current_job_id = None
+
+    async def _heartbeat(self, job_id: str):
+        """任务运行期间定期续期，直到任务不再属于本 worker"""
+        interval = max(1.0, self.lease_timeout / 3)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await run_in_threadpool(self.store.heartbeat, job_id, self.owner):
+                    return
+            except Exception as e:
+                print(f"预测任务 {job_id} 续期失败: {e}")
+
+    async def _run_job(self, job_id: str):
+        limiter = RateLimiter(self.rate_limit, burst=self.concurrency)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        pending = await run_in_threadpool(self.store.pending_items, job_id)
+
+        for start in range(0, len(pending), self.checkpoint_size):
+            if await run_in_threadpool(self.store.cancel_requested, job_id):
+                await run_in_threadpool(self.store.finish, job_id, self.owner, JOB_CANCELLED)
+                return
+
+            chunk = pending[start:start + self.checkpoint_size]
+            users = await run_in_threadpool(
+                self.database.get_complete_user_data_many, [user_id for _, user_id in chunk]
+            )
+
+            batched = {}
+            if self.service.batch_size > 1:
+                batched = await self._evaluate_batches(users, limiter, semaphore)
+
+            async def evaluate(seq, user_id):
+                async with semaphore:
+                    return await self._evaluate(seq, user_id, users.get(user_id), limiter,
+                                                *batched.get(user_id, (None, None)))
+
+            outcomes = await asyncio.gather(*(evaluate(seq, user_id) for seq, user_id in chunk))
+            records = [o.pop("record") for o in outcomes if o.get("record") is not None]
+            # 保存前确认任务仍属于本 worker，避免与重新认领它的 worker 重复写入预测
+            if not await run_in_threadpool(self.store.heartbeat, job_id, self.owner):
+                print(f"预测任务 {job_id} 已被重新排队，本 worker 停止执行")
+                return
+            if records:
+                await run_in_threadpool(self.database.save_predictions_many, records)
+                if self.on_saved is not None:
+                    await self.on_saved(records)
+            if not await run_in_threadpool(self.store.checkpoint, job_id, self.owner, outcomes):
+                print(f"预测任务 {job_id} 已被重新排队，本 worker 停止执行")
+                return
+
+        cancelled = await run_in_threadpool(self.store.cancel_requested, job_id)
+        await run_in_threadpool(self.store.finish, job_id, self.owner, JOB_CANCELLED if cancelled else JOB_COMPLETED)
+
+    async def _evaluate_batches(self, users: Dict[int, Dict], limiter: RateLimiter,
+                                semaphore: asyncio.Semaphore) -> Dict[int, Dict]:
+        """每组用户一次AI请求（每组占一个限速名额），返回AI评估成功的 {user_id: (结果, 该组耗时ms)}"""
+        valid = [user_data for user_data in users.values() if user_data and user_data.get('pre_score')]
+        size = self.service.batch_size
+
+        async def evaluate(group):
+            async with semaphore:
+                await limiter.acquire()
+                started = time.perf_counter()
+                try:
+                    group_results = await self.service.evaluate_batch_async(group, require_ai=True)
+                except Exception as e:
+                    print(f"批量评估失败，逐个重试: {e}")
+                    return {}
+                latency_ms = (time.perf_counter() - started) * 1000
+                return {user_id: (result, latency_ms) for user_id, result in group_results.items()}
+
+        results = {}
+        for group_results in await asyncio.gather(*(evaluate(valid[i:i + size]) for i in range(0, len(valid), size))):
+            results.update(group_results)
+        return results
+
+    async def _evaluate(self, seq: int, user_id: int, user_data: Optional[Dict], limiter: RateLimiter,
+                        ai_result: Optional[Dict] = None, latency_ms: Optional[float] = None) -> Dict:
+        outcome = {"seq": seq, "status": ITEM_FAILED, "attempts": 0, "error": None, "record": None}
+        if not user_data:
+            outcome["error"] = "用户不存在"
+            return outcome
+        if not user_data.get('pre_score'):
+            outcome["error"] = "该用户没有前测数据"
+            return outcome
+        if ai_result is not None:
+            # 已在合并请求中评估成功
+            outcome["status"], outcome["attempts"] = ITEM_DONE, 1
+            outcome["record"] = {"user_id": user_id, **self.build_record(user_data, ai_result, latency_ms)}
+            return outcome
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            await limiter.acquire()
+            outcome["attempts"] = attempt + 1
+            started = time.perf_counter()
+            try:
+                ai_result = await self.service.evaluate_intervention_async(user_data, require_ai=True)
+                outcome["status"], outcome["error"] = ITEM_DONE, None
+            except AIUnavailableError as e:
+                outcome["error"] = str(e)
+                if not last_attempt:
+                    await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+                    continue
+                # 重试用尽：保存降级结果，保证每个用户都有预测
+                ai_result = e.fallback
+                outcome["status"] = ITEM_DEGRADED
+            except Exception as e:
+                outcome["error"] = str(e)
+                if not last_attempt:
+                    await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+                    continue
+                return outcome
+
+            latency_ms = (time.perf_counter() - started) * 1000
+            outcome["record"] = {"user_id": user_id, **self.build_record(user_data, ai_result, latency_ms)}
+            return outcome
+        return outcome
@@ -0,0 +1,59 @@
+"""
+学习统计物化表维护 - user_learning_stats 由写入学习记录时增量更新，这里提供重建和一致性检查
+
+重建：python learning_stats.py rebuild [--user-id 1 2 ...]
+检查：python learning_stats.py check [--user-id 1 2 ...] [--repair]
+"""
+import argparse
+import sys
+import time
+
+from database import LEARNING_STATS_FIELDS, db
+
+
+def rebuild(user_ids=None):
+    started = time.perf_counter()
+    count = db.rebuild_learning_stats(user_ids)
+    print(f"✓ 学习统计重建完成：{count} 个用户，耗时 {(time.perf_counter() - started) * 1000:.0f}ms")
+
+
+def check(user_ids=None, repair: bool = False) -> int:
+    """打印不一致的用户，返回不一致数量"""
+    started = time.perf_counter()
+    mismatches = db.check_learning_stats(user_ids)
+    elapsed = (time.perf_counter() - started) * 1000
+    if not mismatches:
+        print(f"✓ 学习统计与学习记录一致，耗时 {elapsed:.0f}ms")
+        return 0
+
+    print(f"✗ {len(mismatches)} 个用户的学习统计不一致（实时聚合 / 统计表）：")
+    for row in mismatches:
+        diffs = ", ".join(
+            f"{key}={row[key]}/{row[f'stored_{key}']}"
+            for key in LEARNING_STATS_FIELDS
+            if row[key] != row[f'stored_{key}']
+        )
+        print(f"  user_id={row['user_id']}: {diffs}")
+
+    if repair:
+        rebuild([row['user_id'] for row in mismatches])
+    return len(mismatches)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="学习统计物化表维护")
+    sub = parser.add_subparsers(dest="command")
+    rebuild_parser = sub.add_parser("rebuild", help="由 learning_logs 重建学习统计")
+    rebuild_parser.add_argument("--user-id", type=int, nargs="+", help="只重建指定用户（默认全部）")
+    check_parser = sub.add_parser("check", help="对比学习统计与实时聚合")
+    check_parser.add_argument("--user-id", type=int, nargs="+", help="只检查指定用户（默认全部）")
+    check_parser.add_argument("--repair", action="store_true", help="重建不一致的用户")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        rebuild(args.user_id)
+    elif args.command == "check":
+        if check(args.user_id, args.repair) and not args.repair:
+            sys.exit(1)
+    else:
+        parser.print_help()
@@ -0,0 +1,386 @@
+"""
+大模型输出解析 - 从回复中提取 JSON（容忍 ```json 围栏、前后说明文字和常见格式错误），
+并按预测结果的字段和取值范围校验；批量评估的返回按 user_id 拆分
+"""
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+from importer import SCALE_MAX_SCORE
+from rule_engine import DEFAULT_CHECKIN_RATE, DEFAULT_PRE_SCORE, tier_labels
+
+# 解析方式（llm_parse_total 的 method 标签）
+PARSE_JSON = "json"            # 整段即合法 JSON
+PARSE_EXTRACTED = "extracted"  # 去掉围栏/说明文字后合法
+PARSE_REPAIRED = "repaired"    # 修复格式错误后合法
+
+SCORE_MAX = SCALE_MAX_SCORE["GAD-7"]
+
+RISK_LEVELS = ("low", "medium", "high")
+PROGRESS_LEVELS = ("良好", "一般", "较差")
+_RISK_ALIASES = {"低": "low", "中": "medium", "高": "high"}
+
+_STRUCTURAL = re.compile(r'[{}\[\]"\\]')
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+_SUGGESTION_SPLIT = re.compile(r'[\n；;]+')
+_CLOSERS = {"{": "}", "[": "]"}
+_BARE_WORDS = {"True": "true", "False": "false", "None": "null", "NaN": "null"}
+
+
+class JsonScanner:
+    """
+    逐段扫描文本，定位第一个完整的顶层 JSON 对象（open_char="{"）或数组（"["）
+
+    只在结构字符（括号、引号、反斜杠）处停留，不逐字符构造新字符串；
+    流式输出时每收到一段调用一次 feed()，对象闭合后即可停止读取。
+    """
+
+    def __init__(self, open_char: str = "{"):
+        self.open_char = open_char
+        self.close_char = _CLOSERS[open_char]
+        self.parts: List[str] = []
+        self.started = False
+        self.complete = False
+        self._depth = 0
+        self._in_string = False
+        self._skip_first = False  # 上一段以转义符结尾
+
+    def feed(self, text: str) -> bool:
+        """追加一段文本，返回对象/数组是否已闭合"""
+        if self.complete:
+            return True
+        if not self.started:
+            start = text.find(self.open_char)
+            if start < 0:
+                return False
+            self.started = True
+            text = text[start:]
+
+        skip = 1 if self._skip_first else 0
+        self._skip_first = False
+        for match in _STRUCTURAL.finditer(text):
+            pos = match.start()
+            if pos < skip:
+                continue
+            ch = text[pos]
+            if self._in_string:
+                if ch == "\\":
+                    skip = pos + 2
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == self.open_char:
+                self._depth += 1
+            elif ch == self.close_char:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.parts.append(text[:pos + 1])
+                    self.complete = True
+                    return True
+        if skip > len(text):
+            self._skip_first = True
+        self.parts.append(text)
+        return False
+
+    def text(self) -> Optional[str]:
+        """已扫描到的 JSON 文本（未闭合时为截断的片段，未找到起始括号时为 None）"""
+        return "".join(self.parts) if self.started else None
+
+
+def extract_json(text: str, open_char: str = "{") -> Optional[str]:
+    """提取第一个顶层 JSON 对象/数组的文本"""
+    scanner = JsonScanner(open_char)
+    scanner.feed(text)
+    return scanner.text()
+
+
+def repair_json(text: str) -> str:
+    """
+    修复常见格式错误：
+
+    - 结构位置的全角冒号/逗号、单引号字符串、未加引号的键
+    - Python 风格的 True/False/None、// 与 /* */ 注释、多余的尾逗号
+    - 字符串中未转义的换行
+    - 输出被截断时补全未闭合的字符串和括号
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if ch == '"' or ch == "'":
+            # 字符串：统一输出为双引号字符串
+            quote = ch
+            i += 1
+            buf = ['"']
+            closed = False
+            while i < n:
+                c = text[i]
+                if c == "\\" and i + 1 < n:
+                    nxt = text[i + 1]
+                    buf.append(nxt if quote == "'" and nxt == "'" else c + nxt)
+                    i += 2
+                    continue
+                if c == quote:
+                    closed = True
+                    i += 1
+                    break
+                if c == '"':
+                    buf.append('\\"')
+                elif c == "\n":
+                    buf.append("\\n")
+                elif c == "\r":
+                    buf.append("\\r")
+                elif c == "\t":
+                    buf.append("\\t")
+                else:
+                    buf.append(c)
+                i += 1
+            if not closed and buf[-1] == "\\":
+                buf.pop()  # 截断在转义符中间
+            buf.append('"')
+            out.append("".join(buf))
+            continue
+        if ch == "/" and i + 1 < n and text[i + 1] in "/*":
+            end = text.find("\n" if text[i + 1] == "/" else "*/", i + 2)
+            i = n if end < 0 else end + (1 if text[i + 1] == "/" else 2)
+            continue
+        if ch in "{[":
+            stack.append(_CLOSERS[ch])
+            out.append(ch)
+        elif ch in "}]":
+            _strip_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(ch)
+        elif ch == "：":
+            out.append(":")
+        elif ch == "，":
+            out.append(",")
+        elif ch.isalpha() or ch == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            k = j
+            while k < n and text[k] in " \t\r\n":
+                k += 1
+            if k < n and text[k] in ":：" and word not in _BARE_WORDS:
+                out.append(f'"{word}"')
+            else:
+                out.append(_BARE_WORDS.get(word, word))
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    # 截断：去掉悬空的逗号、键和冒号后补全括号
+    _strip_trailing_comma(out)
+    if stack and stack[-1] == "}" and out and out[-1].startswith('"'):
+        previous = next((token for token in reversed(out[:-1]) if not token.isspace()), "")
+        if previous in ("{", ","):
+            out.pop()  # 只有键没有冒号
+            _strip_trailing_comma(out)
+    if out and out[-1].rstrip().endswith(":"):
+        out.append(" null")
+    out.extend(reversed(stack))
+    return "".join(out)
+
+
+def _strip_trailing_comma(out: List[str]):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def parse_llm_json(text: str, open_char: str = "{") -> Tuple[object, str]:
+    """
+    解析大模型返回的 JSON
+
+    Returns:
+        (解析结果, 解析方式 PARSE_JSON / PARSE_EXTRACTED / PARSE_REPAIRED)
+
+    Raises:
+        ValueError: 找不到可解析的 JSON
+    """
+    expected = dict if open_char == "{" else list
+    try:
+        data = json.loads(text)
+        if isinstance(data, expected):
+            return data, PARSE_JSON
+    except ValueError:
+        pass
+
+    candidate = extract_json(text, open_char)
+    if candidate is None:
+        raise ValueError("回复中没有 JSON")
+    try:
+        return json.loads(candidate), PARSE_EXTRACTED
+    except ValueError:
+        pass
+    try:
+        return json.loads(repair_json(candidate)), PARSE_REPAIRED
+    except ValueError as e:
+        raise ValueError(f"JSON 修复失败: {e}")
+
+
+def parse_llm_batch(text: str) -> Tuple[Dict[int, Dict], str]:
+    """
+    解析批量评估的返回，按 user_id 索引
+
+    接受 {"results": [...]}、{"results": {"<user_id>": {...}}} 和直接返回的数组；
+    缺少 user_id 的条目被忽略。
+
+    Returns:
+        ({user_id: 条目}（按返回顺序）, 解析方式)
+
+    Raises:
+        ValueError: 找不到可解析的 JSON 或结构不符
+    """
+    array_at, object_at = text.find("["), text.find("{")
+    if array_at >= 0 and (object_at < 0 or array_at < object_at):
+        data, method = parse_llm_json(text, "[")
+    else:
+        data, method = parse_llm_json(text, "{")
+        data = data.get("results", data)
+
+    if isinstance(data, dict):
+        if "user_id" in data:
+            data = [data]
+        else:
+            data = [{**item, "user_id": key} for key, item in data.items() if isinstance(item, dict)]
+    if not isinstance(data, list):
+        raise ValueError("批量结果不是数组")
+
+    items: Dict[int, Dict] = {}
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        user_id = _number(item.get("user_id"))
+        if user_id is not None:
+            items[int(user_id)] = item
+    return items, method
+
+
+# ========== 字段校验 ==========
+
+def _number(value) -> Optional[float]:
+    """数值或含数字的字符串（如 "9.5分"）转为 float"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value == value else None
+    if isinstance(value, str):
+        match = _NUMBER.search(value)
+        return float(match.group()) if match else None
+    return None
+
+
+def _clamp_score(value: float) -> float:
+    return min(float(SCORE_MAX), max(0.0, value))
+
+
+def validate_prediction(data, user_data: Dict) -> Tuple[Dict, List[str]]:
+    """
+    按预测结果的字段校验并规范化（GAD-7 分数 0-21）
+
+    核心字段（最可能分数或分数区间、confidence、risk_level、suggestions）缺失或无法使用时视为无效，
+    不把大部分由规则补齐的结果记为AI预测；分数区间、改善幅度、进展和分析缺失或不一致时按前测分数和打卡率补齐。
+
+    Returns:
+        (规范化后的结果, 被修正的字段列表)
+
+    Raises:
+        ValueError: 结果无效
+    """
+    if not isinstance(data, dict):
+        raise ValueError("结果不是 JSON 对象")
+    fixed: List[str] = []
+    missing: List[str] = []  # 无法使用的核心字段
+    pre_score = _number(user_data.get('pre_score')) or DEFAULT_PRE_SCORE
+    checkin_rate = _number(user_data.get('checkin_rate'))
+    checkin_rate = DEFAULT_CHECKIN_RATE if checkin_rate is None else checkin_rate
+    default_progress, _ = tier_labels(checkin_rate)
+
+    most = _number(data.get('predicted_score_most_likely'))
+    low = _number(data.get('predicted_score_min'))
+    high = _number(data.get('predicted_score_max'))
+    if most is None:
+        if low is None or high is None:
+            raise ValueError("缺少 predicted_score_most_likely")
+        most = (low + high) / 2
+        fixed.append('predicted_score_most_likely')
+    if not 0 <= most <= SCORE_MAX:
+        raise ValueError(f"predicted_score_most_likely 超出范围 0-{SCORE_MAX}: {most}")
+
+    if low is None or not 0 <= low <= most:
+        low = _clamp_score(min(most, low if low is not None else most))
+        fixed.append('predicted_score_min')
+    if high is None or not most <= high <= SCORE_MAX:
+        high = _clamp_score(max(most, high if high is not None else most))
+        fixed.append('predicted_score_max')
+
+    # 改善幅度/改善率与前测、最可能分数保持一致
+    expected_improvement = pre_score - most
+    improvement = _number(data.get('predicted_improvement'))
+    if improvement is None or abs(improvement - expected_improvement) > 1:
+        improvement = expected_improvement
+        fixed.append('predicted_improvement')
+    expected_rate = improvement / pre_score * 100 if pre_score else 0.0
+    rate = _number(data.get('predicted_improvement_rate'))
+    if rate is None or abs(rate - expected_rate) > 5:
+        rate = expected_rate
+        fixed.append('predicted_improvement_rate')
+
+    confidence = _number(data.get('confidence'))
+    if confidence is not None and 1 < confidence <= 100:
+        confidence /= 100  # 百分数
+    if confidence is None or not 0 <= confidence <= 1:
+        missing.append('confidence')
+
+    risk = str(data.get('risk_level') or '').strip().lower()
+    if risk not in RISK_LEVELS:
+        alias = next((value for alias, value in _RISK_ALIASES.items() if alias in risk), None)
+        if alias is None:
+            missing.append('risk_level')
+        else:
+            risk = alias
+            fixed.append('risk_level')
+
+    progress = str(data.get('current_progress') or '')
+    matched = next((level for level in PROGRESS_LEVELS if level in progress), None)
+    if matched != progress:
+        fixed.append('current_progress')
+    progress = matched or default_progress
+
+    suggestions = data.get('suggestions')
+    if isinstance(suggestions, str):
+        suggestions = _SUGGESTION_SPLIT.split(suggestions)
+        fixed.append('suggestions')
+    if isinstance(suggestions, list):
+        suggestions = [str(s).strip() for s in suggestions if str(s).strip()]
+    if not suggestions:
+        missing.append('suggestions')
+    if missing:
+        raise ValueError(f"缺少核心字段或取值无效: {', '.join(missing)}")
+
+    analysis = data.get('analysis')
+    if not isinstance(analysis, str):
+        analysis = "" if analysis is None else str(analysis)
+        fixed.append('analysis')
+
+    return {
+        "predicted_score_min": round(low, 1),
+        "predicted_score_max": round(high, 1),
+        "predicted_score_most_likely": round(most, 1),
+        "predicted_improvement": round(improvement, 1),
+        "predicted_improvement_rate": round(rate, 1),
+        "current_progress": progress,
+        "risk_level": risk,
+        "confidence": round(confidence, 2),
+        "suggestions": suggestions,
+        "analysis": analysis.strip(),
+    }, list(dict.fromkeys(fixed))
@@ -0,0 +1,346 @@
+"""
+大模型多提供商路由 - 按优先级/延迟/成本选择提供商，失败自动切换，可选对冲请求（hedged request）
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from openai import (
+    OpenAI, AsyncOpenAI, APIConnectionError, BadRequestError, InternalServerError, RateLimitError
+)
+
+from circuit_breaker import CircuitBreaker, STATE_CLOSED, STATE_OPEN
+from metrics import LLM_HEDGES, LLM_REQUESTS, record_llm_usage
+
+STRATEGIES = ("priority", "latency", "cost")
+
+# 计算延迟分位数的最近成功调用数，及开始参考延迟所需的最少样本
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 10
+
+# 同步调用在 deadline 内自行重试的错误（连接失败/超时、限流、5xx），及重试轮之间的退避基数（秒）
+RETRYABLE_ERRORS = (APIConnectionError, RateLimitError, InternalServerError)
+RETRY_BACKOFF = 0.5
+
+
+class NoProviderAvailable(RuntimeError):
+    """所有提供商均被停用或处于熔断状态"""
+
+
+def _percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class Provider:
+    """一个 OpenAI 兼容的大模型提供商（独立的客户端、熔断器和延迟统计）"""
+
+    def __init__(self, name: str, base_url: str, model: str, api_key: str, cost: float = 1.0,
+                 json_mode: bool = True, timeout: float = 30, max_retries: int = 2,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.base_url = base_url
+        self.model = model
+        self.cost = cost
+        self.json_mode = json_mode  # 请求时带 response_format=json_object
+        self.max_retries = max_retries
+        client_kwargs = {
+            "api_key": 'ollama' if name == 'ollama' else api_key,
+            "base_url": base_url,
+            "timeout": timeout,
+            "max_retries": max_retries
+        }
+        self.client = OpenAI(**client_kwargs)             # 同步客户端（脚本使用）
+        self.async_client = AsyncOpenAI(**client_kwargs)  # 异步客户端（API路由使用）
+        self.breaker = breaker or CircuitBreaker()
+        self.enabled = True
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self.enabled and self.breaker.state != STATE_OPEN
+
+    def observe(self, seconds: float):
+        """记录一次成功调用的耗时"""
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def latency(self, p: float) -> Optional[float]:
+        """最近成功调用耗时的 p 分位数（样本不足时为 None）"""
+        with self._lock:
+            if len(self._latencies) < LATENCY_MIN_SAMPLES:
+                return None
+            return _percentile(list(self._latencies), p)
+
+    def json_kwargs(self) -> Dict:
+        return {"response_format": {"type": "json_object"}} if self.json_mode else {}
+
+    def json_mode_rejected(self, error: Exception) -> bool:
+        """提供商不支持 response_format 时关闭 JSON 模式，返回 True 表示应不带该参数重试"""
+        if not self.json_mode or not isinstance(error, BadRequestError):
+            return False
+        message = str(error).lower()
+        if "response_format" not in message and "json_object" not in message:
+            return False
+        self.json_mode = False
+        print(f"⚠ {self.name} 不支持 JSON 模式，已关闭")
+        return True
+
+    def count(self, outcome: str):
+        LLM_REQUESTS.inc(provider=self.name, model=self.model, outcome=outcome)
+
+    def record_usage(self, response):
+        record_llm_usage(self.name, self.model, getattr(response, "usage", None))
+
+    def stats(self) -> Dict:
+        p50, p95 = self.latency(50), self.latency(95)
+        return {
+            "name": self.name,
+            "model": self.model,
+            "base_url": self.base_url,
+            "cost": self.cost,
+            "json_mode": self.json_mode,
+            "enabled": self.enabled,
+            "latency_p50": round(p50, 3) if p50 is not None else None,
+            "latency_p95": round(p95, 3) if p95 is not None else None,
+            "breaker": self.breaker.stats(),
+        }
+
+
+class ProviderRouter:
+    """
+    提供商路由
+
+    - priority：按配置顺序（首选提供商在前）
+    - latency：按最近成功调用的 p50 耗时，无样本的提供商排在前面以便获得样本
+    - cost：按配置的相对成本
+    停用或熔断中的提供商不参与路由；调用失败时按顺序切换到下一个提供商。
+    开启对冲时，若首个请求超过其 p95 耗时（样本不足时为 hedge_delay）仍未返回，
+    向下一个提供商再发一个请求，取先返回的结果并取消另一个。
+    """
+
+    def __init__(self, providers: List[Provider], strategy: str = "priority", hedge: bool = False,
+                 hedge_delay: float = 5.0, hedge_min_delay: float = 0.5):
+        if not providers:
+            raise ValueError("至少需要一个提供商")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"不支持的路由策略: {strategy}")
+        self.providers: Dict[str, Provider] = {p.name: p for p in providers}
+        self._order = [p.name for p in providers]
+        self.strategy = strategy
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.hedge_min_delay = hedge_min_delay
+        self._lock = threading.Lock()
+
+    @property
+    def primary(self) -> Provider:
+        return self.providers[self._order[0]]
+
+    def configure(self, primary: Optional[str] = None, strategy: Optional[str] = None,
+                  hedge: Optional[bool] = None, enabled: Optional[Dict[str, bool]] = None):
+        """运行时调整路由（参数无效时抛出 ValueError，不做任何修改）"""
+        names = [primary] if primary is not None else []
+        names += list(enabled or {})
+        unknown = [name for name in names if name not in self.providers]
+        if unknown:
+            raise ValueError(f"未知的提供商: {', '.join(unknown)}")
+        if strategy is not None and strategy not in STRATEGIES:
+            raise ValueError(f"不支持的路由策略: {strategy}")
+
+        with self._lock:
+            if primary is not None:
+                self._order.remove(primary)
+                self._order.insert(0, primary)
+            if strategy is not None:
+                self.strategy = strategy
+            if hedge is not None:
+                self.hedge = hedge
+            for name, value in (enabled or {}).items():
+                self.providers[name].enabled = value
+
+    def candidates(self) -> List[Provider]:
+        """可用提供商，按当前策略排序"""
+        with self._lock:
+            ordered = [self.providers[name] for name in self._order]
+        available = [p for p in ordered if p.available]
+        if self.strategy == "latency":
+            available.sort(key=lambda p: p.latency(50) or 0.0)
+        elif self.strategy == "cost":
+            available.sort(key=lambda p: p.cost)
+        return available
+
+    def acquire(self, exclude=()) -> Optional[Provider]:
+        """按顺序取第一个熔断器放行的提供商"""
+        for provider in self.candidates():
+            if provider.name not in exclude and provider.breaker.allow():
+                return provider
+        return None
+
+    def hedge_after(self, provider: Provider) -> float:
+        """对冲请求的等待时间：该提供商的 p95 耗时（不低于 hedge_min_delay）"""
+        p95 = provider.latency(95)
+        if p95 is None:
+            return self.hedge_delay
+        return max(self.hedge_min_delay, p95)
+
+    def complete(self, deadline: float, **kwargs) -> Tuple[object, Provider]:
+        """
+        同步调用：依次尝试可用提供商，直到成功或超过 deadline 秒
+
+        客户端按次关闭自动重试（否则一次调用最长可达 (1+max_retries)×deadline），
+        由这里在 deadline 内重试：一轮提供商都失败后退避，再试错误可重试且未用尽 max_retries 的提供商。
+        """
+        end = time.monotonic() + deadline
+        tried = set()      # 本轮已尝试
+        exhausted = set()  # 不再重试（错误不可重试或重试次数用尽）
+        attempts: Dict[str, int] = {}
+        retry_round = 0
+        last_error: Optional[Exception] = None
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            provider = self.acquire(exclude=tried | exhausted)
+            if provider is None:
+                delay = RETRY_BACKOFF * (2 ** retry_round)
+                if not tried - exhausted or delay >= remaining:
+                    break
+                time.sleep(delay)
+                retry_round += 1
+                tried.clear()
+                continue
+            tried.add(provider.name)
+            attempts[provider.name] = attempts.get(provider.name, 0) + 1
+            started = time.perf_counter()
+            try:
+                response = provider.client.with_options(max_retries=0).chat.completions.create(
+                    model=provider.model, timeout=remaining, **provider.json_kwargs(), **kwargs
+                )
+            except Exception as e:
+                print(f"AI调用失败（{provider.name}）: {e}")
+                if provider.json_mode_rejected(e):
+                    provider.breaker.record(None, 0.0)
+                    tried.discard(provider.name)
+                    attempts[provider.name] -= 1
+                    continue
+                provider.breaker.record(False, time.perf_counter() - started)
+                provider.count("error")
+                last_error = e
+                if not isinstance(e, RETRYABLE_ERRORS) or attempts[provider.name] > provider.max_retries:
+                    exhausted.add(provider.name)
+                continue
+            elapsed = time.perf_counter() - started
+            provider.breaker.record(True, elapsed)
+            provider.observe(elapsed)
+            provider.count("success")
+            provider.record_usage(response)
+            return response, provider
+        raise last_error or NoProviderAvailable("没有可用的大模型提供商")
+
+    async def complete_async(self, deadline: float, **kwargs) -> Tuple[object, Provider]:
+        """
+        异步调用：失败时切换提供商，开启对冲时慢请求触发第二个请求
+
+        超过 deadline 秒抛出 asyncio.TimeoutError，在途请求被取消并计为超时。
+        """
+        loop = asyncio.get_running_loop()
+        end = loop.time() + deadline
+        tried = set()
+        running: Dict[asyncio.Task, Tuple[Provider, float, bool]] = {}  # 任务 → (提供商, 开始时间, 是否对冲)
+        last_error: Optional[Exception] = None
+        hedge_blocked = not self.hedge
+        timed_out = False
+
+        def launch(hedged: bool = False) -> bool:
+            provider = self.acquire(exclude=tried)
+            if provider is None:
+                return False
+            tried.add(provider.name)
+            task = asyncio.ensure_future(
+                provider.async_client.chat.completions.create(
+                    model=provider.model, **provider.json_kwargs(), **kwargs
+                )
+            )
+            running[task] = (provider, time.perf_counter(), hedged)
+            if hedged:
+                LLM_HEDGES.inc(outcome="fired")
+            return True
+
+        if not launch():
+            raise NoProviderAvailable("没有可用的大模型提供商")
+
+        try:
+            while running:
+                remaining = end - loop.time()
+                if remaining <= 0:
+                    timed_out = True
+                    raise asyncio.TimeoutError()
+
+                wait = remaining
+                hedge_at = None
+                if not hedge_blocked and len(running) == 1:
+                    provider, started, _ = next(iter(running.values()))
+                    hedge_at = started + self.hedge_after(provider)
+                    wait = min(wait, max(0.0, hedge_at - time.perf_counter()))
+
+                done, _ = await asyncio.wait(running, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if hedge_at is not None and time.perf_counter() >= hedge_at:
+                        # 没有其他可用提供商时不再尝试对冲
+                        hedge_blocked = not launch(hedged=True)
+                    continue
+
+                for task in done:
+                    provider, started, hedged = running.pop(task)
+                    elapsed = time.perf_counter() - started
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        print(f"AI调用失败（{provider.name}）: {e}")
+                        if provider.json_mode_rejected(e):
+                            provider.breaker.record(None, elapsed)
+                            tried.discard(provider.name)
+                            continue
+                        provider.breaker.record(False, elapsed)
+                        provider.count("error")
+                        last_error = e
+                        continue
+                    provider.breaker.record(True, elapsed)
+                    provider.observe(elapsed)
+                    provider.count("success")
+                    provider.record_usage(response)
+                    if hedged:
+                        LLM_HEDGES.inc(outcome="won")
+                    return response, provider
+
+                if not running and not launch():
+                    break
+            raise last_error or NoProviderAvailable("没有可用的大模型提供商")
+        finally:
+            # 超时的请求计为失败；对冲落败或调用方取消的请求只归还熔断器名额
+            for task, (provider, started, _) in running.items():
+                task.cancel()
+                provider.breaker.record(False if timed_out else None, time.perf_counter() - started)
+                if timed_out:
+                    provider.count("timeout")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            order = list(self._order)
+        return {
+            "primary": order[0],
+            "strategy": self.strategy,
+            "hedge": self.hedge,
+            "hedge_delay": self.hedge_delay,
+            "route": [p.name for p in self.candidates()],
+            "providers": [self.providers[name].stats() for name in order],
+        }
+
+    def healthy(self) -> bool:
+        """至少有一个启用的提供商熔断器处于 closed 状态"""
+        return any(p.enabled and p.breaker.state == STATE_CLOSED for p in self.providers.values())
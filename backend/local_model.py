@@ -0,0 +1,248 @@
+"""
+本地回归模型 - 基于已完成用户训练的岭回归，作为AI之前的快速预测层
+
+训练：python local_model.py train [--alpha 1.0] [--output 路径]
+查看：python local_model.py info
+"""
+import argparse
+import json
+import math
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from rule_engine import fallback_analysis, fallback_suggestions
+
+# 模型特征（均来自 Database.get_complete_user_data）
+FEATURES = (
+    'pre_score',
+    'weeks_completed',
+    'checkin_rate',
+    'avg_study_duration',
+    'completion_rate',
+    'age',
+    'gender',
+)
+
+GAD7_MIN = 0.0
+GAD7_MAX = 21.0
+Z_95 = 1.96
+
+
+class LocalModel:
+    """岭回归：后测分数 ~ 标准化特征"""
+
+    def __init__(self, means: np.ndarray, stds: np.ndarray, coef: np.ndarray, intercept: float,
+                 sigma: float, xtx_inv: np.ndarray, alpha: float, n_samples: int,
+                 cv_mae: Optional[float] = None, trained_at: Optional[str] = None):
+        self.means = means
+        self.stds = stds
+        self.coef = coef
+        self.intercept = intercept
+        self.sigma = sigma          # 残差标准差
+        self.xtx_inv = xtx_inv      # (XᵀX + αI)⁻¹，用于计算杠杆值
+        self.alpha = alpha
+        self.n_samples = n_samples
+        self.cv_mae = cv_mae
+        self.trained_at = trained_at or datetime.now().strftime('%Y%m%d%H%M')
+
+    @property
+    def version(self) -> str:
+        return f"local-ridge-{self.trained_at}"
+
+    # ---------- 训练 ----------
+
+    @classmethod
+    def fit(cls, records: Sequence[Dict], alpha: float = 1.0, folds: int = 5) -> "LocalModel":
+        """用含 pre_score/post_score 的用户数据训练"""
+        samples = [r for r in records if r.get('pre_score') is not None and r.get('post_score') is not None]
+        if len(samples) < len(FEATURES) + 2:
+            raise ValueError(f"训练样本不足：需要至少 {len(FEATURES) + 2} 个已完成用户，当前 {len(samples)} 个")
+
+        X = feature_matrix(samples)
+        y = np.array([float(r['post_score']) for r in samples])
+        model = cls._fit_arrays(X, y, alpha)
+        model.cv_mae = cls._cross_validate(X, y, alpha, folds)
+        return model
+
+    @classmethod
+    def _fit_arrays(cls, X: np.ndarray, y: np.ndarray, alpha: float) -> "LocalModel":
+        means = X.mean(axis=0)
+        stds = X.std(axis=0)
+        stds[stds == 0] = 1.0
+        Z = (X - means) / stds
+
+        # 截距不参与正则：对中心化后的 y 求解
+        intercept = float(y.mean())
+        xtx_inv = np.linalg.inv(Z.T @ Z + alpha * np.eye(Z.shape[1]))
+        coef = xtx_inv @ Z.T @ (y - intercept)
+
+        residuals = y - (Z @ coef + intercept)
+        dof = max(len(y) - Z.shape[1] - 1, 1)
+        sigma = float(math.sqrt(float(residuals @ residuals) / dof))
+        return cls(means, stds, coef, intercept, sigma, xtx_inv, alpha, len(y))
+
+    @classmethod
+    def _cross_validate(cls, X: np.ndarray, y: np.ndarray, alpha: float, folds: int) -> Optional[float]:
+        """k 折交叉验证平均绝对误差"""
+        n = len(y)
+        folds = min(folds, n)
+        if folds < 2:
+            return None
+        order = np.random.default_rng(0).permutation(n)
+        errors = []
+        for k in range(folds):
+            test = order[k::folds]
+            train = np.setdiff1d(order, test)
+            if len(train) < X.shape[1] + 2:
+                continue
+            model = cls._fit_arrays(X[train], y[train], alpha)
+            predicted, _ = model.predict_arrays(X[test])
+            errors.append(np.abs(predicted - y[test]))
+        return round(float(np.concatenate(errors).mean()), 3) if errors else None
+
+    # ---------- 预测 ----------
+
+    def predict_arrays(self, X: np.ndarray):
+        """返回 (预测后测分数, 95%预测区间半宽)"""
+        Z = (X - self.means) / self.stds
+        predicted = np.clip(Z @ self.coef + self.intercept, GAD7_MIN, GAD7_MAX)
+        leverage = np.einsum('ij,jk,ik->i', Z, self.xtx_inv, Z)
+        half_width = Z_95 * self.sigma * np.sqrt(1 + leverage)
+        return predicted, half_width
+
+    def predict(self, user_data: Dict) -> Dict:
+        """单用户预测，结构与 AIService.evaluate_intervention 返回值相同"""
+        return self.predict_many([user_data])[0]
+
+    def predict_many(self, users: Sequence[Dict]) -> List[Dict]:
+        X = feature_matrix(users)
+        predicted, half_width = self.predict_arrays(X)
+        return [
+            self._result(user, float(score), float(width))
+            for user, score, width in zip(users, predicted, half_width)
+        ]
+
+    def _result(self, user_data: Dict, predicted_score: float, half_width: float) -> Dict:
+        pre_score = float(user_data.get('pre_score') or 0)
+        checkin_rate = float(user_data.get('checkin_rate') or 0)
+        improvement = pre_score - predicted_score
+        improvement_rate = improvement / pre_score if pre_score > 0 else 0.0
+
+        # 风险/进展按预测改善率分档（≥25% 为临床显著改善）
+        if improvement_rate >= 0.40:
+            progress, risk = "良好", "low"
+        elif improvement_rate >= 0.25:
+            progress, risk = "一般", "medium"
+        else:
+            progress, risk = "较差", "high"
+
+        # 置信度：预测区间半宽相对基线分数越小越可信
+        confidence = 1 - half_width / max(pre_score, 1.0)
+
+        return {
+            "predicted_score_min": round(max(GAD7_MIN, predicted_score - half_width), 1),
+            "predicted_score_max": round(min(GAD7_MAX, predicted_score + half_width), 1),
+            "predicted_score_most_likely": round(predicted_score, 1),
+            "predicted_improvement": round(improvement, 1),
+            "predicted_improvement_rate": round(improvement_rate * 100, 1),
+            "current_progress": progress,
+            "risk_level": risk,
+            "confidence": round(min(0.95, max(0.05, confidence)), 2),
+            "suggestions": fallback_suggestions(checkin_rate, int(user_data.get('weeks_completed') or 0)),
+            "analysis": fallback_analysis(pre_score, checkin_rate, predicted_score,
+                                          improvement, improvement_rate, risk),
+            "model_version": self.version
+        }
+
+    # ---------- 序列化 ----------
+
+    def to_dict(self) -> Dict:
+        return {
+            "features": list(FEATURES),
+            "means": self.means.tolist(),
+            "stds": self.stds.tolist(),
+            "coef": self.coef.tolist(),
+            "intercept": self.intercept,
+            "sigma": self.sigma,
+            "xtx_inv": self.xtx_inv.tolist(),
+            "alpha": self.alpha,
+            "n_samples": self.n_samples,
+            "cv_mae": self.cv_mae,
+            "trained_at": self.trained_at,
+        }
+
+    def save(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "LocalModel":
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if tuple(data["features"]) != FEATURES:
+            raise ValueError(f"模型特征与当前代码不一致: {data['features']}")
+        return cls(
+            np.array(data["means"]), np.array(data["stds"]), np.array(data["coef"]),
+            data["intercept"], data["sigma"], np.array(data["xtx_inv"]),
+            data["alpha"], data["n_samples"], data.get("cv_mae"), data["trained_at"]
+        )
+
+
+def feature_matrix(users: Sequence[Dict]) -> np.ndarray:
+    """用户数据 → 特征矩阵（缺失值按 0 处理）"""
+    return np.array(
+        [[float(user.get(key) or 0) for key in FEATURES] for user in users],
+        dtype=np.float64
+    ).reshape(len(users), len(FEATURES))
+
+
+def load_completed_users(database) -> List[Dict]:
+    """读取已完成且有前后测的用户"""
+    user_ids = database.get_user_ids(status=1)
+    users = database.get_complete_user_data_many(user_ids)
+    return [u for u in users.values() if u.get('pre_score') is not None and u.get('post_score') is not None]
+
+
+def train_from_database(alpha: float = 1.0, output: Optional[str] = None) -> LocalModel:
+    """从数据库读取已完成用户训练模型并保存"""
+    from config import LOCAL_MODEL_PATH
+    from database import db
+
+    started = time.perf_counter()
+    users = load_completed_users(db)
+    model = LocalModel.fit(users, alpha=alpha)
+    path = output or LOCAL_MODEL_PATH
+    model.save(path)
+    print(f"✓ 模型训练完成：{model.version}，样本 {model.n_samples} 个，"
+          f"交叉验证MAE {model.cv_mae}，残差标准差 {model.sigma:.3f}，"
+          f"耗时 {(time.perf_counter() - started) * 1000:.0f}ms")
+    print(f"✓ 已保存到 {path}")
+    return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地回归模型")
+    sub = parser.add_subparsers(dest="command")
+    train_parser = sub.add_parser("train", help="用已完成用户训练模型")
+    train_parser.add_argument("--alpha", type=float, default=1.0, help="岭回归正则系数")
+    train_parser.add_argument("--output", help="模型保存路径（默认 LOCAL_MODEL_PATH）")
+    sub.add_parser("info", help="查看当前模型")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        train_from_database(args.alpha, args.output)
+    elif args.command == "info":
+        from config import LOCAL_MODEL_PATH
+        if not Path(LOCAL_MODEL_PATH).exists():
+            print(f"模型文件不存在: {LOCAL_MODEL_PATH}")
+            sys.exit(1)
+        info = LocalModel.load(LOCAL_MODEL_PATH).to_dict()
+        print(json.dumps({k: v for k, v in info.items() if k != "xtx_inv"}, ensure_ascii=False, indent=2))
+    else:
+        parser.print_help()
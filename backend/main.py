@@ -1,20 +1,86 @@
 """
 FastAPI 主应用
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List
-from database import db
+from starlette.concurrency import run_in_threadpool
+from typing import Optional, List, Dict
+from database import db, summary_cursor
+from async_database import adb
 from ai_service import ai_service
+from cache import SQLiteStore, UserDataCache
+from responses import CompressionMiddleware, CompressionStats, FastJSONResponse, columnar
+from single_flight import SingleFlight
+from importer import RowError, detect_format, iter_rows, validate_log_row, validate_user_row
+from jobs import JobRunner, JobStore, JOB_FINISHED
+from write_behind import WriteBehindBuffer
+from model_performance import AccuracyBackfill, summarize_tiers
+from metrics import HTTP_REQUEST_SECONDS, registry, set_component_stats
+from config import (
+    PREDICT_BATCH_CONCURRENCY, PREDICT_BATCH_MAX_USERS, IMPORT_CHUNK_SIZE, IMPORT_MAX_ERRORS,
+    JOB_DB_PATH, JOB_CONCURRENCY, JOB_RATE_LIMIT, JOB_MAX_RETRIES, JOB_RETRY_BACKOFF,
+    JOB_CHECKPOINT_SIZE, JOB_LEASE_TIMEOUT, JOB_MAX_USERS,
+    WRITE_BEHIND_ENABLED, WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_FLUSH_INTERVAL,
+    WRITE_BEHIND_MAX_QUEUE, WRITE_BEHIND_MAX_RETRIES,
+    PERFORMANCE_BACKFILL_INTERVAL, PERFORMANCE_BACKFILL_BATCH,
+    USER_CACHE_ENABLED, USER_CACHE_TTL, USER_CACHE_MAX_SIZE, USER_CACHE_BACKEND,
+    USER_CACHE_LOCAL_TTL, USER_CACHE_SQLITE_PATH,
+    RESPONSE_COMPRESSION_ENABLED, RESPONSE_COMPRESSION_MIN_SIZE, RESPONSE_GZIP_LEVEL, RESPONSE_BROTLI_QUALITY
+)
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import time
 import traceback
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动/停止数据库连接、后台任务执行器、预测记录写入和准确度回填；停止时先排空写入队列再关闭连接"""
+    await adb.start()
+    if WRITE_BEHIND_ENABLED:
+        prediction_writer.start()
+    job_runner.start()
+    accuracy_backfill.start()
+    yield
+    await accuracy_backfill.stop()
+    await job_runner.stop()
+    await prediction_writer.stop()
+    await adb.close()
+
+
 app = FastAPI(
     title="AI心理干预效果预测系统",
     description="基于AI的心理干预效果评估与预测",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    """按路由模板记录请求耗时（流式响应记录到开始返回为止）"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=str(status)
+        )
+
+
+# 同一用户、同一特征的并发预测只评估并保存一次
+prediction_flights = SingleFlight()
+
 # 允许跨域
 app.add_middleware(
     CORSMiddleware,
@@ -24,6 +90,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli 压缩（流式响应不压缩）
+compression_stats = CompressionStats()
+if RESPONSE_COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=RESPONSE_COMPRESSION_MIN_SIZE,
+        gzip_level=RESPONSE_GZIP_LEVEL,
+        brotli_quality=RESPONSE_BROTLI_QUALITY,
+        stats=compression_stats
+    )
+
 
 # ========== 数据模型 ==========
 
@@ -37,10 +114,39 @@ class PredictionResponse(BaseModel):
     message: Optional[str] = None
 
 
+class BatchPredictionRequest(BaseModel):
+    user_ids: Optional[List[int]] = None  # 指定用户ID；为空时按下面的条件筛选
+    status: Optional[int] = None          # 0=进行中, 1=已完成
+    project_id: Optional[int] = None
+    limit: Optional[int] = None
+
+
+class JobRequest(BaseModel):
+    user_ids: Optional[List[int]] = None  # 指定用户ID；为空时按下面的条件筛选
+    status: Optional[int] = None          # 0=进行中, 1=已完成
+    project_id: Optional[int] = None
+    limit: Optional[int] = None
+
+
+class RoutingRequest(BaseModel):
+    primary: Optional[str] = None                # 首选提供商
+    strategy: Optional[str] = None               # priority / latency / cost
+    hedge: Optional[bool] = None                 # 是否开启对冲请求
+    enabled: Optional[Dict[str, bool]] = None    # 启用/停用提供商，如 {"ollama": false}
+
+
 class UserListResponse(BaseModel):
     success: bool
     data: List[dict]
-    total: int
+    total: int                          # 本页条数
+    next_cursor: Optional[dict] = None  # 下一页游标（分页且本页已满时返回）
+
+
+# /api/users?format=columns 的列
+USER_LIST_COLUMNS = (
+    'user_id', 'name', 'age', 'gender', 'status', 'project_id',
+    'pre_score', 'post_score', 'risk_level', 'improvement', 'improvement_rate'
+)
 
 
 class CreateUserRequest(BaseModel):
@@ -63,6 +169,270 @@ class CreateUserResponse(BaseModel):
     message: Optional[str] = None
 
 
+# ========== 辅助函数 ==========
+
+def _build_prediction_data(user_data: dict, ai_result: dict) -> dict:
+    """组装预测接口返回数据"""
+    return {
+        "user_info": {
+            "user_id": user_data['user_id'],
+            "name": user_data['name'],
+            "age": user_data['age'],
+            "gender": "男" if user_data['gender'] == 1 else "女"
+        },
+        "assessment_data": {
+            "pre_score": user_data['pre_score'],
+            "post_score": user_data.get('post_score'),
+            "has_post_test": user_data.get('post_score') is not None
+        },
+        "learning_data": {
+            "weeks_completed": user_data['weeks_completed'],
+            "total_checkins": user_data['total_checkins'],
+            "checkin_rate": user_data['checkin_rate'],
+            "avg_study_duration": user_data['avg_study_duration'],
+            "completion_rate": user_data['completion_rate']
+        },
+        "ai_prediction": ai_result
+    }
+
+
+def _prediction_record(user_data: dict, ai_result: dict, latency_ms: Optional[float] = None) -> dict:
+    """预测记录（写入 predictions 表；已有后测时一并写入实际分数）"""
+    return {
+        "pre_score": user_data['pre_score'],
+        "predicted_score": ai_result['predicted_score_most_likely'],
+        "predicted_improvement": ai_result['predicted_improvement'],
+        "confidence": ai_result['confidence'],
+        "risk_level": ai_result['risk_level'],
+        "suggestions": ai_result['suggestions'],
+        "model_version": ai_result.get('model_version', 'v1.0'),
+        "actual_score": user_data.get('post_score'),
+        "latency_ms": latency_ms
+    }
+
+
+def _prediction_key(user_data: dict) -> str:
+    return f"{user_data['user_id']}:{ai_service.fingerprint(user_data)}"
+
+
+async def _predictions_saved(records: List[Dict]):
+    """
+    预测记录写入后清空用户列表缓存（列表中的风险等级取最近一次预测）；所有预测写入路径共用
+
+    按批调用（写入队列每批、后台任务每个 checkpoint、批量预测每个请求各一次），
+    因此批量预测运行期间列表缓存基本不会命中。
+    """
+    if records:
+        await _invalidate_users_async()
+
+
+async def _save_prediction(user_data: dict, ai_result: dict, latency_ms: Optional[float] = None):
+    """保存预测记录：放入写入队列，未启用或队列已满时直接写入"""
+    record = {"user_id": user_data['user_id'], **_prediction_record(user_data, ai_result, latency_ms)}
+    if prediction_writer.submit(record):
+        return
+    try:
+        await adb.save_predictions_many([record])
+    except Exception as e:
+        print(f"保存预测记录失败: {e}")
+        return
+    await _predictions_saved([record])
+
+
+async def _evaluate_and_save(user_data: dict) -> dict:
+    """AI评估并保存预测记录（single-flight 的 leader 执行）"""
+    started = time.perf_counter()
+    ai_result = await ai_service.evaluate_intervention_async(user_data)
+    await _save_prediction(user_data, ai_result, (time.perf_counter() - started) * 1000)
+    return ai_result
+
+
+def _sse(event: str, data) -> str:
+    """编码一条 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=float)}\n\n"
+
+
+async def _run_import(request: Request, fmt: Optional[str], validate, write) -> dict:
+    """
+    流式导入：边接收请求体边解析校验，每满 IMPORT_CHUNK_SIZE 行写入一个事务
+    
+    写入在线程池中进行，同一时间只有一批在写，下一批的解析与之并行。
+    无效行记录错误后跳过，不影响其它行。
+    
+    Args:
+        validate: 原始记录 → 规范化数据，无效时抛出 RowError
+        write: (行号, 数据) 列表 → (写入行数, 错误列表)
+    """
+    try:
+        fmt = detect_format(request.headers.get("content-type"), fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    started = time.perf_counter()
+    stats = {"received": 0, "inserted": 0, "failed": 0, "chunks": 0}
+    errors: List[dict] = []
+    db_seconds = 0.0
+    
+    def add_errors(batch_errors):
+        stats["failed"] += len(batch_errors)
+        errors.extend(batch_errors[:max(IMPORT_MAX_ERRORS - len(errors), 0)])
+    
+    def timed_write(rows):
+        t = time.perf_counter()
+        inserted, batch_errors = write(rows)
+        return inserted, batch_errors, time.perf_counter() - t
+    
+    async def finish(task):
+        nonlocal db_seconds
+        inserted, batch_errors, elapsed = await task
+        stats["inserted"] += inserted
+        stats["chunks"] += 1
+        db_seconds += elapsed
+        add_errors(batch_errors)
+    
+    pending = None
+    chunk = []
+    message = None
+    try:
+        async for index, raw in iter_rows(request.stream(), fmt):
+            stats["received"] += 1
+            try:
+                if isinstance(raw, RowError):
+                    raise raw
+                chunk.append((index, validate(raw)))
+            except RowError as e:
+                add_errors([{"row": index, "error": str(e)}])
+                continue
+            
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                if pending is not None:
+                    await finish(pending)
+                pending = asyncio.ensure_future(run_in_threadpool(timed_write, chunk))
+                chunk = []
+    except ValueError as e:
+        # 请求体整体格式错误：已写入的批次保留，剩余部分不再处理
+        message = str(e)
+    finally:
+        if pending is not None:
+            await finish(pending)
+    if chunk:
+        await finish(run_in_threadpool(timed_write, chunk))
+    
+    if message and stats["received"] == 0:
+        raise HTTPException(status_code=400, detail=message)
+    
+    errors.sort(key=lambda e: e["row"])
+    elapsed = time.perf_counter() - started
+    return {
+        "success": message is None,
+        "message": message,
+        "format": fmt,
+        **stats,
+        "errors": errors,
+        "errors_truncated": stats["failed"] > len(errors),
+        "timing": {
+            "total_ms": round(elapsed * 1000, 1),
+            "db_ms": round(db_seconds * 1000, 1),
+            "rows_per_sec": round(stats["received"] / elapsed, 1) if elapsed > 0 else None
+        }
+    }
+
+
+# 预测记录异步写入（单用户/流式预测）
+prediction_writer = WriteBehindBuffer(
+    adb,
+    batch_size=WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=WRITE_BEHIND_FLUSH_INTERVAL,
+    max_queue=WRITE_BEHIND_MAX_QUEUE,
+    max_retries=WRITE_BEHIND_MAX_RETRIES,
+    on_saved=_predictions_saved
+)
+
+# 批量预测后台任务
+job_store = JobStore(JOB_DB_PATH)
+job_runner = JobRunner(
+    job_store, db, ai_service, _prediction_record,
+    concurrency=JOB_CONCURRENCY,
+    rate_limit=JOB_RATE_LIMIT,
+    max_retries=JOB_MAX_RETRIES,
+    retry_backoff=JOB_RETRY_BACKOFF,
+    checkpoint_size=JOB_CHECKPOINT_SIZE,
+    lease_timeout=JOB_LEASE_TIMEOUT,
+    on_saved=_predictions_saved
+)
+
+# 预测准确度回填（用户有了后测后更新 predictions 和 model_performance）
+accuracy_backfill = AccuracyBackfill(db, interval=PERFORMANCE_BACKFILL_INTERVAL, batch_size=PERFORMANCE_BACKFILL_BATCH)
+
+# 用户详情/列表读缓存（USER_CACHE_ENABLED=0 时为 None，每次查询数据库）
+user_cache = UserDataCache(
+    max_size=USER_CACHE_MAX_SIZE,
+    ttl=USER_CACHE_TTL,
+    local_ttl=USER_CACHE_LOCAL_TTL,
+    store_factory=(lambda table: SQLiteStore(USER_CACHE_SQLITE_PATH, table=table))
+    if USER_CACHE_BACKEND == 'sqlite' else None
+) if USER_CACHE_ENABLED else None
+
+
+async def _read_user(user_id: int):
+    """读取用户详情，返回 (用户数据, ETag)，用户不存在返回 None"""
+    load = lambda: adb.get_complete_user_data(user_id)
+    if user_cache is not None:
+        return await user_cache.get_user(user_id, load)
+    user_data = await load()
+    return (user_data, UserDataCache.etag(user_data)) if user_data else None
+
+
+async def _read_user_list(params: Dict):
+    """读取用户列表，返回 ({data, next_cursor}, ETag)"""
+    async def load():
+        users = await adb.get_all_users_summary(**params)
+        next_cursor = None
+        if params['limit'] is not None and len(users) == params['limit']:
+            next_cursor = summary_cursor(users[-1], params['sort'])
+        return {"data": users, "next_cursor": next_cursor}
+
+    if user_cache is not None:
+        return await user_cache.get_list(params, load)
+    page = await load()
+    return page, UserDataCache.etag(page)
+
+
+def _invalidate_users(user_ids=None):
+    """用户数据变化后失效读缓存：传入用户ID时删除其详情，总是清空列表（在线程池中调用）"""
+    if user_cache is None:
+        return
+    if user_ids:
+        user_cache.invalidate_users(user_ids)
+    else:
+        user_cache.invalidate_lists()
+
+
+async def _invalidate_users_async(user_ids=None):
+    """同 _invalidate_users，在事件循环上调用（共享存储的删除交给线程池）"""
+    if user_cache is None:
+        return
+    if user_ids:
+        await user_cache.invalidate_users_async(user_ids)
+    else:
+        await user_cache.invalidate_lists_async()
+
+
+def _etag_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def _not_modified(request: Request, etag: str) -> Optional[Response]:
+    """请求的 If-None-Match 与 ETag 相同（含压缩后的弱 ETag）时返回 304 响应"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return None
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in tags or etag in tags or f"W/{etag}" in tags:
+        return Response(status_code=304, headers=_etag_headers(etag))
+    return None
+
+
 # ========== API接口 ==========
 
 @app.get("/")
@@ -74,19 +444,55 @@ def root():
         "status": "running",
         "endpoints": {
             "predict": "/api/predict",
-            "users": "/api/users"
+            "predict_stream": "/api/predict/stream",
+            "predict_batch": "/api/predict/batch",
+            "jobs": "/api/jobs",
+            "ai_providers": "/api/ai/providers",
+            "ai_prompts": "/api/ai/prompts",
+            "model_performance": "/api/model-performance",
+            "users": "/api/users",
+            "metrics": "/metrics",
+            "users_import": "/api/users/import",
+            "learning_logs_import": "/api/learning-logs/import"
         }
     }
 
 
 @app.get("/api/health")
 def health_check():
-    """健康检查"""
-    return {"status": "healthy"}
+    """健康检查（所有大模型提供商均熔断或停用时为 degraded，预测仍可用但降级为本地模型/规则引擎）"""
+    return {
+        "status": "healthy" if ai_service.router.healthy() else "degraded",
+        "db_pool": db.pool.stats(),
+        "db_async": adb.stats(),
+        "prediction_cache": ai_service.cache.stats() if ai_service.cache else None,
+        "prediction_single_flight": prediction_flights.stats(),
+        "prediction_writer": prediction_writer.stats(),
+        "accuracy_backfill": accuracy_backfill.stats(),
+        "user_cache": user_cache.stats() if user_cache else None,
+        "response_compression": compression_stats.stats() if RESPONSE_COMPRESSION_ENABLED else None,
+        "llm_routing": ai_service.router.stats()
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus 指标"""
+    set_component_stats("db_pool", db.pool.stats())
+    set_component_stats("db_async", adb.stats())
+    set_component_stats("prediction_cache", ai_service.cache.stats() if ai_service.cache else None)
+    set_component_stats("prediction_single_flight", prediction_flights.stats())
+    set_component_stats("prediction_writer", prediction_writer.stats())
+    set_component_stats("accuracy_backfill", accuracy_backfill.stats())
+    set_component_stats("user_cache", user_cache.stats() if user_cache else None)
+    set_component_stats("response_compression", compression_stats.stats() if RESPONSE_COMPRESSION_ENABLED else None)
+    for provider in ai_service.router.providers.values():
+        set_component_stats(f"llm_breaker:{provider.name}", provider.breaker.stats())
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 
 @app.post("/api/predict", response_model=PredictionResponse)
-def predict_intervention_effect(request: PredictionRequest):
+async def predict_intervention_effect(request: PredictionRequest):
     """
     预测干预效果
     
@@ -98,7 +504,7 @@ def predict_intervention_effect(request: PredictionRequest):
     """
     try:
         # 1. 获取用户完整数据
-        user_data = db.get_complete_user_data(request.user_id)
+        user_data = await adb.get_complete_user_data(request.user_id)
         
         if not user_data:
             raise HTTPException(status_code=404, detail=f"用户ID {request.user_id} 不存在")
@@ -106,44 +512,13 @@ def predict_intervention_effect(request: PredictionRequest):
         if not user_data.get('pre_score'):
             raise HTTPException(status_code=400, detail="该用户没有前测数据")
         
-        # 2. 调用AI进行评估
-        ai_result = ai_service.evaluate_intervention(user_data)
+        # 2. 调用AI评估并保存预测记录（同一用户同一特征的并发请求共享一次评估）
+        ai_result, _ = await prediction_flights.do(
+            _prediction_key(user_data), lambda: _evaluate_and_save(user_data)
+        )
         
         # 3. 组装返回数据
-        response_data = {
-            "user_info": {
-                "user_id": user_data['user_id'],
-                "name": user_data['name'],
-                "age": user_data['age'],
-                "gender": "男" if user_data['gender'] == 1 else "女"
-            },
-            "assessment_data": {
-                "pre_score": user_data['pre_score'],
-                "post_score": user_data.get('post_score'),
-                "has_post_test": user_data.get('post_score') is not None
-            },
-            "learning_data": {
-                "weeks_completed": user_data['weeks_completed'],
-                "total_checkins": user_data['total_checkins'],
-                "checkin_rate": user_data['checkin_rate'],
-                "avg_study_duration": user_data['avg_study_duration'],
-                "completion_rate": user_data['completion_rate']
-            },
-            "ai_prediction": ai_result
-        }
-        
-        # 4. 保存预测记录
-        try:
-            db.save_prediction(request.user_id, {
-                "pre_score": user_data['pre_score'],
-                "predicted_score": ai_result['predicted_score_most_likely'],
-                "predicted_improvement": ai_result['predicted_improvement'],
-                "confidence": ai_result['confidence'],
-                "risk_level": ai_result['risk_level'],
-                "suggestions": ai_result['suggestions']
-            })
-        except Exception as e:
-            print(f"保存预测记录失败: {e}")
+        response_data = _build_prediction_data(user_data, ai_result)
         
         return PredictionResponse(
             success=True,
@@ -159,36 +534,341 @@ def predict_intervention_effect(request: PredictionRequest):
         raise HTTPException(status_code=500, detail=f"预测失败: {str(e)}")
 
 
+@app.post("/api/predict/stream")
+async def predict_stream(request: PredictionRequest):
+    """
+    流式预测干预效果（Server-Sent Events）
+    
+    事件顺序：
+        preview   用户数据 + 本地模型/规则引擎的即时预测（只依赖数据库）
+        delta     AI输出的原始文本片段
+        analysis  AI分析文本的增量内容
+        result    最终预测结果（结构同 /api/predict 的 data），此时已保存预测记录
+    """
+    user_data = await adb.get_complete_user_data(request.user_id)
+    
+    if not user_data:
+        raise HTTPException(status_code=404, detail=f"用户ID {request.user_id} 不存在")
+    
+    if not user_data.get('pre_score'):
+        raise HTTPException(status_code=400, detail="该用户没有前测数据")
+    
+    async def events():
+        preview = ai_service.preview_evaluation(user_data)
+        yield _sse("preview", _build_prediction_data(user_data, preview))
+        
+        started = time.perf_counter()
+        try:
+            async for event, payload in ai_service.stream_evaluation(user_data):
+                if event != "result":
+                    yield _sse(event, {"text": payload})
+                    continue
+                
+                await _save_prediction(user_data, payload, (time.perf_counter() - started) * 1000)
+                yield _sse("result", _build_prediction_data(user_data, payload))
+        except Exception as e:
+            print(f"流式预测失败: {e}")
+            print(traceback.format_exc())
+            yield _sse("error", {"message": f"预测失败: {str(e)}"})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/api/predict/batch")
+async def predict_batch(request: BatchPredictionRequest):
+    """
+    批量预测干预效果
+    
+    指定 user_ids，或按 status/project_id 筛选整批用户：
+    批量读取特征 → 有界并发调用AI评估 → 一条多行INSERT保存
+    AI_BATCH_SIZE > 1 时每次AI请求合并多个用户（不与 /api/predict 的同用户请求合并）
+    
+    Returns:
+        每个用户的结果及各阶段耗时
+    """
+    try:
+        started = time.perf_counter()
+        
+        # 1. 确定用户范围
+        if request.user_ids:
+            user_ids = list(dict.fromkeys(request.user_ids))
+            if request.limit is not None:
+                user_ids = user_ids[:request.limit]
+        else:
+            user_ids = await adb.get_user_ids(request.status, request.project_id, request.limit)
+        
+        if len(user_ids) > PREDICT_BATCH_MAX_USERS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"单次最多预测 {PREDICT_BATCH_MAX_USERS} 个用户，当前 {len(user_ids)} 个"
+            )
+        
+        # 2. 批量获取用户特征
+        users = await adb.get_complete_user_data_many(user_ids)
+        fetched = time.perf_counter()
+        
+        results: Dict[int, dict] = {}
+        to_evaluate = []
+        for user_id in user_ids:
+            user_data = users.get(user_id)
+            if not user_data:
+                results[user_id] = {"user_id": user_id, "success": False, "message": "用户不存在"}
+            elif not user_data.get('pre_score'):
+                results[user_id] = {"user_id": user_id, "success": False, "message": "该用户没有前测数据"}
+            else:
+                to_evaluate.append(user_data)
+        
+        # 3. 有界并发评估
+        semaphore = asyncio.Semaphore(PREDICT_BATCH_CONCURRENCY)
+        
+        async def evaluate_group(group):
+            # 多用户合并请求，每组的结果由本批保存
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    group_results = await ai_service.evaluate_batch_async(group)
+                except Exception as e:
+                    return [(u, None, False, e, None) for u in group]
+                latency_ms = (time.perf_counter() - started) * 1000
+                return [(u, group_results[u['user_id']], True, None, latency_ms) for u in group]
+        
+        async def evaluate(user_data):
+            # 与 /api/predict 的同用户请求合并；由 leader 负责保存，本批只保存自己评估的结果
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    ai_result, leader = await prediction_flights.do(
+                        _prediction_key(user_data),
+                        lambda: ai_service.evaluate_intervention_async(user_data)
+                    )
+                except Exception as e:
+                    return user_data, None, False, e, None
+                return user_data, ai_result, leader, None, (time.perf_counter() - started) * 1000
+        
+        if ai_service.batch_size > 1:
+            size = ai_service.batch_size
+            outcomes = [
+                outcome
+                for group_outcomes in await asyncio.gather(*(
+                    evaluate_group(to_evaluate[i:i + size]) for i in range(0, len(to_evaluate), size)
+                ))
+                for outcome in group_outcomes
+            ]
+        else:
+            outcomes = await asyncio.gather(*(evaluate(u) for u in to_evaluate))
+        
+        records = []
+        for user_data, ai_result, leader, error, latency_ms in outcomes:
+            user_id = user_data['user_id']
+            if error is not None:
+                results[user_id] = {"user_id": user_id, "success": False, "message": f"预测失败: {error}"}
+                continue
+            results[user_id] = {
+                "user_id": user_id,
+                "success": True,
+                "data": _build_prediction_data(user_data, ai_result)
+            }
+            if leader:
+                records.append({"user_id": user_id, **_prediction_record(user_data, ai_result, latency_ms)})
+        evaluated = time.perf_counter()
+        
+        # 4. 多行INSERT保存预测记录
+        saved = 0
+        try:
+            saved = await adb.save_predictions_many(records)
+        except Exception as e:
+            print(f"批量保存预测记录失败: {e}")
+        if saved:
+            await _predictions_saved(records)
+        finished = time.perf_counter()
+        
+        succeeded = sum(1 for r in results.values() if r['success'])
+        return {
+            "success": True,
+            "data": [results[user_id] for user_id in user_ids],
+            "total": len(user_ids),
+            "succeeded": succeeded,
+            "failed": len(user_ids) - succeeded,
+            "saved": saved,
+            "timing": {
+                "fetch_ms": round((fetched - started) * 1000, 1),
+                "evaluate_ms": round((evaluated - fetched) * 1000, 1),
+                "save_ms": round((finished - evaluated) * 1000, 1),
+                "total_ms": round((finished - started) * 1000, 1)
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"批量预测失败: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"批量预测失败: {str(e)}")
+
+
+@app.post("/api/jobs")
+async def create_job(request: JobRequest):
+    """
+    创建批量预测后台任务（立即返回任务ID，进度通过 GET /api/jobs/{job_id} 查询）
+    
+    用户范围在创建时确定：指定 user_ids，或按 status/project_id 筛选。
+    """
+    if request.user_ids:
+        user_ids = list(dict.fromkeys(request.user_ids))
+        if request.limit is not None:
+            user_ids = user_ids[:request.limit]
+    else:
+        user_ids = await adb.get_user_ids(request.status, request.project_id, request.limit)
+    
+    if not user_ids:
+        raise HTTPException(status_code=400, detail="没有符合条件的用户")
+    if len(user_ids) > JOB_MAX_USERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"单个任务最多 {JOB_MAX_USERS} 个用户，当前 {len(user_ids)} 个"
+        )
+    
+    job = await run_in_threadpool(job_store.create_job, user_ids, request.dict(exclude={"user_ids"}))
+    job_runner.notify()
+    return {"success": True, "data": job}
+
+
+@app.get("/api/jobs")
+def list_jobs(
+    status: Optional[str] = Query(None, description="queued / running / completed / failed / cancelled"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """最近的预测任务"""
+    return {"success": True, "data": job_store.list_jobs(status, limit)}
+
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str, errors: int = Query(100, ge=0, le=1000, description="返回的失败/降级用户数")):
+    """任务状态、进度及失败/降级的用户"""
+    job = job_store.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"任务 {job_id} 不存在")
+    job["errors"] = job_store.job_errors(job_id, errors) if errors else []
+    return {"success": True, "data": job}
+
+
+@app.post("/api/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    """取消任务（运行中的任务处理完当前一批后停止，已保存的预测保留）"""
+    job = job_store.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"任务 {job_id} 不存在")
+    if job["status"] in JOB_FINISHED:
+        raise HTTPException(status_code=409, detail=f"任务已结束（{job['status']}）")
+    return {"success": True, "data": job_store.request_cancel(job_id)}
+
+
+@app.get("/api/ai/providers")
+def get_ai_providers():
+    """大模型提供商、路由策略及各提供商的延迟和熔断状态"""
+    return {"success": True, "data": ai_service.router.stats()}
+
+
+@app.get("/api/ai/prompts")
+def get_ai_prompts():
+    """当前评估 prompt 模板、输出 token 预算及各模板的 token 估算"""
+    return {"success": True, "data": {**ai_service.prompt_stats(), "batch_size": ai_service.batch_size}}
+
+
+@app.get("/api/model-performance")
+def get_model_performance():
+    """
+    各模型版本及各层级（llm / local_model / rules）的预测表现
+    
+    读取 model_performance 中预先累加的汇总：准确率和平均误差只统计后测录入前做出的预测，
+    平均耗时为评估耗时（不含排队和写库）。
+    """
+    try:
+        rows = db.get_model_performance()
+    except Exception as e:
+        print(f"获取模型表现失败: {e}")
+        raise HTTPException(status_code=500, detail=f"获取模型表现失败: {str(e)}")
+    return {
+        "success": True,
+        "data": {
+            "versions": rows,
+            "tiers": summarize_tiers(rows),
+            "backfill": accuracy_backfill.stats()
+        }
+    }
+
+
+@app.post("/api/ai/routing")
+def update_ai_routing(request: RoutingRequest):
+    """
+    运行时切换大模型路由（无需重启）
+    
+    可切换首选提供商、路由策略、对冲开关，或启用/停用某个提供商。
+    切换首选提供商后预测缓存按新提供商重新计算。
+    """
+    try:
+        ai_service.router.configure(
+            primary=request.primary, strategy=request.strategy,
+            hedge=request.hedge, enabled=request.enabled
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "data": ai_service.router.stats()}
+
+
 @app.get("/api/users", response_model=UserListResponse)
-def get_users(status: Optional[int] = None):
+async def get_users(
+    request: Request,
+    status: Optional[int] = None,
+    project_id: Optional[int] = None,
+    risk: Optional[str] = Query(None, pattern="^(low|medium|high)$"),
+    min_improvement: Optional[float] = None,
+    max_improvement: Optional[float] = None,
+    sort: str = Query("user_id", pattern="^(user_id|pre_score|post_score|improvement|improvement_rate)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    after_user_id: Optional[int] = None,
+    after_value: Optional[float] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    format: str = Query("objects", pattern="^(objects|columns)$", description="objects=每个用户一个对象；columns=列式")
+):
     """
     获取用户列表
     
     Args:
         status: 用户状态（0=进行中, 1=已完成）
+        project_id: 项目ID
+        risk: 最近一次预测的风险等级（low/medium/high）
+        min_improvement / max_improvement: 实际改善分数范围
+        sort / order: 排序字段和方向
+        after_user_id / after_value: 分页游标，取上一页返回的 next_cursor
+        limit: 每页条数，不传则返回全部
+        format: columns 时返回 {columns, rows}，不含可由 gender/status 得到的 gender_text/status_text
     
     Returns:
-        用户列表
+        用户列表（带 ETag，If-None-Match 相同时返回 304）；直接序列化返回，不再逐条经过 response_model 校验
     """
     try:
-        users = db.get_all_users_summary(status)
-        
-        # 处理数据
-        for user in users:
-            user['gender_text'] = "男" if user['gender'] == 1 else "女"
-            user['status_text'] = "已完成" if user['status'] == 1 else "进行中"
-            
-            # 如果有前测和后测，计算改善
-            if user.get('pre_score') and user.get('post_score'):
-                improvement = float(user['pre_score']) - float(user['post_score'])
-                improvement_rate = (improvement / float(user['pre_score'])) * 100
-                user['improvement'] = round(improvement, 1)
-                user['improvement_rate'] = round(improvement_rate, 1)
+        page, etag = await _read_user_list(dict(
+            status=status, project_id=project_id, risk_level=risk,
+            min_improvement=min_improvement, max_improvement=max_improvement,
+            sort=sort, order=order, after_user_id=after_user_id, after_value=after_value,
+            limit=limit
+        ))
+        if format == "columns":
+            etag = f'{etag[:-1]}-columns"'
+        not_modified = _not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
         
-        return UserListResponse(
-            success=True,
-            data=users,
-            total=len(users)
+        users = page["data"]
+        body = columnar(users, USER_LIST_COLUMNS) if format == "columns" else {"data": users}
+        return FastJSONResponse(
+            {"success": True, **body, "total": len(users), "next_cursor": page["next_cursor"]},
+            headers=_etag_headers(etag)
         )
         
     except Exception as e:
@@ -197,13 +877,18 @@ def get_users(status: Optional[int] = None):
 
 
 @app.get("/api/user/{user_id}")
-def get_user_detail(user_id: int):
-    """获取用户详情"""
+async def get_user_detail(user_id: int, request: Request, response: Response):
+    """获取用户详情（带 ETag，If-None-Match 相同时返回 304）"""
     try:
-        user_data = db.get_complete_user_data(user_id)
+        cached = await _read_user(user_id)
         
-        if not user_data:
+        if not cached:
             raise HTTPException(status_code=404, detail="用户不存在")
+        user_data, etag = cached
+        not_modified = _not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+        response.headers.update(_etag_headers(etag))
         
         return {
             "success": True,
@@ -217,7 +902,7 @@ def get_user_detail(user_id: int):
 
 
 @app.post("/api/users", response_model=CreateUserResponse)
-def create_user(request: CreateUserRequest):
+async def create_user(request: CreateUserRequest):
     """
     创建新用户（演示配置功能）
     
@@ -270,10 +955,11 @@ def create_user(request: CreateUserRequest):
             user_data['learning_logs'] = learning_logs
         
         # 创建用户
-        user_id = db.create_user(user_data)
+        user_id = await adb.create_user(user_data)
+        await _invalidate_users_async()
         
         # 获取完整用户数据
-        complete_data = db.get_complete_user_data(user_id)
+        complete_data = await adb.get_complete_user_data(user_id)
         
         return CreateUserResponse(
             success=True,
@@ -287,6 +973,63 @@ def create_user(request: CreateUserRequest):
         raise HTTPException(status_code=500, detail=f"创建用户失败: {str(e)}")
 
 
+@app.post("/api/users/import")
+async def import_users(request: Request, format: Optional[str] = Query(None, description="json / ndjson / csv，默认按 Content-Type 判断")):
+    """
+    批量导入用户
+    
+    请求体为 JSON 数组、NDJSON 或 CSV（首行为表头），边上传边写入。
+    每行字段同创建用户：name, age, gender, project_id, scale_name, pre_score, post_score；
+    JSON/NDJSON 行可带 learning_logs 数组（week_number, checkin_count, study_duration, completed, log_date）。
+    
+    Returns:
+        导入行数、逐行错误、新用户ID及吞吐统计
+    """
+    user_ids: List[int] = []
+    
+    def write(rows):
+        ids, errors = db.import_users(rows)
+        user_ids.extend(ids)
+        if ids:
+            _invalidate_users()
+        return len(ids), errors
+    
+    try:
+        result = await _run_import(request, format, validate_user_row, write)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"批量导入用户失败: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"批量导入用户失败: {str(e)}")
+    result["user_ids"] = user_ids
+    return result
+
+
+@app.post("/api/learning-logs/import")
+async def import_learning_logs(request: Request, format: Optional[str] = Query(None, description="json / ndjson / csv，默认按 Content-Type 判断")):
+    """
+    批量导入学习记录
+    
+    每行字段：user_id, week_number, checkin_count, study_duration, completed, log_date。
+    用户不存在或同一用户同一周重复的行记为错误，其它行正常写入。
+    """
+    def write(rows):
+        count, errors = db.import_learning_logs(rows)
+        if count:
+            _invalidate_users([row['user_id'] for _, row in rows])
+        return count, errors
+    
+    try:
+        return await _run_import(request, format, validate_log_row, write)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"批量导入学习记录失败: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"批量导入学习记录失败: {str(e)}")
+
+
 if __name__ == "__main__":
     import uvicorn
     from config import HOST, PORT
@@ -0,0 +1,251 @@
+"""
+运行指标 - 分阶段耗时直方图和计数器，以 Prometheus 文本格式导出（GET /metrics）
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# 默认耗时分桶（秒）：覆盖毫秒级数据库查询到数十秒的大模型调用
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}，实际 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """瞬时值（抓取时设置）"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """累积分桶直方图"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[Tuple[str, ...], list] = {}  # key → [各桶计数, 总和, 次数]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """记录 with 代码块的耗时（出现异常也记录）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self, **labels) -> Dict:
+        """某组标签的次数、总和与平均值（秒）"""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            if series is None:
+                return {"count": 0, "sum": 0.0, "avg": None}
+            return {"count": series[2], "sum": series[1], "avg": series[1] / series[2]}
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ========== 指标定义 ==========
+
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP请求耗时", ("method", "route", "status")
+))
+
+DB_QUERY_SECONDS = registry.register(Histogram(
+    "db_query_duration_seconds", "数据库操作耗时（含借出连接）", ("query",)
+))
+
+PREDICTION_STAGE_SECONDS = registry.register(Histogram(
+    "prediction_stage_duration_seconds",
+    "预测各阶段耗时：prompt_build / llm_call / llm_stream / parse / local_model / rules",
+    ("stage",)
+))
+
+LLM_REQUESTS = registry.register(Counter(
+    "llm_requests_total", "大模型调用次数（outcome: success / error / timeout / short_circuit（熔断跳过））",
+    ("provider", "model", "outcome")
+))
+
+LLM_TOKENS = registry.register(Counter(
+    "llm_tokens_total", "大模型 token 用量（type: prompt / completion / cached（命中提供商 prompt 缓存的输入））",
+    ("provider", "model", "type")
+))
+
+LLM_PROMPT_TOKENS = registry.register(Counter(
+    "llm_prompt_tokens_estimated_total", "发送的 prompt 估算 token 数（part: prefix 共享前缀 / user 用户数据）",
+    ("version", "part")
+))
+
+LLM_HEDGES = registry.register(Counter(
+    "llm_hedged_requests_total", "对冲请求（outcome: fired 已发出 / won 先于原请求返回）", ("outcome",)
+))
+
+LLM_BATCHES = registry.register(Counter(
+    "llm_batch_requests_total",
+    "多用户合并的AI请求（outcome: complete 全部解析 / partial 部分缺失 / failed 无法解析，后两者拆分重试 / "
+    "error 调用失败，降级）",
+    ("outcome",)
+))
+
+LLM_PARSE = registry.register(Counter(
+    "llm_parse_total",
+    "大模型输出解析方式（method: json 直接解析 / extracted 去掉围栏或说明文字 / repaired 修复格式 / "
+    "invalid 核心字段缺失或校验失败 / truncated 输出被截断 / text 无JSON，后三者降级为规则解析）",
+    ("method",)
+))
+
+LLM_OUTPUT_FIXES = registry.register(Counter(
+    "llm_output_fixes_total", "大模型输出中缺失或不一致、已按规则补齐的字段", ("field",)
+))
+
+PREDICTION_RESULTS = registry.register(Counter(
+    "prediction_results_total",
+    "预测结果来源（source: llm（含缓存命中）/ local_model / rules）",
+    ("source",)
+))
+
+# 连接池、缓存等组件的 stats()，抓取时更新
+COMPONENT_STATS = registry.register(Gauge(
+    "component_stats", "各组件 stats() 中的数值字段", ("component", "field")
+))
+
+
+def set_component_stats(component: str, stats: Optional[Dict]):
+    for field, value in (stats or {}).items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            COMPONENT_STATS.set(value, component=component, field=field)
+
+
+def record_llm_usage(provider: str, model: str, usage) -> None:
+    """累计 completion 响应中的 token 用量（部分提供商不返回 usage）"""
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, provider=provider, model=model, type="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, provider=provider, model=model, type="completion")
+    # OpenAI 兼容接口为 prompt_tokens_details.cached_tokens，DeepSeek 为 prompt_cache_hit_tokens
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None) or getattr(usage, "prompt_cache_hit_tokens", None)
+    if cached_tokens:
+        LLM_TOKENS.inc(cached_tokens, provider=provider, model=model, type="cached")
@@ -0,0 +1,182 @@
+"""
+预测准确度回填与模型表现 - 用户有了后测后，回填其未回填预测的实际分数和准确度，并累加到 model_performance
+
+回填由新录入的后测驱动（backfill_progress 记录高水位），不扫描 predictions。
+服务内按 PERFORMANCE_BACKFILL_INTERVAL 定期回填（AccuracyBackfill），也可手动执行：
+回填：python model_performance.py backfill [--batch-size 500] [--from-start]
+重算：python model_performance.py rebuild
+查看：python model_performance.py show
+"""
+import argparse
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from cache import CACHED_SUFFIX
+from database import db
+
+# model_version 前缀 → 预测层级
+TIERS = (("llm-", "llm"), ("local-", "local_model"), ("rules-", "rules"))
+
+
+def model_tier(model_version: str) -> str:
+    """预测层级：llm / local_model / rules，预测缓存命中的结果为 cached，旧版本记录为 legacy"""
+    if (model_version or "").endswith(CACHED_SUFFIX):
+        return "cached"
+    for prefix, tier in TIERS:
+        if (model_version or "").startswith(prefix):
+            return tier
+    return "legacy"
+
+
+def summarize_tiers(rows: List[Dict]) -> List[Dict]:
+    """按层级合计各模型版本的运行汇总（准确率、平均误差、平均耗时按合计重新计算）"""
+    totals: Dict[str, Dict] = {}
+    for row in rows:
+        tier = model_tier(row['model_version'])
+        total = totals.setdefault(tier, {
+            "tier": tier, "versions": [], "total_predictions": 0, "evaluated_predictions": 0,
+            "accurate_predictions": 0, "total_error": 0.0, "latency_samples": 0, "total_latency_ms": 0,
+        })
+        total["versions"].append(row['model_version'])
+        for key in ("total_predictions", "evaluated_predictions", "accurate_predictions",
+                    "total_error", "latency_samples", "total_latency_ms"):
+            total[key] += row[key] or 0
+
+    result = []
+    for total in totals.values():
+        evaluated, samples = total["evaluated_predictions"], total["latency_samples"]
+        result.append({
+            **total,
+            "total_error": round(total["total_error"], 2),
+            "accuracy_rate": round(total["accurate_predictions"] * 100 / evaluated, 2) if evaluated else None,
+            "avg_error": round(total["total_error"] / evaluated, 2) if evaluated else None,
+            "avg_latency_ms": round(total["total_latency_ms"] / samples, 1) if samples else None,
+        })
+    return result
+
+
+class AccuracyBackfill:
+    """
+    定期回填预测准确度
+
+    start() 后每 interval 秒在线程池中执行一次 database.backfill_accuracy（interval <= 0 时不运行），
+    stop() 在 FastAPI lifespan 关闭时调用。
+    """
+
+    def __init__(self, database, interval: float = 300, batch_size: int = 500):
+        self.database = database
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+
+        self.runs = 0
+        self.failures = 0
+        self.post_tests = 0
+        self.filled = 0
+        self.counted = 0
+        self.last_run_at: Optional[float] = None
+        self.last_run_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        if self.interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def run_once(self) -> Dict:
+        """执行一次回填，返回 backfill_accuracy 的汇总"""
+        started = time.perf_counter()
+        try:
+            summary = await run_in_threadpool(self.database.backfill_accuracy, self.batch_size)
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+                self.last_error = str(e)
+            raise
+        with self._lock:
+            self.runs += 1
+            self.post_tests += summary["post_tests"]
+            self.filled += summary["filled"]
+            self.counted += summary["counted"]
+            self.last_run_at = time.time()
+            self.last_run_ms = round((time.perf_counter() - started) * 1000, 1)
+            self.last_error = None
+        return summary
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"预测准确度回填失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "running": self._task is not None,
+                "interval": self.interval,
+                "runs": self.runs,
+                "failures": self.failures,
+                "post_tests": self.post_tests,
+                "filled": self.filled,
+                "counted": self.counted,
+                "last_run_at": self.last_run_at,
+                "last_run_ms": self.last_run_ms,
+                "last_error": self.last_error,
+            }
+
+
+def show():
+    rows = db.get_model_performance()
+    if not rows:
+        print("model_performance 中没有记录")
+        return
+    print(f"{'模型版本':<28}{'预测数':>8}{'已验证':>8}{'准确率%':>9}{'平均误差':>9}{'平均耗时ms':>11}")
+    for row in rows + [dict(t, model_version=f"[{t['tier']}]") for t in summarize_tiers(rows)]:
+        print(f"{row['model_version']:<28}{row['total_predictions']:>8}{row['evaluated_predictions']:>8}"
+              f"{_fmt(row['accuracy_rate']):>9}{_fmt(row['avg_error']):>9}{_fmt(row['avg_latency_ms']):>11}")
+
+
+def _fmt(value) -> str:
+    return "-" if value is None else f"{value:g}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="预测准确度回填与模型表现")
+    sub = parser.add_subparsers(dest="command")
+    backfill_parser = sub.add_parser("backfill", help="回填新录入后测的用户的预测")
+    backfill_parser.add_argument("--batch-size", type=int, default=500, help="每个事务处理的后测数")
+    backfill_parser.add_argument("--from-start", action="store_true",
+                                 help="从头检查所有后测（补回高水位之后才提交的后测或其后写入的预测）")
+    sub.add_parser("rebuild", help="由 predictions 全量重算 model_performance")
+    sub.add_parser("show", help="查看各模型版本和层级的表现")
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        started = time.perf_counter()
+        summary = db.backfill_accuracy(args.batch_size, from_start=args.from_start)
+        print(f"✓ 处理 {summary['post_tests']} 条后测，回填 {summary['filled']} 条预测（计入模型表现 {summary['counted']} 条，"
+              f"{summary['batches']} 个事务），耗时 {(time.perf_counter() - started) * 1000:.0f}ms")
+    elif args.command == "rebuild":
+        started = time.perf_counter()
+        count = db.rebuild_model_performance()
+        print(f"✓ 模型表现重算完成：{count} 个模型版本，耗时 {(time.perf_counter() - started) * 1000:.0f}ms")
+    elif args.command == "show":
+        show()
+    else:
+        parser.print_help()
@@ -0,0 +1,231 @@
+"""
+评估 prompt 模板 - 带版本的模板、固定的共享前缀、token 估算和输出预算
+
+v2 起所有用户共用的内容（角色、参考标准、返回格式）放在 system 消息中且逐字节不变，
+只有最后一条 user 消息包含用户数据，以便提供商的 prompt 缓存（前缀缓存）命中。
+这类模板还支持批量评估：一次请求包含多个用户的数据，说明部分只发送一次。
+修改任一模板的文字时需同时升级其版本号，使旧的预测缓存失效。
+"""
+import re
+from string import Formatter
+from typing import Dict, List, Optional
+
+# token 估算：中文（含全角标点）约 1 字 1 token，其余约 4 字符 1 token（偏保守）
+_CJK = re.compile(r'[　-〿一-鿿＀-￯]')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数（不依赖具体模型的分词器）"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _fields(user_data: Dict) -> Dict:
+    return {
+        "name": user_data.get('name', '未知'),
+        "age": user_data.get('age', '未知'),
+        "gender": '男' if user_data.get('gender') == 1 else '女',
+        "pre_score": user_data.get('pre_score', 0),
+        "post_score": user_data.get('post_score', '未完成'),
+        "weeks_completed": user_data.get('weeks_completed', 0),
+        "total_checkins": user_data.get('total_checkins', 0),
+        "checkin_rate": f"{user_data.get('checkin_rate', 0) * 100:.0f}",
+        "avg_study_duration": user_data.get('avg_study_duration', 0),
+        "completion_rate": f"{user_data.get('completion_rate', 0) * 100:.0f}",
+    }
+
+
+class PromptTemplate:
+    """
+    一个版本的评估 prompt
+
+    Args:
+        version: 版本号（写入 predictions.model_version，参与缓存指纹）
+        system: system 消息（固定前缀，不含用户数据）
+        user: user 消息模板（str.format，字段见 _fields）
+        max_tokens: 默认输出 token 预算
+        item_tokens: 批量评估时每个用户的输出 token 预算，0 表示不支持批量（说明随用户数据发送）
+        description: 说明
+    """
+
+    def __init__(self, version: str, system: str, user: str, max_tokens: int, item_tokens: int = 0,
+                 description: str = ""):
+        self.version = version
+        self.system = system
+        self.user = user
+        self.max_tokens = max_tokens
+        self.item_tokens = item_tokens
+        self.description = description
+        self.prefix_tokens = estimate_tokens(system)
+        self.batch_system = system + _BATCH_NOTE if item_tokens else None
+        self.batch_prefix_tokens = estimate_tokens(self.batch_system or "")
+        # user 消息用到的用户字段（预测缓存指纹只计算这些字段，如 v2-compact 不含姓名）
+        self.feature_keys = tuple(sorted({field for _, field, _, _ in Formatter().parse(user) if field}))
+
+    def render(self, user_data: Dict) -> str:
+        """user 消息"""
+        return self.user.format(**_fields(user_data))
+
+    def messages(self, user_data: Dict) -> List[Dict]:
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.render(user_data)},
+        ]
+
+    def batch_messages(self, users: List[Dict]) -> List[Dict]:
+        """多个用户合并为一次请求（每个用户以"用户ID："开头）"""
+        if self.batch_system is None:
+            raise ValueError(f"prompt {self.version} 不支持批量评估")
+        blocks = [f"用户ID：{user_data['user_id']}\n{self.render(user_data)}" for user_data in users]
+        return [
+            {"role": "system", "content": self.batch_system},
+            {"role": "user", "content": "\n\n".join(blocks)},
+        ]
+
+    def estimate(self, user_data: Dict) -> Dict:
+        """该用户的 prompt token 估算：共享前缀 / 用户部分 / 输出预算"""
+        return {
+            "prefix_tokens": self.prefix_tokens,
+            "user_tokens": estimate_tokens(self.render(user_data)),
+            "max_tokens": self.max_tokens,
+        }
+
+    def stats(self, sample: Dict) -> Dict:
+        return {
+            "version": self.version,
+            "description": self.description,
+            **self.estimate(sample),
+            "batch_item_tokens": self.item_tokens or None,
+        }
+
+
+_BATCH_NOTE = (
+    '\n\n本次同时评估多个用户，每个用户的数据以"用户ID："开头。'
+    '为每个用户按上述格式各给出一个对象并加上 "user_id" 字段，整体只返回：{"results": [...]}'
+)
+
+_ROLE = "你是一位资深的心理干预效果评估专家，拥有20年临床经验。"
+
+_USER_DATA = """【用户信息】
+- 姓名：{name}
+- 年龄：{age}岁
+- 性别：{gender}
+
+【测评数据】
+- 前测焦虑分数：{pre_score}分（GAD-7量表，满分21分）
+- 后测分数：{post_score}
+
+【学习数据】
+- 已完成周数：{weeks_completed}周（共8周）
+- 总打卡次数：{total_checkins}次
+- 打卡率：{checkin_rate}%
+- 平均学习时长：{avg_study_duration}分钟/次
+- 周完成率：{completion_rate}%"""
+
+_REFERENCE = """【参考标准】
+- GAD-7评分：0-4分轻度，5-9分轻中度，10-14分中度，15-21分重度
+- 打卡率：>80%良好，60-80%一般，<60%较差
+- 临床显著改善：分数下降≥25%或下降≥5分"""
+
+_SCHEMA = """请提供专业评估，以JSON格式返回：
+{
+    "predicted_score_min": 预测后测最低分,
+    "predicted_score_max": 预测后测最高分,
+    "predicted_score_most_likely": 最可能的后测分数,
+    "predicted_improvement": 预测改善幅度,
+    "predicted_improvement_rate": 预测改善率（百分比）,
+    "current_progress": "当前进展评价（良好/一般/较差）",
+    "risk_level": "风险等级（low/medium/high）",
+    "confidence": 置信度（0-1之间的小数）,
+    "suggestions": [
+        "具体建议1",
+        "具体建议2",
+        "具体建议3"
+    ],
+    "analysis": "详细分析说明（100-200字）"
+}"""
+
+_NOTES = """注意：
+1. 如果已有后测数据，就评估实际效果
+2. 如果没有后测数据，根据前3周数据预测
+3. 打卡率越高，预测改善效果越好
+4. 前测分数越高，改善空间越大
+5. 给出的建议要具体可操作"""
+
+
+def _escape(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+# v1：原始模板，所有内容都在 user 消息中（每次调用的前缀都不同）
+V1 = PromptTemplate(
+    "v1",
+    system=_ROLE,
+    user=("\n请作为心理干预效果评估专家，分析以下用户的干预情况：\n\n"
+          f"{_USER_DATA}\n\n{_REFERENCE}\n\n{_escape(_SCHEMA)}\n\n{_NOTES}\n"),
+    max_tokens=1500,
+    description="原始模板，用户数据在前"
+)
+
+# v2：与 v1 内容相同，固定部分移入 system 作为共享前缀
+V2 = PromptTemplate(
+    "v2",
+    system=f"{_ROLE}请分析用户的心理干预情况。\n\n{_REFERENCE}\n\n{_SCHEMA}\n\n{_NOTES}",
+    user=_USER_DATA,
+    max_tokens=1000,
+    item_tokens=600,
+    description="完整说明，共享前缀"
+)
+
+# v2-compact：精简说明和返回格式，不发送姓名，分析限 100 字
+V2_COMPACT = PromptTemplate(
+    "v2-compact",
+    system=(
+        f"{_ROLE}根据用户的GAD-7焦虑测评和8周学习打卡数据评估干预效果。\n"
+        "参考：GAD-7 0-4轻度/5-9轻中度/10-14中度/15-21重度；打卡率>80%良好，60-80%一般，<60%较差；"
+        "下降≥25%或≥5分为临床显著改善。已有后测则评估实际效果，否则按打卡情况预测；"
+        "打卡率越高、前测越高，改善越大。\n"
+        "只返回JSON："
+        '{"predicted_score_min":数,"predicted_score_max":数,"predicted_score_most_likely":数,'
+        '"predicted_improvement":数,"predicted_improvement_rate":百分数,'
+        '"current_progress":"良好|一般|较差","risk_level":"low|medium|high","confidence":0-1,'
+        '"suggestions":["3条具体可操作的建议"],"analysis":"100字内分析"}'
+    ),
+    user=("前测焦虑分数：{pre_score}；后测：{post_score}；{age}岁{gender}；"
+          "完成{weeks_completed}/8周，打卡{total_checkins}次（{checkin_rate}%），"
+          "{avg_study_duration}分钟/次，周完成率{completion_rate}%"),
+    max_tokens=600,
+    item_tokens=300,
+    description="精简说明，共享前缀"
+)
+
+TEMPLATES: Dict[str, PromptTemplate] = {t.version: t for t in (V1, V2, V2_COMPACT)}
+
+# 估算 token 用的示例用户
+SAMPLE_USER = {
+    "name": "张明", "age": 16, "gender": 1, "pre_score": 15.5, "post_score": None,
+    "weeks_completed": 6, "total_checkins": 15, "checkin_rate": 0.83,
+    "avg_study_duration": 38.5, "completion_rate": 0.83,
+}
+
+
+def get_template(version: str) -> PromptTemplate:
+    """按版本号取模板（未知版本抛出 ValueError）"""
+    try:
+        return TEMPLATES[version]
+    except KeyError:
+        raise ValueError(f"未知的 prompt 版本: {version}（可选 {', '.join(TEMPLATES)}）")
+
+
+def output_budget(template: PromptTemplate, max_tokens: Optional[int] = None) -> int:
+    """输出 token 预算：配置值（>0 时）优先，否则为模板默认值"""
+    return max_tokens if max_tokens else template.max_tokens
+
+
+def template_stats(active: Optional[str] = None, sample: Optional[Dict] = None) -> List[Dict]:
+    """各模板的 token 估算（按示例用户）"""
+    sample = sample or SAMPLE_USER
+    return [{**t.stats(sample), "active": t.version == active} for t in TEMPLATES.values()]
+
@@ -0,0 +1,180 @@
+"""
+响应编码：orjson JSON 响应、列式列表输出、gzip/brotli 压缩中间件
+
+orjson、brotli 未安装时分别退回标准库 json、只用 gzip。
+"""
+import gzip
+import json
+import threading
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 不压缩的类型：SSE 需要逐条送达，图片等已压缩
+SKIP_CONTENT_TYPES = ("text/event-stream", "image/", "application/zip", "application/gzip")
+
+# 超过该大小的响应体在线程池中压缩，不阻塞事件循环
+THREADPOOL_MIN_SIZE = 64 * 1024
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"无法序列化类型: {type(value).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    """orjson 序列化的 JSON 响应（Decimal 转为浮点数，输出与 JSONResponse 相同）"""
+
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                          default=_default).encode("utf-8")
+
+
+def columnar(rows: List[Dict], columns: Sequence[str]) -> Dict:
+    """列式输出：列名只出现一次，每行为按 columns 顺序排列的值"""
+    return {"columns": list(columns), "rows": [[row.get(c) for c in columns] for row in rows]}
+
+
+class CompressionStats:
+    """压缩统计（中间件由 Starlette 延迟创建，统计对象由外部传入以便在健康检查中读取）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = {"br": 0, "gzip": 0}
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def record(self, encoding: Optional[str], size_in: int, size_out: int):
+        with self._lock:
+            if encoding is None:
+                self.skipped += 1
+                return
+            self.responses[encoding] += 1
+            self.bytes_in += size_in
+            self.bytes_out += size_out
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "brotli_available": brotli is not None,
+                "gzip_responses": self.responses["gzip"],
+                "br_responses": self.responses["br"],
+                "skipped": self.skipped,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else 0,
+            }
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """按 Accept-Encoding 选择 br（需安装 brotli）或 gzip，q=0 视为不接受"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q=") and params[2:] in ("0", "0.0", "0.00", "0.000"):
+            continue
+        accepted.add(name.strip())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """
+    gzip/brotli 响应压缩
+
+    与 Starlette GZipMiddleware 的区别：只压缩带 Content-Length 的完整响应（经 http 中间件转发时会分块，先缓冲再压缩），
+    没有 Content-Length 的流式响应（SSE 等）原样透传，不会把事件缓冲在压缩器中；
+    已设置 Content-Encoding、小于 minimum_size 或类型在 SKIP_CONTENT_TYPES 中的不压缩。
+    压缩后强 ETag 改为弱 ETag（与 nginx gzip 一致），If-None-Match 仍可匹配。
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1000, gzip_level: int = 6,
+                 brotli_quality: int = 4, stats: Optional[CompressionStats] = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.stats = stats or CompressionStats()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        chunks: Optional[List[bytes]] = None  # 缓冲中的响应体；None 表示原样透传
+
+        async def send_compressed(message: Message):
+            nonlocal start, chunks
+            if message["type"] == "http.response.start":
+                start = message
+                headers = Headers(raw=start["headers"])
+                content_type = headers.get("content-type", "")
+                length = headers.get("content-length")
+                if ("content-encoding" not in headers and length is not None and length.isdigit()
+                        and not any(content_type.startswith(t) for t in SKIP_CONTENT_TYPES)):
+                    chunks = []
+                else:
+                    await send(start)
+                return
+            if message["type"] != "http.response.body" or chunks is None:
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if len(body) < self.minimum_size:
+                self.stats.record(None, len(body), len(body))
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            if len(body) >= THREADPOOL_MIN_SIZE:
+                compressed = await run_in_threadpool(self._compress, encoding, body)
+            else:
+                compressed = self._compress(encoding, body)
+            self.stats.record(encoding, len(body), len(compressed))
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
@@ -0,0 +1,342 @@
+"""
+向量化规则引擎 - 批量计算规则预测（降级方案 / 全量重算）
+
+与 AIService._fallback_evaluation / _parse_text_response 使用同一套规则：
+数值部分一次性对整列数组计算，分析文本和建议只在取出某一行时才生成。
+"""
+import random
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 规则模式
+MODE_FALLBACK = "fallback"  # 对应 _fallback_evaluation（含基线分数调整）
+MODE_TEXT = "text"          # 对应 _parse_text_response（AI未返回JSON时）
+
+CONFIDENCE = {MODE_FALLBACK: 0.70, MODE_TEXT: 0.75}
+
+# 写入 predictions.model_version 的版本（由 AIService 填写；修改规则时升级）
+VERSIONS = {MODE_FALLBACK: "rules-v1", MODE_TEXT: "rules-text-v1"}
+
+# 打卡率分档（较差/一般/良好）对应的改善率、进展、风险
+_TIER_RATES = np.array([0.15, 0.30, 0.45])
+_TIER_PROGRESS = np.array(["较差", "一般", "良好"], dtype=object)
+_TIER_RISK = np.array(["high", "medium", "low"], dtype=object)
+
+# 与 user_data.get(key, default) 的默认值一致
+DEFAULT_PRE_SCORE = 15
+DEFAULT_CHECKIN_RATE = 0.5
+DEFAULT_WEEKS = 0
+
+
+def tier_labels(checkin_rate: float) -> Tuple[str, str]:
+    """打卡率分档对应的 (进展评价, 风险等级)"""
+    tier = 2 if checkin_rate >= 0.8 else 1 if checkin_rate >= 0.6 else 0
+    return str(_TIER_PROGRESS[tier]), str(_TIER_RISK[tier])
+
+
+# ========== 文本生成（标量与向量路径共用） ==========
+
+def fallback_suggestions(checkin_rate: float, weeks: int) -> List[str]:
+    """规则引擎建议"""
+    suggestions = []
+    if checkin_rate < 0.7:
+        suggestions.append("建议提高打卡率，增加学习频率")
+    else:
+        suggestions.append("保持当前良好的学习习惯")
+
+    if weeks >= 3:
+        suggestions.append("建议第6周进行中期测评")
+
+    suggestions.append("可以尝试增加正念呼吸练习")
+    return suggestions
+
+
+def fallback_analysis(pre_score: float, checkin_rate: float, predicted_score: float,
+                      improvement: float, improvement_rate: float, risk: str) -> str:
+    """规则引擎详细分析"""
+    analysis_parts = []
+
+    # 基线评估
+    if pre_score >= 15:
+        analysis_parts.append(f"该用户前测GAD-7分数为{pre_score:.1f}分，属于重度焦虑水平，具有较大的改善空间。")
+    elif pre_score >= 10:
+        analysis_parts.append(f"该用户前测GAD-7分数为{pre_score:.1f}分，属于中度焦虑水平。")
+    else:
+        analysis_parts.append(f"该用户前测GAD-7分数为{pre_score:.1f}分，属于轻度焦虑水平。")
+
+    # 学习表现评估
+    if checkin_rate >= 0.8:
+        analysis_parts.append(f"用户打卡率达到{checkin_rate*100:.0f}%，学习积极性非常高，这对干预效果有显著的正向影响。")
+    elif checkin_rate >= 0.6:
+        analysis_parts.append(f"用户打卡率为{checkin_rate*100:.0f}%，学习参与度一般，建议加强督促和激励。")
+    else:
+        analysis_parts.append(f"用户打卡率仅为{checkin_rate*100:.0f}%，学习参与度较低，这可能影响最终效果，建议及时干预。")
+
+    # 预测结果
+    analysis_parts.append(f"基于当前数据，预测8周后GAD-7分数约为{predicted_score:.1f}分，预期改善幅度约{improvement:.1f}分（改善率{improvement_rate*100:.0f}%）。")
+
+    # 风险评估
+    if risk == "low":
+        analysis_parts.append("目前干预进展顺利，风险等级较低，建议继续保持。")
+    elif risk == "medium":
+        analysis_parts.append("目前存在一定风险，建议关注用户状态，适时调整干预方案。")
+    else:
+        analysis_parts.append("目前风险等级较高，建议立即加强干预力度或考虑其他辅助措施。")
+
+    return " ".join(analysis_parts)
+
+
+def text_suggestions(checkin_rate: float) -> List[str]:
+    """文本解析路径的建议"""
+    return [
+        "保持当前学习频率" if checkin_rate >= 0.7 else "建议提高打卡率",
+        "建议第6周进行中期评估",
+        "可以增加放松训练"
+    ]
+
+
+def text_analysis(pre_score: float, checkin_rate: float, predicted_score: float,
+                  improvement_rate: float, risk: str) -> str:
+    """文本解析路径的分析"""
+    analysis_parts = []
+    analysis_parts.append(f"该用户前测GAD-7分数为{pre_score:.1f}分，")
+
+    if checkin_rate >= 0.8:
+        analysis_parts.append(f"打卡率达到{checkin_rate*100:.0f}%，学习表现优秀。")
+    elif checkin_rate >= 0.6:
+        analysis_parts.append(f"打卡率为{checkin_rate*100:.0f}%，学习参与度一般。")
+    else:
+        analysis_parts.append(f"打卡率仅{checkin_rate*100:.0f}%，需要加强督促。")
+
+    analysis_parts.append(f"基于当前数据，预测8周后分数约为{predicted_score:.1f}分，改善率约{improvement_rate*100:.0f}%。")
+
+    if risk == "low":
+        analysis_parts.append("干预进展顺利，建议保持当前方案。")
+    elif risk == "medium":
+        analysis_parts.append("存在一定风险，建议关注用户状态。")
+    else:
+        analysis_parts.append("风险较高，建议及时调整干预强度。")
+
+    return "".join(analysis_parts)
+
+
+# ========== 向量化计算 ==========
+
+class RuleBatch:
+    """
+    一批用户的规则预测结果
+
+    数值列在构造时已全部算好；row(i) 才生成第 i 行的分析文本和建议。
+    """
+
+    def __init__(self, mode: str, pre_score: np.ndarray, checkin_rate: np.ndarray,
+                 weeks_completed: np.ndarray, improvement_rate: np.ndarray,
+                 improvement: np.ndarray, predicted_score: np.ndarray,
+                 risk_level: np.ndarray, progress: np.ndarray):
+        self.mode = mode
+        self.pre_score = pre_score
+        self.checkin_rate = checkin_rate
+        self.weeks_completed = weeks_completed
+        self.improvement_rate = improvement_rate
+        self.improvement = improvement
+        self.predicted_score = predicted_score
+        self.risk_level = risk_level
+        self.progress = progress
+        self.confidence = CONFIDENCE[mode]
+
+    def __len__(self) -> int:
+        return len(self.pre_score)
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """结果列（已按输出口径四舍五入），用于批量写库或统计"""
+        return {
+            "predicted_score_min": round_half(self.predicted_score - 1, 1),
+            "predicted_score_max": round_half(self.predicted_score + 1, 1),
+            "predicted_score_most_likely": round_half(self.predicted_score, 1),
+            "predicted_improvement": round_half(self.improvement, 1),
+            "predicted_improvement_rate": round_half(self.improvement_rate * 100, 1),
+            "current_progress": self.progress,
+            "risk_level": self.risk_level,
+            "confidence": np.full(len(self), self.confidence),
+        }
+
+    def row(self, i: int, with_text: bool = True) -> Dict:
+        """第 i 行的完整结果，结构与标量规则函数返回值相同"""
+        pre_score = float(self.pre_score[i])
+        checkin_rate = float(self.checkin_rate[i])
+        improvement_rate = float(self.improvement_rate[i])
+        improvement = float(self.improvement[i])
+        predicted_score = float(self.predicted_score[i])
+        risk = str(self.risk_level[i])
+
+        result = {
+            "predicted_score_min": round(predicted_score - 1, 1),
+            "predicted_score_max": round(predicted_score + 1, 1),
+            "predicted_score_most_likely": round(predicted_score, 1),
+            "predicted_improvement": round(improvement, 1),
+            "predicted_improvement_rate": round(improvement_rate * 100, 1),
+            "current_progress": str(self.progress[i]),
+            "risk_level": risk,
+            "confidence": self.confidence,
+        }
+        if not with_text:
+            return result
+
+        if self.mode == MODE_FALLBACK:
+            result["suggestions"] = fallback_suggestions(checkin_rate, int(self.weeks_completed[i]))
+            result["analysis"] = fallback_analysis(
+                pre_score, checkin_rate, predicted_score, improvement, improvement_rate, risk
+            )
+        else:
+            result["suggestions"] = text_suggestions(checkin_rate)
+            result["analysis"] = text_analysis(pre_score, checkin_rate, predicted_score, improvement_rate, risk)
+        return result
+
+    def rows(self, indices: Optional[Iterable[int]] = None, with_text: bool = True):
+        """逐行生成结果（只对实际需要渲染的行生成文本）"""
+        for i in (range(len(self)) if indices is None else indices):
+            yield self.row(i, with_text=with_text)
+
+
+def evaluate_columns(pre_score: Sequence[float], checkin_rate: Sequence[float],
+                     weeks_completed: Sequence[int], mode: str = MODE_FALLBACK) -> RuleBatch:
+    """
+    对整列数据执行规则预测
+
+    Args:
+        pre_score: 前测分数
+        checkin_rate: 打卡率（0-1）
+        weeks_completed: 已完成周数
+        mode: MODE_FALLBACK 或 MODE_TEXT
+    """
+    if mode not in CONFIDENCE:
+        raise ValueError(f"未知的规则模式: {mode}")
+
+    pre = np.asarray(pre_score, dtype=np.float64)
+    rate = np.asarray(checkin_rate, dtype=np.float64)
+    weeks = np.asarray(weeks_completed, dtype=np.int64)
+
+    # 规则1：打卡率影响
+    high = rate >= 0.8
+    mid = ~high & (rate >= 0.6)
+    tier = high * 2 + mid  # 0=较差, 1=一般, 2=良好
+    improvement_rate = _TIER_RATES[tier]
+    progress = _TIER_PROGRESS[tier]
+    risk = _TIER_RISK[tier]
+
+    # 规则2：基线分数影响（仅降级方案）
+    if mode == MODE_FALLBACK:
+        improvement_rate = np.where(
+            pre >= 15, improvement_rate * 1.1,
+            np.where(pre <= 8, improvement_rate * 0.8, improvement_rate)
+        )
+
+    # 计算预测
+    improvement = pre * improvement_rate
+    predicted = np.maximum(3, pre - improvement)
+
+    return RuleBatch(mode, pre, rate, weeks, improvement_rate, improvement, predicted, risk, progress)
+
+
+def evaluate_records(records: Sequence[Dict], mode: str = MODE_FALLBACK) -> RuleBatch:
+    """由用户数据字典列表构建列并执行规则预测（缺失字段取与标量规则相同的默认值）"""
+    return evaluate_columns(
+        [_value(r, 'pre_score', DEFAULT_PRE_SCORE) for r in records],
+        [_value(r, 'checkin_rate', DEFAULT_CHECKIN_RATE) for r in records],
+        [_value(r, 'weeks_completed', DEFAULT_WEEKS) for r in records],
+        mode
+    )
+
+
+def round_half(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """
+    与内置 round() 结果一致的向量化四舍五入
+
+    np.round 先乘 10^n 再取整，在恰好落在 .5 附近的值上可能与 round() 不同，
+    这些少数值单独用 round() 计算。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scale = 10.0 ** ndigits
+    scaled = values * scale
+    result = np.round(scaled) / scale
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_tie):
+        result[i] = round(float(values[i]), ndigits)
+    return result
+
+
+def _value(record: Dict, key: str, default):
+    value = record.get(key, default)
+    return default if value is None else value
+
+
+# ========== 校验与基准 ==========
+
+def random_records(n: int, seed: int = 0) -> List[Dict]:
+    """生成随机用户特征（含阈值边界值）"""
+    rng = random.Random(seed)
+    edge_rates = [0.0, 0.59, 0.6, 0.69, 0.7, 0.79, 0.8, 1.0]
+    edge_scores = [0.0, 3.0, 7.5, 8.0, 8.5, 10.0, 14.5, 15.0, 21.0]
+    records = []
+    for _ in range(n):
+        records.append({
+            'pre_score': rng.choice(edge_scores) if rng.random() < 0.2 else round(rng.uniform(0, 21), 1),
+            'checkin_rate': rng.choice(edge_rates) if rng.random() < 0.2 else round(rng.uniform(0, 1.2), 2),
+            'weeks_completed': rng.randint(0, 8),
+        })
+    return records
+
+
+def check_parity(n: int = 10000, seed: int = 0) -> int:
+    """逐行对比向量化结果与 AIService 标量规则，返回不一致的行数"""
+    from ai_service import ai_service
+
+    records = random_records(n, seed)
+    mismatches = 0
+    for mode, scalar in ((MODE_FALLBACK, lambda r: ai_service._fallback_evaluation(r)),
+                         (MODE_TEXT, lambda r: ai_service._parse_text_response("", r))):
+        batch = evaluate_records(records, mode)
+        columns = batch.columns()
+        for i, record in enumerate(records):
+            expected = scalar(record)
+            actual = batch.row(i)
+            column_row = {key: columns[key][i] for key in columns}
+            if actual != expected or any(column_row[key] != expected[key] for key in column_row):
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"[{mode}] 第{i}行不一致: {record}\n  标量: {expected}\n  向量: {actual}")
+    return mismatches
+
+
+def benchmark(n: int = 100000):
+    """对比标量规则与向量化规则的耗时"""
+    from ai_service import ai_service
+
+    records = random_records(n)
+    started = time.perf_counter()
+    for record in records:
+        ai_service._fallback_evaluation(record)
+    scalar_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = evaluate_records(records)
+    batch.columns()
+    vector_s = time.perf_counter() - started
+
+    print(f"{n} 行：标量 {scalar_s * 1000:.1f}ms，向量化（不含文本）{vector_s * 1000:.1f}ms，"
+          f"加速 {scalar_s / vector_s:.1f}x")
+
+
+if __name__ == "__main__":
+    # python rule_engine.py parity [行数]  |  python rule_engine.py bench [行数]
+    command = sys.argv[1] if len(sys.argv) > 1 else "parity"
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else (10000 if command == "parity" else 100000)
+    if command == "bench":
+        benchmark(rows)
+    else:
+        failed = check_parity(rows)
+        print(f"一致性校验：{rows} 行 × 2 种模式，不一致 {failed} 行")
+        sys.exit(1 if failed else 0)
@@ -0,0 +1,69 @@
+"""
+请求合并（single-flight）- 同一键的并发调用只执行一次，其余调用等待并共享结果
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """
+    asyncio 版 single-flight
+
+    第一个调用者（leader）启动任务，同一键的后续调用者等待同一个任务。
+    任务独立于调用者运行：leader 的请求被取消（如客户端断开）不会影响其他等待者。
+    任务结束即移除，之后的调用重新执行（结果缓存由调用方负责）。
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._loop = None
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        执行 fn 或等待同键的在途调用
+
+        Returns:
+            (结果, 是否为 leader)；任务抛出的异常会传给所有等待者
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 事件循环变化（如测试中多次启动）时旧任务已不可用
+            self._tasks = {}
+            self._loop = loop
+
+        task = self._tasks.get(key)
+        leader = task is None
+        if leader:
+            task = loop.create_task(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        with self._lock:
+            if leader:
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        return await asyncio.shield(task), leader
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if task.cancelled() or task.exception() is not None:
+            with self._lock:
+                self.errors += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.leaders + self.coalesced
+            return {
+                "in_flight": len(self._tasks),
+                "executed": self.leaders,
+                "coalesced": self.coalesced,
+                "coalesce_rate": round(self.coalesced / total, 4) if total else 0,
+                "errors": self.errors,
+            }
@@ -0,0 +1,5 @@
+"""后端模块按脚本方式导入（from ai_service import ...），测试时把 backend/ 加入导入路径"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,161 @@
+"""
+异步数据库接口一致性测试 - 两种驱动执行同一组检查，确认方法和返回值一致
+
+- pymysql：ThreadedDatabase 包装 benchmarks/sqlite_db.py 的 SQLite 替身（每个测试一个临时库）
+- aiomysql：AsyncDatabase 连接 DB_CONFIG 配置的 MySQL；未安装 aiomysql 或连不上 MySQL 时跳过。
+  会创建一个测试用户并写入预测记录，结束后删除用户、预测记录及其在 model_performance 中的汇总（需要可写的数据库）。
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+from async_database import DRIVERS, AsyncDatabase, ThreadedDatabase
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "benchmarks"))
+
+CONTRACT_USER = {
+    'name': '接口检查', 'age': 30, 'gender': 2, 'pre_score': 12, 'post_score': 7, 'scale_name': 'GAD-7',
+    'learning_logs': [
+        {'week_number': 1, 'checkin_count': 3, 'study_duration': 30, 'completed': True, 'log_date': '2024-01-01'},
+        {'week_number': 2, 'checkin_count': 2, 'study_duration': 40, 'completed': False, 'log_date': '2024-01-08'},
+    ],
+}
+
+# 由 CONTRACT_USER 得到的用户数据
+EXPECTED_USER = {
+    'name': '接口检查', 'age': 30, 'gender': 2, 'status': 1, 'pre_score': 12.0, 'post_score': 7.0,
+    'weeks_completed': 2, 'total_checkins': 5, 'checkin_rate': 0.83, 'avg_study_duration': 35.0,
+    'completion_rate': 0.5,
+}
+
+# 测试专用的模型版本，清理时删除其 model_performance 汇总
+CONTRACT_MODEL_VERSION = 'contract-check'
+
+CONTRACT_PREDICTION = {
+    'pre_score': 12.0, 'predicted_score': 8.0, 'predicted_improvement': 4.0, 'confidence': 0.8,
+    'risk_level': 'low', 'suggestions': ['保持打卡'], 'model_version': CONTRACT_MODEL_VERSION,
+}
+
+# 连接 MySQL 的最长等待（连不上时跳过 aiomysql，而不是卡住）
+CONNECT_TIMEOUT = 5
+
+
+class ContractDatabase:
+    """一个驱动的被测实例：自带事件循环（aiomysql 连接池绑定在创建它的循环上）和已创建的测试用户"""
+
+    def __init__(self, database):
+        self.database = database
+        self.loop = asyncio.new_event_loop()
+        self.user_id = None
+
+    def run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+
+def _sqlite_database(path: str):
+    from sqlite_db import SQLiteDatabase
+
+    database = SQLiteDatabase(path)
+    database.seed(users=0)
+    return ThreadedDatabase(database)
+
+
+async def _start_mysql(database: AsyncDatabase):
+    try:
+        import aiomysql  # noqa: F401
+    except ImportError:
+        pytest.skip("未安装 aiomysql")
+    try:
+        await asyncio.wait_for(database.start(), timeout=CONNECT_TIMEOUT)
+    except Exception as e:
+        pytest.skip(f"无法连接 MySQL: {e!r}")
+
+
+async def _delete_user(database: AsyncDatabase, user_id: int):
+    """删除测试用户及其关联记录，以及保存预测时累加的 model_performance 汇总"""
+    async with database.connection() as conn:
+        async with conn.cursor() as cursor:
+            for table in ('predictions', 'learning_logs', 'assessments', 'user_learning_stats', 'users'):
+                await cursor.execute(f"DELETE FROM {table} WHERE user_id = %s", (user_id,))
+            await cursor.execute("DELETE FROM model_performance WHERE model_version = %s", (CONTRACT_MODEL_VERSION,))
+            await conn.commit()
+
+
+@pytest.fixture(params=DRIVERS)
+def contract_db(request, tmp_path):
+    if request.param == "aiomysql":
+        contract = ContractDatabase(AsyncDatabase())
+        try:
+            contract.run(_start_mysql(contract.database))
+        except BaseException:
+            contract.loop.close()
+            raise
+    else:
+        contract = ContractDatabase(_sqlite_database(str(tmp_path / "contract.db")))
+        contract.run(contract.database.start())
+    try:
+        contract.user_id = contract.run(contract.database.create_user(CONTRACT_USER))
+        yield contract
+    finally:
+        if contract.user_id is not None and request.param == "aiomysql":
+            contract.run(_delete_user(contract.database, contract.user_id))
+        contract.run(contract.database.close())
+        contract.loop.close()
+
+
+def test_create_user_returns_id(contract_db):
+    assert isinstance(contract_db.user_id, int) and contract_db.user_id > 0
+
+
+def test_get_complete_user_data(contract_db):
+    user = contract_db.run(contract_db.database.get_complete_user_data(contract_db.user_id))
+    assert user is not None and user['user_id'] == contract_db.user_id
+    assert {key: user.get(key) for key in EXPECTED_USER} == EXPECTED_USER
+    for key in ('pre_score', 'post_score', 'avg_study_duration'):
+        assert isinstance(user[key], float), key
+    assert contract_db.run(contract_db.database.get_complete_user_data(contract_db.user_id + 1000000)) is None
+
+
+def test_get_complete_user_data_many(contract_db):
+    database, user_id = contract_db.database, contract_db.user_id
+    missing = user_id + 1000000
+    many = contract_db.run(database.get_complete_user_data_many([user_id, str(user_id), missing]))
+    # 去重且跳过不存在的用户，结果与单用户查询一致
+    assert list(many) == [user_id]
+    assert many[user_id] == contract_db.run(database.get_complete_user_data(user_id))
+    assert contract_db.run(database.get_complete_user_data_many([])) == {}
+
+
+def test_save_predictions(contract_db):
+    database, user_id = contract_db.database, contract_db.user_id
+    prediction_id = contract_db.run(database.save_prediction(user_id, CONTRACT_PREDICTION))
+    assert isinstance(prediction_id, int) and prediction_id > 0
+    latest = {**CONTRACT_PREDICTION, 'user_id': user_id, 'risk_level': 'medium'}
+    assert contract_db.run(database.save_predictions_many([dict(latest, risk_level='high'), latest])) == 2
+    assert contract_db.run(database.save_predictions_many([])) == 0
+
+
+def test_get_user_ids(contract_db):
+    database, user_id = contract_db.database, contract_db.user_id
+    ids = contract_db.run(database.get_user_ids())
+    assert user_id in ids
+    assert ids == sorted(ids)
+    completed = contract_db.run(database.get_user_ids(status=1))
+    assert user_id in completed and set(completed) <= set(ids)
+    assert contract_db.run(database.get_user_ids(status=1, limit=1)) == completed[:1]
+
+
+def test_get_all_users_summary(contract_db):
+    database, user_id = contract_db.database, contract_db.user_id
+    latest = {**CONTRACT_PREDICTION, 'user_id': user_id, 'risk_level': 'medium'}
+    contract_db.run(database.save_predictions_many([dict(latest, risk_level='high'), latest]))
+
+    rows = contract_db.run(database.get_all_users_summary(after_user_id=user_id - 1, limit=1))
+    assert [row['user_id'] for row in rows] == [user_id]
+    assert rows[0]['improvement'] == 5.0 and isinstance(rows[0]['improvement'], float)
+    # 风险等级取最近一次预测
+    assert rows[0]['risk_level'] == 'medium'
+    filtered = contract_db.run(database.get_all_users_summary(risk_level='medium', sort='improvement', order='desc'))
+    assert user_id in [row['user_id'] for row in filtered]
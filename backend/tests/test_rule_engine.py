@@ -0,0 +1,31 @@
+"""向量化规则引擎与 AIService 标量规则的一致性（不需要数据库和大模型）"""
+import random
+
+import pytest
+
+from ai_service import ai_service
+from rule_engine import MODE_FALLBACK, MODE_TEXT, check_parity, evaluate_records, round_half
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_parity_random_records(seed):
+    # 随机特征中含打卡率、分数的阈值边界值
+    assert check_parity(2000, seed=seed) == 0
+
+
+@pytest.mark.parametrize("mode, scalar", [
+    (MODE_FALLBACK, lambda r: ai_service._fallback_evaluation(r)),
+    (MODE_TEXT, lambda r: ai_service._parse_text_response("", r)),
+])
+def test_parity_missing_fields(mode, scalar):
+    # 缺失字段与 user_data.get(key, default) 的默认值一致
+    records = [{}, {'pre_score': 12}, {'checkin_rate': 0.8}, {'weeks_completed': 6}]
+    batch = evaluate_records(records, mode)
+    for i, record in enumerate(records):
+        assert batch.row(i) == scalar(record)
+
+
+def test_round_half_matches_round():
+    rng = random.Random(0)
+    values = [rng.uniform(0, 30) for _ in range(2000)] + [0.05, 0.15, 0.25, 2.675, 10.45, 14.55]
+    assert list(round_half(values, 1)) == [round(v, 1) for v in values]
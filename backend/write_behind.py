@@ -0,0 +1,150 @@
+"""
+预测记录异步写入（write-behind）- 请求只把记录放入队列，后台任务按条数/时间阈值合并为多行 INSERT
+"""
+import asyncio
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+class WriteBehindBuffer:
+    """
+    预测记录写入缓冲
+
+    - submit() 不阻塞：未启动、已停止或队列已满时返回 False，由调用方直接写入（队列满即背压）
+    - 后台任务攒满 batch_size 条或等待 flush_interval 秒后，await database.save_predictions_many 写入一批
+      （database 为 async_database 中的异步接口）
+    - 每批写入成功后 await on_saved(批记录)（如失效用户列表缓存），回调出错只记录日志，不影响写入
+    - 写入失败按指数退避重试 max_retries 次，仍失败则丢弃该批并计数
+    - stop() 停止接收并排空队列（FastAPI lifespan 关闭时调用）
+    """
+
+    def __init__(self, database, batch_size: int = 200, flush_interval: float = 0.5,
+                 max_queue: int = 10000, max_retries: int = 3, retry_backoff: float = 0.5,
+                 on_saved: Optional[Callable[[List[Dict]], Awaitable[None]]] = None):
+        self.database = database
+        self.on_saved = on_saved
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._accepting = False
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.rejected = 0   # 未进入队列、由调用方直接写入
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.last_flush_ms: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._accepting
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        self._accepting = True
+
+    async def stop(self, timeout: float = 10.0):
+        """停止接收并等待队列中的记录写入（最多 timeout 秒）"""
+        if self._task is None:
+            return
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠ 预测记录写入超时，{self._queue.qsize()} 条未写入")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def submit(self, record: Dict) -> bool:
+        """放入写入队列，返回 False 表示调用方需直接写入"""
+        if not self._accepting:
+            with self._lock:
+                self.rejected += 1
+            return False
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0 or not self._accepting:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                # 意外错误只丢弃这一批，后台任务继续处理队列
+                print(f"预测记录写入任务出错（{len(batch)} 条）: {e}")
+                with self._lock:
+                    self.dropped += len(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[Dict]):
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                await self.database.save_predictions_many(batch)
+            except Exception as e:
+                print(f"批量写入预测记录失败（{len(batch)} 条，第 {attempt + 1} 次）: {e}")
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+                continue
+            with self._lock:
+                self.written += len(batch)
+                self.batches += 1
+                self.last_flush_ms = round((time.perf_counter() - started) * 1000, 1)
+            if self.on_saved is not None:
+                try:
+                    await self.on_saved(batch)
+                except Exception as e:
+                    print(f"预测记录写入后回调失败（{len(batch)} 条）: {e}")
+            return
+        with self._lock:
+            self.dropped += len(batch)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "running": self._accepting,
+                "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+                "max_queue": self.max_queue,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "written": self.written,
+                "batches": self.batches,
+                "avg_batch": round(self.written / self.batches, 1) if self.batches else 0,
+                "dropped": self.dropped,
+                "last_flush_ms": self.last_flush_ms,
+            }
@@ -0,0 +1,210 @@
+"""
+接口压测：/api/predict、/api/predict/batch、/api/users、/api/user/{id} 的吞吐量与 p50/p95/p99 延迟
+
+不依赖 MySQL 和真实大模型：数据库替换为 SQLite 替身（由 mock_data.sql 扩充到 N 个用户），
+大模型替换为本地模拟接口（fake_llm.py，可配置延迟、抖动和错误率）。
+
+用法（在项目根目录）：
+    python benchmarks/bench_api.py                                   # 默认参数
+    python benchmarks/bench_api.py --users 5000 --requests 2000 --concurrency 64
+    python benchmarks/bench_api.py --llm-latency 0.8 --llm-error-rate 0.02
+    python benchmarks/bench_api.py --scenarios predict_batch --ai-batch-size 8 --prompt-version v2-compact   # 多用户合并的AI请求
+    python benchmarks/bench_api.py --output results/api.json --baseline results/api_base.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+from common import add_backend_path, compare, latency_summary, run_meta, save_results
+
+HERE = Path(__file__).resolve().parent
+SCENARIOS = ("predict", "predict_batch", "users", "user_detail")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url: str, timeout: float = 15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"服务未在 {timeout} 秒内启动: {url}")
+
+
+def start_fake_llm(args) -> subprocess.Popen:
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, str(HERE / "fake_llm.py"), "--port", str(port),
+        "--latency", str(args.llm_latency), "--jitter", str(args.llm_jitter),
+        "--error-rate", str(args.llm_error_rate), "--seed", str(args.seed),
+        "--drop-rate", str(args.llm_drop_rate),
+    ])
+    process.base_url = f"http://127.0.0.1:{port}"
+    wait_until_up(f"{process.base_url}/stats")
+    return process
+
+
+def configure_env(args, llm_url: str):
+    """config 在导入时读取环境变量，须在导入任何后端模块（含 sqlite_db）之前调用"""
+    os.environ.update({
+        "AI_PROVIDER": "openai",
+        "AI_BASE_URL": f"{llm_url}/v1",
+        "AI_API_KEY": "bench",
+        "AI_MODEL": "fake-model",
+        "AI_MAX_RETRIES": "0",
+        "AI_BATCH_SIZE": str(args.ai_batch_size),
+        "AI_PROMPT_VERSION": args.prompt_version,
+        "PREDICTION_CACHE_ENABLED": "1" if args.cache else "0",
+        "USER_CACHE_ENABLED": "1" if args.user_cache else "0",
+        "LOCAL_MODEL_MODE": "off",
+        "PERFORMANCE_BACKFILL_INTERVAL": "0",
+        "JOB_DB_PATH": str(Path(tempfile.mkdtemp(prefix="bench_jobs_")) / "jobs.db"),
+    })
+
+
+def start_app(database):
+    """在后台线程中运行 uvicorn（main.db / main.adb 替换为 SQLite 替身）"""
+    add_backend_path()
+    import uvicorn
+    import main
+    from async_database import ThreadedDatabase
+
+    main.db = database
+    main.adb = ThreadedDatabase(database)
+    main.job_runner.database = database
+    main.prediction_writer.database = main.adb
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{port}"
+    wait_until_up(f"{base_url}/")
+    return server, thread, base_url
+
+
+async def run_scenario(base_url: str, scenario: str, args, user_ids):
+    rng = random.Random(args.seed)
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for _ in range(args.requests):
+        if scenario == "predict_batch":
+            queue.put_nowait(rng.sample(user_ids, min(args.batch_users, len(user_ids))))
+        else:
+            queue.put_nowait(rng.choice(user_ids))
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors
+        while True:
+            try:
+                target = queue.get_nowait()  # 用户ID（predict_batch 为用户ID列表）
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                if scenario == "predict":
+                    response = await client.post("/api/predict", json={"user_id": target})
+                elif scenario == "predict_batch":
+                    response = await client.post("/api/predict/batch", json={"user_ids": target})
+                elif scenario == "users":
+                    response = await client.get("/api/users", params={
+                        "limit": args.page_size, "after_user_id": max(0, target - args.page_size)
+                    })
+                else:
+                    response = await client.get(f"/api/user/{target}")
+                ok = response.status_code == 200 and response.json().get("success")
+            except httpx.HTTPError:
+                ok = False
+            latencies.append((time.perf_counter() - started) * 1000)
+            if not ok:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": args.requests,
+        "errors": errors,
+        "throughput_rps": round(args.requests / elapsed, 2),
+        "latency_ms": latency_summary(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="接口压测（SQLite 数据库替身 + 模拟大模型）")
+    parser.add_argument("--users", type=int, default=1000, help="扩充后的用户数")
+    parser.add_argument("--requests", type=int, default=500, help="每个场景的请求数")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--page-size", type=int, default=50, help="/api/users 每页条数")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="模拟大模型平均响应时间（秒）")
+    parser.add_argument("--llm-jitter", type=float, default=0.2)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-drop-rate", type=float, default=0.0, help="合并请求中模拟大模型漏掉用户的比例")
+    parser.add_argument("--batch-users", type=int, default=20, help="predict_batch 每个请求的用户数")
+    parser.add_argument("--ai-batch-size", type=int, default=1, help="AI_BATCH_SIZE：每次AI请求合并的用户数")
+    parser.add_argument("--prompt-version", default="v1", choices=("v1", "v2", "v2-compact"),
+                        help="AI_PROMPT_VERSION（合并请求需 v2 或 v2-compact）")
+    parser.add_argument("--cache", action="store_true", help="开启预测缓存（默认关闭，测量完整预测路径）")
+    parser.add_argument("--user-cache", action="store_true", help="开启用户详情/列表读缓存（默认关闭，测量数据库查询路径）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="结果 JSON 保存路径")
+    parser.add_argument("--baseline", help="与之对比的历史结果 JSON")
+    args = parser.parse_args()
+
+    llm = start_fake_llm(args)
+    try:
+        configure_env(args, llm.base_url)
+        from sqlite_db import SQLiteDatabase
+        database = SQLiteDatabase()
+        seeded = database.seed(args.users, seed=args.seed)
+        print(f"SQLite 替身：{seeded}")
+        user_ids = database.get_user_ids()
+        # 没有前测的用户预测接口直接返回 400，不计入预测场景
+        features = database.get_complete_user_data_many(user_ids)
+        predictable_ids = [uid for uid, data in features.items() if data.get('pre_score')]
+
+        server, thread, base_url = start_app(database)
+        results = {}
+        for scenario in args.scenarios:
+            print(f"→ {scenario} ...")
+            ids = predictable_ids if scenario.startswith("predict") else user_ids
+            results[scenario] = asyncio.run(run_scenario(base_url, scenario, args, ids))
+        llm_stats = httpx.get(f"{llm.base_url}/stats").json()
+        server.should_exit = True
+        thread.join(timeout=10)
+    finally:
+        llm.terminate()
+        llm.wait(timeout=10)
+
+    output = {
+        "meta": run_meta({**vars(args), "seeded": seeded, "llm": llm_stats}),
+        "results": results,
+    }
+    save_results(output, args.output)
+    if args.baseline:
+        compare(output, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+本地模型 vs 规则引擎 vs 大模型：延迟与平均绝对误差（MAE）对比
+
+用法（在项目根目录）：
+    python benchmarks/bench_local_model.py                      # 从数据库读取已完成用户
+    python benchmarks/bench_local_model.py --data users.json    # 离线数据（用户数据字典列表）
+    python benchmarks/bench_local_model.py --llm-samples 20     # 额外抽样调用大模型
+
+已完成用户按 k 折划分，本地模型只在训练折上训练、在测试折上评估；
+调用大模型时会去掉 post_score，避免把答案写进 prompt。
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from local_model import LocalModel  # noqa: E402
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(latencies_ms, errors):
+    return {
+        "samples": len(errors),
+        "mae": round(statistics.mean(errors), 3) if errors else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies_ms, 50), 4) if latencies_ms else None,
+            "p95": round(percentile(latencies_ms, 95), 4) if latencies_ms else None,
+            "mean": round(statistics.mean(latencies_ms), 4) if latencies_ms else None,
+        },
+    }
+
+
+def bench_local(users, folds, alpha):
+    """k 折：训练折训练，测试折逐个预测（与在线单次调用一致）"""
+    order = list(range(len(users)))
+    random.Random(0).shuffle(order)
+    latencies, errors, confidences = [], [], []
+    for k in range(folds):
+        test = [users[i] for i in order[k::folds]]
+        train = [users[i] for j, i in enumerate(order) if j % folds != k]
+        model = LocalModel.fit(train, alpha=alpha, folds=0)
+        for user in test:
+            started = time.perf_counter()
+            result = model.predict(user)
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors.append(abs(result["predicted_score_most_likely"] - user["post_score"]))
+            confidences.append(result["confidence"])
+    summary = summarize(latencies, errors)
+    summary["mean_confidence"] = round(statistics.mean(confidences), 3)
+    return summary
+
+
+def bench_rules(users):
+    from ai_service import ai_service
+
+    latencies, errors = [], []
+    for user in users:
+        started = time.perf_counter()
+        result = ai_service._fallback_evaluation(user)
+        latencies.append((time.perf_counter() - started) * 1000)
+        errors.append(abs(result["predicted_score_most_likely"] - user["post_score"]))
+    return summarize(latencies, errors)
+
+
+def bench_llm(users, samples):
+    from ai_service import ai_service
+
+    ai_service.cache = None
+    latencies, errors, failures = [], [], 0
+    for user in random.Random(1).sample(users, min(samples, len(users))):
+        blind = {**user, "post_score": None}
+        started = time.perf_counter()
+        result = ai_service._evaluate_llm(blind)
+        elapsed = (time.perf_counter() - started) * 1000
+        try:
+            errors.append(abs(float(result["predicted_score_most_likely"]) - user["post_score"]))
+            latencies.append(elapsed)
+        except (TypeError, KeyError, ValueError):
+            failures += 1
+    summary = summarize(latencies, errors)
+    summary["failures"] = failures
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模型基准测试")
+    parser.add_argument("--data", help="离线用户数据 JSON 文件（默认从数据库读取已完成用户）")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--alpha", type=float, default=1.0)
+    parser.add_argument("--llm-samples", type=int, default=0, help="抽样调用大模型的用户数（0=跳过）")
+    parser.add_argument("--output", help="结果保存为 JSON")
+    args = parser.parse_args()
+
+    if args.data:
+        with open(args.data, encoding="utf-8") as f:
+            users = json.load(f)
+    else:
+        from database import db
+        from local_model import load_completed_users
+        users = load_completed_users(db)
+    users = [u for u in users if u.get("pre_score") is not None and u.get("post_score") is not None]
+    for user in users:
+        user["post_score"] = float(user["post_score"])
+
+    results = {
+        "users": len(users),
+        "local_model": bench_local(users, args.folds, args.alpha),
+        "rules": bench_rules(users),
+    }
+    if args.llm_samples:
+        results["llm"] = bench_llm(users, args.llm_samples)
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
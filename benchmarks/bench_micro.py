@@ -0,0 +1,111 @@
+"""
+预测热路径微基准：prompt 构建（当前 AI_PROMPT_VERSION 模板）、规则引擎降级、大模型输出解析（JSON / 围栏 JSON / 文本），
+以及 /api/users 响应序列化（标准库 JSON / orjson / 列式）
+
+用法（在项目根目录）：
+    python benchmarks/bench_micro.py
+    python benchmarks/bench_micro.py --min-time 1.0 --output results/micro.json --baseline results/micro_base.json
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from common import add_backend_path, compare, run_meta, save_results
+
+add_backend_path()
+
+from ai_service import ai_service  # noqa: E402
+from fake_llm import _prediction_content  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+from responses import FastJSONResponse, columnar  # noqa: E402
+
+SAMPLE_USER = {
+    "user_id": 1, "name": "张明", "age": 16, "gender": 1, "status": 0,
+    "pre_score": 15.5, "post_score": None, "weeks_completed": 6, "total_checkins": 15,
+    "checkin_rate": 0.83, "avg_study_duration": 38.5, "completion_rate": 0.83,
+}
+
+# /api/users 一页 500 个用户（MySQL 返回的分数为 Decimal）
+USER_ROWS = [
+    {
+        "user_id": i, "name": f"用户{i}", "age": 16 + i % 5, "gender": 1 + i % 2, "status": i % 2, "project_id": 1,
+        "gender_text": "男" if i % 2 == 0 else "女", "status_text": "已完成" if i % 2 else "进行中",
+        "pre_score": Decimal("15.50"), "post_score": Decimal("7.50") if i % 2 else None,
+        "risk_level": ("low", "medium", "high")[i % 3], "improvement": 8.0 if i % 2 else None,
+        "improvement_rate": 51.6 if i % 2 else None,
+    }
+    for i in range(1, 501)
+]
+USER_COLUMNS = [key for key in USER_ROWS[0] if key not in ("gender_text", "status_text")]
+
+TEXT_RESPONSE = (
+    "根据用户的打卡情况，预计干预结束时焦虑分数约为9分，改善明显，风险较低。"
+    "建议保持每周3次打卡，每次学习30分钟以上。"
+)
+
+
+def measure(fn, min_time: float, repeats: int):
+    """自动确定每轮调用次数（单轮不少于 min_time / repeats 秒），取各轮中位数"""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / repeats:
+            break
+        number *= 2
+
+    per_call = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_call.append((time.perf_counter() - started) / number)
+    median = statistics.median(per_call)
+    return {
+        "ns_per_op": round(median * 1e9, 1),
+        "ops_per_sec": round(1 / median, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预测热路径微基准")
+    parser.add_argument("--min-time", type=float, default=0.5, help="每项基准的大致总耗时（秒）")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", help="结果 JSON 保存路径")
+    parser.add_argument("--baseline", help="与之对比的历史结果 JSON")
+    args = parser.parse_args()
+
+    prompt = "\n".join(m["content"] for m in ai_service._build_messages(SAMPLE_USER))
+    json_response = _prediction_content(prompt, random.Random(0))
+    fenced_response = f"以下是评估结果：\n```json\n{json_response}\n```\n如需进一步说明请告诉我。"
+    cases = {
+        "build_messages": lambda: ai_service._build_messages(SAMPLE_USER),
+        "fallback_evaluation": lambda: ai_service._fallback_evaluation(SAMPLE_USER),
+        "parse_result_json": lambda: ai_service._parse_result(json_response, SAMPLE_USER),
+        "parse_result_fenced": lambda: ai_service._parse_result(fenced_response, SAMPLE_USER),
+        "parse_result_text": lambda: ai_service._parse_result(TEXT_RESPONSE, SAMPLE_USER),
+        "json_loads": lambda: json.loads(json_response),
+        "user_list_json": lambda: JSONResponse(jsonable_encoder({"success": True, "data": USER_ROWS})),
+        "user_list_orjson": lambda: FastJSONResponse({"success": True, "data": USER_ROWS}),
+        "user_list_columns": lambda: FastJSONResponse({"success": True, **columnar(USER_ROWS, USER_COLUMNS)}),
+    }
+
+    results = {}
+    for name, fn in cases.items():
+        results[name] = measure(fn, args.min_time, args.repeats)
+        print(f"  {name}: {results[name]['ns_per_op']} ns/op")
+
+    output = {"meta": run_meta(vars(args)), "results": results}
+    save_results(output, args.output)
+    if args.baseline:
+        compare(output, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
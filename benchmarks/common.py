@@ -0,0 +1,91 @@
+"""
+基准测试公共函数：分位数统计、结果保存与基线对比
+"""
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND = ROOT / 'backend'
+
+
+def add_backend_path():
+    if str(BACKEND) not in sys.path:
+        sys.path.insert(0, str(BACKEND))
+
+
+def percentile(values, p):
+    """最近秩分位数（values 为空时返回 None）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def latency_summary(latencies_ms):
+    if not latencies_ms:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    return {
+        "p50": round(percentile(latencies_ms, 50), 3),
+        "p95": round(percentile(latencies_ms, 95), 3),
+        "p99": round(percentile(latencies_ms, 99), 3),
+        "mean": round(statistics.mean(latencies_ms), 3),
+        "max": round(max(latencies_ms), 3),
+    }
+
+
+def run_meta(params):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+    }
+
+
+def save_results(results, output):
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if output:
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"✓ 结果已保存到 {output}")
+
+
+def compare(results, baseline_path, higher_is_better=("throughput_rps", "ops_per_sec"), ignore=("requests",)):
+    """与基线 JSON 逐项对比数值指标，打印变化百分比（ignore 中的字段是输入参数，不对比）"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    print(f"\n与基线对比（{baseline.get('meta', {}).get('commit')} → {results.get('meta', {}).get('commit')}）：")
+    for path, current, previous in _numeric_pairs(results.get("results", {}), baseline.get("results", {})):
+        if not previous or path.split(".")[-1] in ignore:
+            continue
+        change = (current - previous) / previous * 100
+        better = change > 0 if path.split(".")[-1] in higher_is_better else change < 0
+        mark = "↑" if better else "↓"
+        if abs(change) < 1:
+            mark = "="
+        print(f"  {mark} {path}: {previous} → {current} ({change:+.1f}%)")
+
+
+def _numeric_pairs(current, previous, prefix=""):
+    for key, value in current.items():
+        path = f"{prefix}.{key}" if prefix else key
+        other = previous.get(key) if isinstance(previous, dict) else None
+        if isinstance(value, dict):
+            yield from _numeric_pairs(value, other or {}, path)
+        elif isinstance(value, (int, float)) and isinstance(other, (int, float)) and not isinstance(value, bool):
+            yield path, value, other
@@ -0,0 +1,164 @@
+"""
+模拟 OpenAI 兼容接口（/v1/chat/completions），用于压测时替代真实大模型
+
+用法：
+    python benchmarks/fake_llm.py --port 9100 --latency 0.8 --jitter 0.3 --error-rate 0.02
+
+返回的内容按 prompt 中的前测分数生成合法的预测 JSON（--fenced 时包在 ```json 围栏中）；支持 stream=true。
+多用户合并的请求（以"用户ID："分隔）返回 {"results": [...]}，--drop-rate 按比例漏掉其中的用户；
+输出超过 max_tokens（按 2 字符 1 token 计）时截断并返回 finish_reason=length。
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def create_app(latency: float = 0.5, jitter: float = 0.2, error_rate: float = 0.0,
+               chunk_size: int = 24, seed: int = 0, fenced: bool = False,
+               reject_json_mode: bool = False, drop_rate: float = 0.0) -> FastAPI:
+    app = FastAPI(title="fake-llm")
+    rng = random.Random(seed)
+    stats = {"requests": 0, "errors": 0, "streams": 0, "batched_users": 0, "truncated": 0}
+
+    def delay() -> float:
+        return max(0.0, latency + rng.uniform(-jitter, jitter))
+
+    @app.get("/stats")
+    def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+        if "用户ID：" in prompt:
+            content = _batch_content(prompt, rng, drop_rate)
+            stats["batched_users"] += len(re.findall(r"用户ID：\d+", prompt))
+        else:
+            content = _prediction_content(prompt, rng)
+        finish_reason = "stop"
+        max_tokens = body.get("max_tokens")
+        if max_tokens and len(content) // 2 > max_tokens:
+            content = content[:max_tokens * 2]
+            finish_reason = "length"
+            stats["truncated"] += 1
+        if fenced:
+            content = f"好的，以下是评估结果：\n```json\n{content}\n```\n如需进一步说明请告诉我。"
+        usage = {
+            "prompt_tokens": len(prompt) // 2,
+            "completion_tokens": len(content) // 2,
+            "total_tokens": len(prompt) // 2 + len(content) // 2,
+        }
+        model = body.get("model", "fake")
+
+        if reject_json_mode and body.get("response_format"):
+            stats["errors"] += 1
+            return JSONResponse({"error": {
+                "message": "response_format json_object is not supported by this model",
+                "type": "invalid_request_error",
+            }}, status_code=400)
+
+        if rng.random() < error_rate:
+            stats["errors"] += 1
+            await asyncio.sleep(delay() / 4)
+            return JSONResponse({"error": {"message": "injected error", "type": "server_error"}}, status_code=500)
+
+        if body.get("stream"):
+            stats["streams"] += 1
+            pieces = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)]
+            pause = delay() / max(len(pieces), 1)
+
+            async def events():
+                for piece in pieces:
+                    await asyncio.sleep(pause)
+                    yield _sse_chunk(model, {"content": piece})
+                yield _sse_chunk(model, {}, finish_reason=finish_reason)
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(delay())
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason,
+            }],
+            "usage": usage,
+        }
+
+    return app
+
+
+def _sse_chunk(model: str, delta: dict, finish_reason=None) -> str:
+    chunk = {
+        "id": "chatcmpl-stream",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+
+def _batch_content(prompt: str, rng: random.Random, drop_rate: float) -> str:
+    """合并请求：每个 "用户ID：" 段落生成一项"""
+    parts = re.split(r"用户ID：(\d+)", prompt)
+    results = [
+        {"user_id": int(user_id), **json.loads(_prediction_content(block, rng))}
+        for user_id, block in zip(parts[1::2], parts[2::2])
+        if rng.random() >= drop_rate
+    ]
+    return json.dumps({"results": results}, ensure_ascii=False)
+
+
+def _prediction_content(prompt: str, rng: random.Random) -> str:
+    match = re.search(r"前测焦虑分数：([0-9]+(?:\.[0-9]+)?)", prompt)
+    pre_score = float(match.group(1)) if match else 15.0
+    rate = rng.uniform(0.1, 0.5)
+    predicted = round(pre_score * (1 - rate), 1)
+    risk = "low" if rate >= 0.4 else "medium" if rate >= 0.25 else "high"
+    return json.dumps({
+        "predicted_score_min": round(max(0.0, predicted - 1.5), 1),
+        "predicted_score_max": round(predicted + 1.5, 1),
+        "predicted_score_most_likely": predicted,
+        "predicted_improvement": round(pre_score - predicted, 1),
+        "predicted_improvement_rate": round(rate * 100, 1),
+        "current_progress": {"low": "良好", "medium": "一般", "high": "较差"}[risk],
+        "risk_level": risk,
+        "confidence": round(rng.uniform(0.6, 0.9), 2),
+        "suggestions": ["保持每周3次打卡", "每次学习30分钟以上", "记录情绪变化"],
+        "analysis": "用户依从性与基线水平综合判断，预计干预结束时焦虑症状会有所缓解。",
+    }, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="模拟 OpenAI 兼容接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.5, help="平均响应时间（秒）")
+    parser.add_argument("--jitter", type=float, default=0.2, help="响应时间均匀抖动范围（±秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的比例")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fenced", action="store_true", help="JSON 包在 ```json 围栏中并附带说明文字")
+    parser.add_argument("--reject-json-mode", action="store_true", help="带 response_format 的请求返回 400")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="合并请求中漏掉用户的比例")
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(args.latency, args.jitter, args.error_rate, seed=args.seed,
+                   fenced=args.fenced, reject_json_mode=args.reject_json_mode, drop_rate=args.drop_rate),
+        host=args.host, port=args.port, log_level="warning"
+    )
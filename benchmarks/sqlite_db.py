@@ -0,0 +1,338 @@
+"""
+SQLite 版 Database 替身（压测用）：由 database/mock_data.sql 初始化并按需扩充到 N 个用户
+
+实现预测、用户列表、用户详情、创建用户用到的方法，返回结构与 backend/database.py 一致
+（复用其中的行组装函数和 INSERT 参数）。
+"""
+import math
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from common import ROOT, add_backend_path
+
+add_backend_path()
+
+from database import (  # noqa: E402
+    ASSESSMENT_INSERT_SQL, LEARNING_LOG_INSERT_SQL, PREDICTION_INSERT_SQL, USER_INSERT_SQL,
+    SUMMARY_SORT_FIELDS, SUMMARY_NULL_SORT_VALUE,
+    _prediction_params, _user_children_params, _user_data_from_row, _user_row_params
+)
+
+MOCK_DATA = ROOT / 'database' / 'mock_data.sql'
+
+SCHEMA = """
+CREATE TABLE users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL, age INTEGER NOT NULL, gender INTEGER NOT NULL,
+    project_id INTEGER DEFAULT 1, status INTEGER DEFAULT 1,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_status ON users (status);
+CREATE TABLE assessments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL, scale_name TEXT NOT NULL, stage_type INTEGER NOT NULL,
+    score REAL NOT NULL, test_date TEXT NOT NULL, created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_user_stage ON assessments (user_id, stage_type);
+CREATE TABLE learning_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL, week_number INTEGER NOT NULL,
+    checkin_count INTEGER DEFAULT 0, study_duration INTEGER DEFAULT 0, completed INTEGER DEFAULT 0,
+    log_date TEXT NOT NULL, created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (user_id, week_number)
+);
+CREATE TABLE user_learning_stats (
+    user_id INTEGER PRIMARY KEY,
+    weeks_completed INTEGER NOT NULL DEFAULT 0, total_checkins INTEGER NOT NULL DEFAULT 0,
+    total_study_duration INTEGER NOT NULL DEFAULT 0, completed_weeks INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL, pre_score REAL NOT NULL, predicted_score REAL NOT NULL,
+    predicted_improvement REAL NOT NULL, confidence REAL NOT NULL, risk_level TEXT NOT NULL,
+    suggestions TEXT, actual_score REAL, prediction_accuracy REAL, latency_ms INTEGER,
+    model_version TEXT DEFAULT 'v1.0', created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_prediction_user ON predictions (user_id);
+"""
+
+# 与 FEATURE_SQL 相同的字段（同阶段取最新一条）
+FEATURE_SQL = """
+SELECT
+    u.user_id, u.name, u.age, u.gender, u.status,
+    (SELECT score FROM assessments a WHERE a.user_id = u.user_id AND a.stage_type = 1
+     ORDER BY a.id DESC LIMIT 1) AS pre_score,
+    (SELECT score FROM assessments a WHERE a.user_id = u.user_id AND a.stage_type = 4
+     ORDER BY a.id DESC LIMIT 1) AS post_score,
+    s.weeks_completed,
+    s.total_checkins,
+    CAST(s.total_study_duration AS REAL) / NULLIF(s.weeks_completed, 0) AS avg_study_duration,
+    s.completed_weeks
+FROM users u
+LEFT JOIN user_learning_stats s ON s.user_id = u.user_id
+WHERE u.user_id IN ({ids})
+"""
+
+# 与 SUMMARY_SQL + SUMMARY_OUTER_SQL 相同的字段
+SUMMARY_SQL = """
+SELECT * FROM (
+    SELECT
+        b.*,
+        CASE WHEN b.pre_score <> 0 AND b.post_score <> 0
+             THEN ROUND(b.pre_score - b.post_score, 1) END AS improvement,
+        CASE WHEN b.pre_score <> 0 AND b.post_score <> 0
+             THEN ROUND((b.pre_score - b.post_score) / b.pre_score * 100, 1) END AS improvement_rate
+    FROM (
+        SELECT
+            u.user_id, u.name, u.age, u.gender, u.status, u.project_id,
+            CASE u.gender WHEN 1 THEN '男' ELSE '女' END AS gender_text,
+            CASE u.status WHEN 1 THEN '已完成' ELSE '进行中' END AS status_text,
+            (SELECT score FROM assessments a WHERE a.user_id = u.user_id AND a.stage_type = 1
+             ORDER BY a.id DESC LIMIT 1) AS pre_score,
+            (SELECT score FROM assessments a WHERE a.user_id = u.user_id AND a.stage_type = 4
+             ORDER BY a.id DESC LIMIT 1) AS post_score,
+            (SELECT risk_level FROM predictions p WHERE p.user_id = u.user_id
+             ORDER BY p.id DESC LIMIT 1) AS risk_level
+        FROM users u
+        {where}
+    ) b
+) s
+{outer_where}
+ORDER BY {order_by}
+{limit}
+"""
+
+
+class _Pool:
+    def stats(self) -> Dict:
+        return {"backend": "sqlite"}
+
+
+class SQLiteDatabase:
+    """压测用数据库替身（每个线程一个连接，WAL 模式）"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or str(Path(tempfile.mkdtemp(prefix="bench_db_")) / "bench.db")
+        self.pool = _Pool()
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------- 初始化 ----------
+
+    def seed(self, users: int = 100, seed: int = 0) -> Dict:
+        """建表并导入 mock_data.sql，用户数不足 users 时复制已有用户（分数加随机扰动）"""
+        started = time.perf_counter()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        conn.create_function("RAND", 0, random.Random(seed).random)
+        conn.create_function("FLOOR", 1, math.floor)
+        for statement in _mock_statements():
+            conn.execute(statement)
+        conn.commit()
+
+        base = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        if users > base:
+            self._scale(conn, base, users, random.Random(seed))
+        self._rebuild_stats(conn)
+        conn.commit()
+        return {
+            "users": conn.execute("SELECT COUNT(*) FROM users").fetchone()[0],
+            "assessments": conn.execute("SELECT COUNT(*) FROM assessments").fetchone()[0],
+            "learning_logs": conn.execute("SELECT COUNT(*) FROM learning_logs").fetchone()[0],
+            "seed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    @staticmethod
+    def _scale(conn: sqlite3.Connection, base: int, target: int, rng: random.Random):
+        users = conn.execute("SELECT name, age, gender, project_id, status FROM users ORDER BY user_id").fetchall()
+        assessments: Dict[int, list] = {}
+        for row in conn.execute("SELECT user_id, scale_name, stage_type, score, test_date FROM assessments"):
+            assessments.setdefault(row[0], []).append(tuple(row)[1:])
+        logs: Dict[int, list] = {}
+        for row in conn.execute(
+            "SELECT user_id, week_number, checkin_count, study_duration, completed, log_date FROM learning_logs"
+        ):
+            logs.setdefault(row[0], []).append(tuple(row)[1:])
+
+        for new_id in range(base + 1, target + 1):
+            source = (new_id - 1) % base + 1
+            name, age, gender, project_id, status = users[source - 1]
+            conn.execute(
+                "INSERT INTO users (user_id, name, age, gender, project_id, status) VALUES (?, ?, ?, ?, ?, ?)",
+                (new_id, name, age, gender, project_id, status)
+            )
+            conn.executemany(
+                "INSERT INTO assessments (user_id, scale_name, stage_type, score, test_date) VALUES (?, ?, ?, ?, ?)",
+                [(new_id, scale, stage, round(min(21, max(0, score + rng.uniform(-1.5, 1.5))) * 2) / 2, date)
+                 for scale, stage, score, date in assessments.get(source, [])]
+            )
+            conn.executemany(
+                "INSERT INTO learning_logs (user_id, week_number, checkin_count, study_duration, completed, log_date) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(new_id, week, checkins, max(5, duration + rng.randint(-5, 5)), completed, date)
+                 for week, checkins, duration, completed, date in logs.get(source, [])]
+            )
+
+    @staticmethod
+    def _rebuild_stats(conn: sqlite3.Connection):
+        conn.execute("DELETE FROM user_learning_stats")
+        conn.execute("""
+            INSERT INTO user_learning_stats (user_id, weeks_completed, total_checkins, total_study_duration, completed_weeks)
+            SELECT user_id, COUNT(DISTINCT week_number), COALESCE(SUM(checkin_count), 0),
+                   COALESCE(SUM(study_duration), 0), SUM(CASE WHEN completed = 1 THEN 1 ELSE 0 END)
+            FROM learning_logs GROUP BY user_id
+        """)
+
+    # ---------- Database 接口 ----------
+
+    def get_complete_user_data(self, user_id: int) -> Optional[Dict]:
+        return self.get_complete_user_data_many([user_id]).get(int(user_id))
+
+    def get_complete_user_data_many(self, user_ids: List[int]) -> Dict[int, Dict]:
+        ids = list(dict.fromkeys(int(uid) for uid in user_ids))
+        rows = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            sql = FEATURE_SQL.format(ids=", ".join("?" * len(chunk)))
+            for row in self._conn().execute(sql, chunk):
+                rows[row["user_id"]] = _user_data_from_row(dict(row))
+        return {uid: rows[uid] for uid in ids if uid in rows}
+
+    def save_prediction(self, user_id: int, prediction_data: Dict) -> int:
+        conn = self._conn()
+        cursor = conn.execute(_qmark(PREDICTION_INSERT_SQL), _prediction_params(user_id, prediction_data))
+        conn.commit()
+        return cursor.lastrowid
+
+    def save_predictions_many(self, records: List[Dict]) -> int:
+        if not records:
+            return 0
+        conn = self._conn()
+        conn.executemany(_qmark(PREDICTION_INSERT_SQL), [_prediction_params(r['user_id'], r) for r in records])
+        conn.commit()
+        return len(records)
+
+    def get_user_ids(self, status: Optional[int] = None, project_id: Optional[int] = None,
+                     limit: Optional[int] = None) -> List[int]:
+        sql, conditions, params = "SELECT user_id FROM users", [], []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if project_id is not None:
+            conditions.append("project_id = ?")
+            params.append(project_id)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY user_id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [row[0] for row in self._conn().execute(sql, params)]
+
+    def get_all_users_summary(self, status: Optional[int] = None, project_id: Optional[int] = None,
+                              risk_level: Optional[str] = None,
+                              min_improvement: Optional[float] = None, max_improvement: Optional[float] = None,
+                              sort: str = 'user_id', order: str = 'asc',
+                              after_user_id: Optional[int] = None, after_value: Optional[float] = None,
+                              limit: Optional[int] = None) -> List[Dict]:
+        inner, inner_params, outer, outer_params = [], [], [], []
+        if status is not None:
+            inner.append("u.status = ?")
+            inner_params.append(status)
+        if project_id is not None:
+            inner.append("u.project_id = ?")
+            inner_params.append(project_id)
+        if risk_level is not None:
+            outer.append("s.risk_level = ?")
+            outer_params.append(risk_level)
+        if min_improvement is not None:
+            outer.append("s.improvement >= ?")
+            outer_params.append(min_improvement)
+        if max_improvement is not None:
+            outer.append("s.improvement <= ?")
+            outer_params.append(max_improvement)
+
+        if sort not in SUMMARY_SORT_FIELDS:
+            raise ValueError(f"不支持的排序字段: {sort}")
+        if order not in ('asc', 'desc'):
+            raise ValueError(f"不支持的排序方向: {order}")
+        cmp = '>' if order == 'asc' else '<'
+        direction = order.upper()
+        column = f"s.{sort}"
+        if sort == 'user_id':
+            order_by = f"s.user_id {direction}"
+            if after_user_id is not None:
+                outer.append(f"s.user_id {cmp} ?")
+                outer_params.append(after_user_id)
+        else:
+            key = f"COALESCE({column}, {SUMMARY_NULL_SORT_VALUE})"
+            order_by = f"{key} {direction}, s.user_id {direction}"
+            if after_user_id is not None:
+                value = SUMMARY_NULL_SORT_VALUE if after_value is None else after_value
+                outer.append(f"({key} {cmp} ? OR ({key} = ? AND s.user_id {cmp} ?))")
+                outer_params.extend([value, value, after_user_id])
+
+        sql = SUMMARY_SQL.format(
+            where="WHERE " + " AND ".join(inner) if inner else "",
+            outer_where="WHERE " + " AND ".join(outer) if outer else "",
+            order_by=order_by,
+            limit="LIMIT ?" if limit is not None else ""
+        )
+        params = inner_params + outer_params + ([limit] if limit is not None else [])
+        return [dict(row) for row in self._conn().execute(sql, params)]
+
+    def create_user(self, user_data: Dict) -> int:
+        conn = self._conn()
+        try:
+            user_id = conn.execute(_qmark(USER_INSERT_SQL), _user_row_params(user_data)).lastrowid
+            assessments, logs = _user_children_params([(user_id, user_data)])
+            conn.executemany(_qmark(ASSESSMENT_INSERT_SQL), assessments)
+            conn.executemany(_qmark(LEARNING_LOG_INSERT_SQL), logs)
+            if logs:
+                conn.execute("""
+                    INSERT INTO user_learning_stats
+                        (user_id, weeks_completed, total_checkins, total_study_duration, completed_weeks)
+                    SELECT user_id, COUNT(DISTINCT week_number), COALESCE(SUM(checkin_count), 0),
+                           COALESCE(SUM(study_duration), 0), SUM(CASE WHEN completed = 1 THEN 1 ELSE 0 END)
+                    FROM learning_logs WHERE user_id = ? GROUP BY user_id
+                """, (user_id,))
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+        return user_id
+
+
+def _qmark(sql: str) -> str:
+    return sql.replace("%s", "?")
+
+
+def _mock_statements():
+    """mock_data.sql 中的 INSERT 语句（转换为 SQLite 语法）"""
+    text = MOCK_DATA.read_text(encoding="utf-8")
+    text = "\n".join(line.split("--", 1)[0] for line in text.splitlines())
+    for statement in text.split(";"):
+        statement = statement.strip()
+        if not statement.upper().startswith("INSERT") or "ON DUPLICATE KEY" in statement.upper():
+            continue
+        statement = re.sub(
+            r"DATE_ADD\(\s*('[^']+')\s*,\s*INTERVAL\s+(.+?)\s+WEEK\s*\)",
+            r"date(\1, '+' || ((\2) * 7) || ' days')",
+            statement, flags=re.IGNORECASE
+        )
+        yield statement
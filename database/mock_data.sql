@@ -262,6 +262,24 @@ CROSS JOIN (
 ) w
 WHERE u.user_id BETWEEN 81 AND 90;
 
+-- ============================================
+-- 生成学习统计（与 python backend/learning_stats.py rebuild 相同）
+-- ============================================
+INSERT INTO user_learning_stats (user_id, weeks_completed, total_checkins, total_study_duration, completed_weeks)
+SELECT
+    user_id,
+    COUNT(DISTINCT week_number),
+    COALESCE(SUM(checkin_count), 0),
+    COALESCE(SUM(study_duration), 0),
+    SUM(CASE WHEN completed = 1 THEN 1 ELSE 0 END)
+FROM learning_logs
+GROUP BY user_id
+ON DUPLICATE KEY UPDATE
+    weeks_completed = VALUES(weeks_completed),
+    total_checkins = VALUES(total_checkins),
+    total_study_duration = VALUES(total_study_duration),
+    completed_weeks = VALUES(completed_weeks);
+
 -- ============================================
 -- 数据验证查询
 -- ============================================
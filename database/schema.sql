@@ -36,6 +36,7 @@ CREATE TABLE IF NOT EXISTS assessments (
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     FOREIGN KEY (user_id) REFERENCES users(user_id),
     INDEX idx_user_stage (user_id, stage_type),
+    INDEX idx_stage (stage_type),
     INDEX idx_scale (scale_name)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='测评数据表';
 
@@ -69,7 +70,8 @@ CREATE TABLE IF NOT EXISTS predictions (
     risk_level VARCHAR(20) NOT NULL COMMENT '风险等级：low/medium/high',
     suggestions TEXT COMMENT 'AI建议（JSON格式）',
     actual_score DECIMAL(5,2) DEFAULT NULL COMMENT '实际后测分数（后续填入）',
-    prediction_accuracy DECIMAL(5,2) DEFAULT NULL COMMENT '预测准确度',
+    prediction_accuracy DECIMAL(5,2) DEFAULT NULL COMMENT '预测准确度（0-100）',
+    latency_ms INT DEFAULT NULL COMMENT '评估耗时（毫秒）',
     model_version VARCHAR(50) DEFAULT 'v1.0' COMMENT '模型版本',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '预测时间',
     FOREIGN KEY (user_id) REFERENCES users(user_id),
@@ -84,13 +86,40 @@ CREATE TABLE IF NOT EXISTS model_performance (
     id BIGINT PRIMARY KEY AUTO_INCREMENT COMMENT '记录ID',
     model_version VARCHAR(50) NOT NULL COMMENT '模型版本',
     total_predictions INT DEFAULT 0 COMMENT '总预测次数',
+    evaluated_predictions INT DEFAULT 0 COMMENT '已有实际后测的事前预测数',
     accurate_predictions INT DEFAULT 0 COMMENT '准确预测次数',
-    accuracy_rate DECIMAL(5,2) DEFAULT 0 COMMENT '准确率',
+    accuracy_rate DECIMAL(5,2) DEFAULT 0 COMMENT '准确率（%）',
     avg_error DECIMAL(5,2) DEFAULT 0 COMMENT '平均误差',
+    total_error DECIMAL(12,2) DEFAULT 0 COMMENT '绝对误差合计',
+    latency_samples INT DEFAULT 0 COMMENT '记录了耗时的预测数',
+    total_latency_ms BIGINT DEFAULT 0 COMMENT '评估耗时合计（毫秒）',
+    avg_latency_ms DECIMAL(10,1) DEFAULT 0 COMMENT '平均评估耗时（毫秒）',
     last_updated DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '最后更新时间',
     UNIQUE KEY uk_version (model_version)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='模型性能表';
 
+-- ============================================
+-- 6. 学习统计表（learning_logs 按用户聚合，写入学习记录时增量更新）
+-- ============================================
+CREATE TABLE IF NOT EXISTS user_learning_stats (
+    user_id BIGINT PRIMARY KEY COMMENT '用户ID',
+    weeks_completed INT NOT NULL DEFAULT 0 COMMENT '已学习周数',
+    total_checkins INT NOT NULL DEFAULT 0 COMMENT '总打卡次数',
+    total_study_duration BIGINT NOT NULL DEFAULT 0 COMMENT '总学习时长（分钟）',
+    completed_weeks INT NOT NULL DEFAULT 0 COMMENT '完成任务的周数',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '最后更新时间',
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='学习统计表';
+
+-- ============================================
+-- 7. 增量回填进度（准确度回填已处理到的后测 assessments.id）
+-- ============================================
+CREATE TABLE IF NOT EXISTS backfill_progress (
+    name VARCHAR(50) PRIMARY KEY COMMENT '回填任务',
+    last_id BIGINT NOT NULL DEFAULT 0 COMMENT '已处理到的记录ID',
+    last_updated DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '最后更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='增量回填进度';
+
 -- ============================================
 -- 插入初始模型性能记录
 -- ============================================